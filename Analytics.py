@@ -0,0 +1,137 @@
+"""
+Code to query the results in a results store (Store) without loading the whole table into memory.
+
+Columns are read through memory maps, so a query only touches the columns it uses. The row order of an
+objective column is sorted once and saved in the store, so the best rows of that objective are found by
+reading the start of the sort index instead of sorting the table. Constraints are given as a dictionary of
+(min, max) limits for each column, with None for no limit, e.g. {'IRR (%)': (10, None)}.
+
+Inputs:
+    - path, directory of the results store.
+    - column, objective column to rank the results by.
+    - where, dictionary of (min, max) constraints on the columns (None = no constraints).
+
+Outputs:
+    - Dataframes of the rows which meet the constraints, the best k rows or the Pareto front.
+"""
+import os
+import numpy as np
+import pandas as pd
+import Store
+
+
+def Index(path, column):
+    """
+    Row order of the store sorted by the values of column, smallest first with missing values last. The
+    order is saved in the store and reused until the store is next written to.
+    """
+    store = Store.Columns(path)
+    k = store['columns'].index(column)
+    file = os.path.join(path, f'order_{k:03d}.npy')
+
+    if os.path.exists(file):
+        return np.load(file, mmap_mode='r')
+
+    order = np.argsort(store[column], kind='stable')
+    np.save(file, order)
+
+    return np.load(file, mmap_mode='r')
+
+
+def Mask(store, where=None, rows=None):
+    """
+    Which of the rows (None = all rows) of an open store have been written and meet the constraints.
+    """
+    done = store['done'] if rows is None else store['done'][rows]
+    mask = np.array(done, dtype=bool)
+
+    for col, (lo, hi) in (where or {}).items():
+        x = store[col] if rows is None else store[col][rows]
+        if lo is not None:
+            mask &= x >= lo
+        if hi is not None:
+            mask &= x <= hi
+
+    return mask
+
+
+def Rows(path, rows):
+    """
+    Dataframe of the given rows of the store, indexed by row.
+    """
+    store = Store.Columns(path)
+    rows = np.asarray(rows, dtype=int)
+
+    Results = pd.DataFrame({k: store[k][rows] for k in store['columns']}, index=rows)
+    Results.index.names = ['j']
+
+    return Results
+
+
+def Filter(path, where=None):
+    """
+    Rows of the store which meet the constraints.
+    """
+    store = Store.Columns(path)
+
+    return Rows(path, np.where(Mask(store, where))[0])
+
+
+def Top(path, column, k=10, ascending=False, where=None, block=4096):
+    """
+    The k rows with the largest (or smallest when ascending) values of column which meet the constraints.
+
+    The sort index is read in blocks from the best end, so only the rows near the top are checked against
+    the constraints.
+    """
+    store = Store.Columns(path)
+    order = Index(path, column)
+    n_valid = int(np.isfinite(store[column]).sum())  # missing values are at the end of the sort index.
+
+    found = []
+    n_found = 0
+    for start in range(0, n_valid, block):
+        stop = min(start + block, n_valid)
+        rows = order[start:stop] if ascending else order[(n_valid - stop):(n_valid - start)][::-1]
+        rows = rows[Mask(store, where, rows)]
+        found.append(rows[:(k - n_found)])
+        n_found += len(found[-1])
+        if n_found >= k:
+            break
+
+    return Rows(path, np.concatenate(found) if found else [])
+
+
+def Pareto(path, objectives, where=None):
+    """
+    Pareto front of two objective columns among the rows which meet the constraints.
+
+    objectives is a dictionary of the two columns and 'max' or 'min', e.g. {'NPV (£ 000s)': 'max',
+    'CO2e Emissions (kg)': 'min'}. The rows are swept in the saved order of the first objective, keeping each
+    row whose second objective is better than that of every row with a better first objective.
+    """
+    if len(objectives) != 2:
+        raise ValueError('Pareto queries take two objectives')
+
+    store = Store.Columns(path)
+    (c1, s1), (c2, s2) = objectives.items()
+    order = np.asarray(Index(path, c1))
+    if s1 == 'max':
+        order = order[::-1]
+
+    sign = 1 if s2 == 'min' else -1
+    v1 = store[c1][order]
+    v2 = sign * store[c2][order]  # second objective to minimise.
+    keep = Mask(store, where, order) & np.isfinite(v1) & np.isfinite(v2)
+    order, v1, v2 = order[keep], v1[keep], v2[keep]
+    if len(order) == 0:
+        return Rows(path, [])
+
+    # rows with an equal first objective are grouped, and only the best of a group can be on the front.
+    start = np.r_[True, v1[1:] != v1[:-1]]
+    group = np.cumsum(start) - 1
+    best = np.minimum.reduceat(v2, np.where(start)[0])
+    before = np.r_[np.inf, np.minimum.accumulate(best)[:-1]]  # best of the groups with a better first objective.
+    front = (v2 == best[group]) & (best[group] < before[group])
+
+    return Rows(path, order[front])
@@ -0,0 +1,313 @@
+"""
+Code to dispatch PV and ST generation against electricity and DHW demand using a battery and hot water tank.
+
+The rules are the same as the original hourly loop in Optimisation.Optimiz, including the cases where the
+battery or tank state of charge is not carried over to the next time step, so that results are reproduced
+exactly. The kernel works on contiguous float64 numpy arrays and is compiled with numba when it is installed.
+
+Inputs:
+    - E, hourly electricity demand (kWh).
+    - DHW, hourly domestic hot water demand (kWh).
+    - ST, hourly solar thermal generation (kWh).
+    - PV, hourly PV generation (kWh).
+    - B_cap, battery capacity (kWh).
+    - B_charge, battery charging power (kW).
+    - B_discharge, battery discharging power (kW).
+    - TS_size, size of hot water cylinder (L).
+    - TS_leak, thermal leakage of hot water cylinder (W/L).
+    - T_inlet, inlet temperature of water for DHW (C).
+    - T_outlet, outlet temperature of water for DHW (C).
+
+Outputs:
+    - GIE, hourly grid imported electricity (kWh).
+    - GEE, hourly grid exported electricity (kWh).
+    - ST_waste, hourly wasted solar thermal generation (kWh).
+    - B_SOC, battery state of charge at the start of each hour plus the final state (kWh).
+    - TS_SOC, thermal storage state of charge at the start of each hour plus the final state (kWh).
+"""
+import numpy as np
+
+try:
+    from numba import njit
+except ImportError:  # numba is optional, fall back to the plain python kernel.
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        return lambda f: f
+
+
+@njit(cache=True)
+def _kernel(E, DHW, ST, PV, B_cap, B_charge, B_discharge, TS_max, T_outlet, T_inlet, TS_leak):
+    n = E.shape[0]
+    GIE = np.zeros(n)  # grid imported electricity (kWh)
+    GEE = np.zeros(n)  # grid exported electricity (kWh)
+    ST_waste = np.zeros(n)  # wasted solar thermal generation (kWh)
+    B_SOC = np.zeros(n + 1)  # battery state of charge (kWh)
+    TS_SOC = np.zeros(n + 1)  # thermal storage state of charge (kWh)
+
+    TS_SOC[0] = (TS_max / 4)  # set initial hot water capacity to a quarter of maximum storage (kWh).
+    B_SOC[0] = (B_cap / 4)  # set initial battery capacity to a quarter of maximum battery capacity (kWh).
+
+    for i in range(n):
+        E_step = E[i]
+        DHW_step = DHW[i]
+        ST_step = ST[i]
+        PV_step = PV[i]
+        b = B_SOC[i]
+        t = TS_SOC[i]
+        b_next = 0.0  # battery and tank are emptied in the branches which don't set them.
+        t_next = 0.0
+        gie = 0.0
+        PV_step_r = 0.0
+
+        ## meet E demand from pv, battery and the grid.
+
+        if E_step > 0:
+            if PV_step > 0:
+                if PV_step >= E_step:
+                    PV_step_r = PV_step - E_step
+                    if b < B_cap:
+                        if (B_cap - b) > B_charge:
+                            if PV_step_r <= B_charge:
+                                b_next = b + PV_step_r  # pv stored here is also exported, as in the original loop.
+                            else:
+                                b_next = b + B_charge
+                                PV_step_r = PV_step_r - B_charge
+                        else:
+                            if PV_step_r >= (B_cap - b):
+                                b_next = B_cap
+                                PV_step_r = PV_step_r - (B_cap - b)
+                            else:
+                                b_next = b + PV_step_r
+                else:
+                    E_step_r = E_step - PV_step
+                    if b > 0:
+                        if b >= B_discharge:
+                            if E_step_r <= B_discharge:
+                                b_next = b - E_step_r
+                            else:
+                                b_next = b - B_discharge
+                                gie = gie + (E_step_r - B_discharge)
+                        else:
+                            if E_step_r >= b:
+                                gie = gie + (E_step_r - b)
+                            else:
+                                b_next = b - E_step_r
+                    else:
+                        gie = gie + E_step_r
+
+            elif b > 0:
+                if b >= B_discharge:
+                    if E_step <= B_discharge:
+                        b_next = b - E_step
+                    else:
+                        b_next = b - B_discharge
+                        gie = gie + (E_step - B_discharge)
+                else:
+                    if E_step >= b:
+                        gie = gie + (E_step - b)
+                    else:
+                        b_next = b - E_step
+
+            else:
+                gie = gie + E_step
+
+        elif PV_step > 0:
+            if b < B_cap:
+                if (B_cap - b) >= B_charge:
+                    if PV_step >= B_charge:
+                        b_next = b + B_charge
+                        PV_step_r = PV_step - B_charge
+                    else:
+                        b_next = b + PV_step
+                else:
+                    if PV_step >= (B_cap - b):
+                        b_next = B_cap
+                        PV_step_r = PV_step - (B_cap - b)
+                    else:
+                        b_next = b + PV_step
+            else:
+                PV_step_r = PV_step
+
+        ## meet DHW demand from st, the tank, remaining pv and the grid. imports for DHW replace the E imports.
+
+        if DHW_step > 0:
+            if ST_step > 0:
+                if ST_step >= DHW_step:
+                    ST_step_r = ST_step - DHW_step
+                    if t < TS_max:
+                        if (TS_max - t) >= ST_step_r:
+                            t_next = t + ST_step_r
+                        else:
+                            t_next = TS_max
+                            ST_waste[i] = ST_step_r - (TS_max - t)
+                else:
+                    DHW_step_r = DHW_step - ST_step
+                    if t > 0:
+                        if t >= DHW_step_r:
+                            t_next = t - DHW_step_r
+                        else:
+                            DHW_step_r = DHW_step_r - t
+                            if PV_step_r > 0:
+                                if PV_step_r >= DHW_step_r:
+                                    PV_step_r = PV_step_r - DHW_step_r
+                                else:
+                                    gie = DHW_step_r - PV_step_r
+                                    PV_step_r = 0.0
+                            else:
+                                gie = DHW_step_r
+                    elif PV_step_r > 0:
+                        if PV_step_r >= DHW_step_r:
+                            PV_step_r = PV_step_r - DHW_step_r
+                        else:
+                            gie = DHW_step_r - PV_step_r
+                            PV_step_r = 0.0
+                    else:
+                        gie = DHW_step_r
+
+            elif t > 0:
+                if t >= DHW_step:
+                    t_next = t - DHW_step
+                else:
+                    DHW_step_r = DHW_step - t
+                    if PV_step_r >= DHW_step_r:
+                        PV_step_r = PV_step_r - DHW_step_r
+                    else:
+                        gie = DHW_step_r - PV_step_r
+                        PV_step_r = 0.0
+
+            elif PV_step_r > 0:
+                if PV_step_r >= DHW_step:
+                    PV_step_r = PV_step_r - DHW_step
+                else:
+                    gie = -PV_step  # the original loop subtracts the pv step from an already met DHW demand.
+                    PV_step_r = 0.0
+
+            else:
+                gie = DHW_step
+
+        else:
+            if t < TS_max:
+                if (TS_max - t) >= ST_step:
+                    t_next = t + ST_step
+                else:
+                    t_next = TS_max
+                    ST_waste[i] = ST_step - (TS_max - t)
+            else:
+                ST_waste[i] = ST_step
+
+        GIE[i] = gie
+        GEE[i] = PV_step_r  # export remaining PV generation
+        B_SOC[i + 1] = b_next
+
+        TS_Litre_step = (3600 * t_next) / (4.2 * (T_outlet - T_inlet))  # litres of hot water in thermal storage (litres)
+        TS_leak_kWh = (TS_leak * TS_Litre_step) / 1000  # energy leakage from hot water tank (kWh)
+        TS_SOC[i + 1] = t_next - TS_leak_kWh
+
+    return GIE, GEE, ST_waste, B_SOC, TS_SOC
+
+
+def dispatch(E, DHW, ST, PV, B_cap, B_charge, B_discharge, TS_size, TS_leak, T_inlet, T_outlet):
+    E = np.ascontiguousarray(E, dtype=np.float64).ravel()
+    DHW = np.ascontiguousarray(DHW, dtype=np.float64).ravel()
+    ST = np.ascontiguousarray(ST, dtype=np.float64).ravel()
+    PV = np.ascontiguousarray(PV, dtype=np.float64).ravel()
+
+    if not (len(E) == len(DHW) == len(ST) == len(PV)):
+        raise ValueError('E, DHW, ST and PV profiles must have the same length')
+
+    if (DHW < 0).any():
+        raise ValueError('DHW demand must not be negative')  # the original loop raised on negative DHW steps.
+
+    TS_max = (4.2 * (T_outlet - T_inlet) * TS_size) * (1 / 3600)  # maximum storage size of hot water tank (kWh)
+
+    return _kernel(E, DHW, ST, PV, float(B_cap), float(B_charge), float(B_discharge), float(TS_max),
+                   float(T_outlet), float(T_inlet), float(TS_leak))
+
+
+@njit(cache=True)
+def _batch_kernel(E, DHW, ST, PV, rows, B_cap, B_charge, B_discharge, TS_max, T_outlet, T_inlet, TS_leak, hourly):
+    n_batch = rows.shape[1]
+    n_steps = E.shape[1]
+    m = n_steps if hourly else 0
+    GIE = np.zeros((n_batch, m))  # hourly results are only kept when asked for.
+    GEE = np.zeros((n_batch, m))
+    ST_waste = np.zeros((n_batch, m))
+    B_SOC = np.zeros((n_batch, m + 1 if hourly else 0))
+    TS_SOC = np.zeros((n_batch, m + 1 if hourly else 0))
+    GIE_sum = np.zeros(n_batch)  # annual imported electricity of each row (kWh)
+    GEE_sum = np.zeros(n_batch)  # annual exported electricity of each row (kWh)
+
+    for r in range(n_batch):
+        gie, gee, waste, b_soc, ts_soc = _kernel(E[rows[0, r]], DHW[rows[1, r]], ST[rows[2, r]], PV[rows[3, r]],
+                                                 B_cap[r], B_charge[r], B_discharge[r], TS_max[r], T_outlet,
+                                                 T_inlet, TS_leak[r])
+        GIE_sum[r] = gie.sum()
+        GEE_sum[r] = gee.sum()
+        if hourly:
+            GIE[r] = gie
+            GEE[r] = gee
+            ST_waste[r] = waste
+            B_SOC[r] = b_soc
+            TS_SOC[r] = ts_soc
+
+    return GIE, GEE, ST_waste, B_SOC, TS_SOC, GIE_sum, GEE_sum
+
+
+def _batch(E, DHW, ST, PV, B_cap, B_charge, B_discharge, TS_size, TS_leak, T_inlet, T_outlet, rows, hourly):
+    profiles = [np.ascontiguousarray(np.atleast_2d(np.asarray(x, dtype=np.float64))) for x in (E, DHW, ST, PV)]
+    n_steps = profiles[0].shape[1]
+
+    if not all(x.shape[1] == n_steps for x in profiles):
+        raise ValueError('E, DHW, ST and PV profiles must have the same length')
+
+    if (profiles[1] < 0).any():
+        raise ValueError('DHW demand must not be negative')
+
+    if rows is None:
+        # a single profile is shared by every row of the batch.
+        n_batch = max([len(x) for x in profiles] +
+                      [np.size(x) for x in (B_cap, B_charge, B_discharge, TS_size, TS_leak)])
+        rows = [np.zeros(n_batch, dtype=np.int64) if len(x) == 1 else np.arange(n_batch) for x in profiles]
+    rows = np.ascontiguousarray(rows, dtype=np.int64)
+    n_batch = rows.shape[1]
+
+    for x, r in zip(profiles, rows):
+        if n_batch and (r.min() < 0 or r.max() >= len(x)):
+            raise ValueError('profile rows of the batch are out of range')
+
+    B_cap, B_charge, B_discharge, TS_size, TS_leak = [
+        np.ascontiguousarray(np.broadcast_to(np.asarray(x, dtype=np.float64), (n_batch,)))
+        for x in (B_cap, B_charge, B_discharge, TS_size, TS_leak)]
+
+    TS_max = (4.2 * (T_outlet - T_inlet) * TS_size) * (1 / 3600)  # maximum storage size of hot water tank (kWh)
+
+    return _batch_kernel(*profiles, rows, B_cap, B_charge, B_discharge, TS_max, float(T_outlet), float(T_inlet),
+                         TS_leak, hourly)
+
+
+def dispatch_batch(E, DHW, ST, PV, B_cap, B_charge, B_discharge, TS_size, TS_leak, T_inlet, T_outlet, rows=None):
+    """
+    Dispatch several generation/demand profiles together in one compiled loop over the rows of the batch.
+
+    E, DHW, ST and PV are arrays of shape (n_batch, n_steps), or (n_steps,) to share one profile between all
+    rows of the batch. The battery and tank parameters may be scalars or (n_batch,) arrays. Every row is
+    dispatched by the same kernel as dispatch(), so it gives exactly the same result as dispatch() on that row.
+
+    rows, an (4, n_batch) integer array of the rows of E, DHW, ST and PV dispatched in each row of the batch, so
+    profiles shared by several rows aren't copied (None = row i of each profile, or its only row).
+
+    Returns GIE, GEE and ST_waste of shape (n_batch, n_steps) and B_SOC and TS_SOC of shape
+    (n_batch, n_steps + 1).
+    """
+    return _batch(E, DHW, ST, PV, B_cap, B_charge, B_discharge, TS_size, TS_leak, T_inlet, T_outlet, rows, True)[:5]
+
+
+def dispatch_sums(E, DHW, ST, PV, B_cap, B_charge, B_discharge, TS_size, TS_leak, T_inlet, T_outlet, rows=None):
+    """
+    Annual imported and exported electricity (kWh) of each row of the batch, shape (n_batch,), as dispatch_batch
+    but without keeping the hourly results, so the memory used doesn't grow with the number of hours.
+    """
+    GIE, GEE, ST_waste, B_SOC, TS_SOC, GIE_sum, GEE_sum = _batch(E, DHW, ST, PV, B_cap, B_charge, B_discharge,
+                                                                 TS_size, TS_leak, T_inlet, T_outlet, rows, False)
+    return GIE_sum, GEE_sum
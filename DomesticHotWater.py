@@ -14,6 +14,7 @@ import pandas as pd
 import datetime
 import numpy as np
 import random
+import Telemetry
 
 def DoHoWa(PV, T_inlet, T_outlet):
     ## import data from excel sheet
@@ -120,7 +121,9 @@ def DoHoWa(PV, T_inlet, T_outlet):
         app_name = DHW_App['Appliance'][i]  # extract appliance name.
         DHW.insert(2+i, app_name, float(0))  # add standby consumption to electricity profile dataframe.
 
+    progress = Telemetry.Progress(len(DHW), 'DoHoWa', unit='hours')
     for i in range(0, len(DHW)):
+        progress.update()
         E_hour = DHW['Hour'][i]  # extract hour of the time period.
         E_day = DHW['Day of Week'][i]  # extract day of the week of the time period.
 
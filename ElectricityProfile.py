@@ -14,6 +14,7 @@ import pandas as pd
 import numpy as np
 from datetime import datetime
 import random
+import Telemetry
 
 def EP(PV_data, HP, HC, HP_C_SCOP):
     ## import data from excel sheets
@@ -164,7 +165,9 @@ def EP(PV_data, HP, HC, HP_C_SCOP):
         sb_cons = sb_power / 1000  # calculate standby consumption (kWh).
         E_p.insert(3+i, app_name, sb_cons)  # add standby consumption to electricity profile dataframe.
 
+    progress = Telemetry.Progress(len(E_p), 'EP', unit='hours')
     for i in range(0, len(E_p)):
+        progress.update()
         E_hour = E_p['Hour'][i]  # extract hour of the time period.
         E_day = E_p['Day of Week'][i]  # extract day of the week of the time period.
 
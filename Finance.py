@@ -0,0 +1,207 @@
+"""
+Code to evaluate the financial and carbon results of each permutation from its annual energy flows.
+
+The annual imported and exported electricity from Optimisation.Flows is priced for any number of tariff and
+discount rate scenarios at once, so a change of prices or discount rate needs no new dispatch.
+
+Inputs:
+    - flows, dictionary of annual energy flows from Optimisation.Flows.
+    - PV_Price, PV pricing bands from Financials.xlsx (£/kWp).
+    - ST_Price, ST pricing bands from Financials.xlsx (£/m2).
+    - imp_price, import price of grid electricity (£/kWh).
+    - ccl, climate change levy on grid electricity (£/kWh).
+    - exp_price, export price of grid electricity (£/kWh).
+    - co2, CO2e emissions of grid electricity (kgCO2e/kWh).
+    - d_rate, discount rate (-).
+
+Outputs:
+    - Dictionary of ARC, CC, cash flows, IRR, NPV and CO2e emissions for every scenario and permutation.
+
+NPV and IRR are calculated for every row of a cash flow matrix at once. IRR agrees with numpy_financial.irr
+to within 1e-9 for cash flows with one sign change and rates between -98% and 5000%, and other cash flows
+are passed to numpy_financial.irr.
+"""
+import numpy as np
+import numpy_financial as npf
+
+
+def Capital_cost(PV_Cap, ST_A, PV_Price, ST_Price):
+    """
+    Capital cost of the PV and ST installation of each permutation from the pricing bands.
+
+    A capacity which falls between two pricing bands keeps the cost of the previous permutation, as Optimiz
+    always has. Returns the rounded PV capacities (kWp), ST areas (m2) and capital costs (£).
+    """
+    n_perm = len(PV_Cap)
+    PV_iteration = np.zeros(n_perm, dtype=float)
+    ST_iteration = np.zeros(n_perm, dtype=float)
+    CC = np.zeros(n_perm, dtype=float)
+    PV_cost = 0
+    ST_cost = 0
+
+    for j in range(0, n_perm):
+        PV_iteration[j] = round(PV_Cap[j], 2)
+        ST_iteration[j] = round(ST_A[j], 2)
+
+        if PV_iteration[j] > 0:
+            for a in range(0, len(PV_Price)):
+                if float(PV_Price['Minimum'][a]) <= PV_iteration[j] <= float(PV_Price['Maximum'][a]):
+                    PV_cost = PV_iteration[j] * PV_Price['Cost (£/kWp)'][a]
+                    break
+        else:
+            PV_cost = 0
+
+        if ST_iteration[j] > 0:
+            for a in range(0, len(ST_Price)):
+                if float(ST_Price['Minimum'][a]) <= ST_iteration[j] <= float(ST_Price['Maximum'][a]):
+                    ST_cost = ST_iteration[j] * ST_Price['Cost (£/m2)'][a]
+                    break
+        else:
+            ST_cost = 0
+
+        CC[j] = PV_cost + ST_cost  # capital cost of installing renewables.
+
+    return PV_iteration, ST_iteration, CC
+
+
+def NPV(rate, values):
+    """
+    Net present value of each row of values, shape (..., n_years), with the first year undiscounted.
+
+    rate is a scalar or an array which broadcasts against values.shape[:-1]. With a scalar rate the NPV of
+    every row is a single matrix-vector product.
+    """
+    values = np.asarray(values, dtype=float)
+    rate = np.asarray(rate, dtype=float)
+    t = np.arange(0, values.shape[-1])
+
+    if rate.ndim == 0:
+        return values @ ((1 + rate) ** -t)
+
+    disc = (1 + rate[..., None]) ** -t  # discount factor of each year for each rate.
+    return np.einsum('...y,...y->...', values, disc)
+
+
+def IRR(values, tol=1e-12, max_iter=100):
+    """
+    Internal rate of return of each row of values, shape (..., n_years), solved for all rows together.
+
+    NPV(r) = 0 is solved as a polynomial in x = 1 / (1 + r). The sign of the polynomial is found on a grid of
+    rates between -98% and 5000% with one matrix product, and the sign change closest to r = 0 gives a bracket
+    for each row. The root is then refined with Newton steps, falling back to bisection when a step leaves the
+    bracket. Like numpy_financial.irr the root closest to zero is returned, and NaN when there is none. Rows
+    whose cash flow changes sign more than once, which the grid can miss roots of, or which have no bracket,
+    are solved by numpy_financial.irr itself.
+    """
+    values = np.asarray(values, dtype=float)
+    shape = values.shape[:-1]
+    c = values.reshape(-1, values.shape[-1])
+    t = np.arange(0, c.shape[1])
+
+    x_grid = np.exp(np.linspace(-4, 4, 161))  # x = 1 / (1 + r), increasing.
+    f_grid = c @ (x_grid[:, None] ** t).T  # polynomial at every grid point, shape (rows, grid).
+
+    rate = np.full(c.shape[0], np.nan)
+    exact = f_grid == 0
+    change = np.sign(f_grid[:, :-1]) * np.sign(f_grid[:, 1:]) < 0
+
+    # pick the grid root or bracket closest to r = 0 for each row.
+    r_grid = np.abs(1 / x_grid - 1)
+    d_exact = np.where(exact, r_grid, np.inf)
+    d_change = np.where(change, np.minimum(r_grid[:-1], r_grid[1:]), np.inf)
+    k_exact = d_exact.argmin(axis=1)
+    k_change = d_change.argmin(axis=1)
+    rows = np.arange(c.shape[0])
+    use_exact = d_exact[rows, k_exact] <= d_change[rows, k_change]
+    on_grid = use_exact & np.isfinite(d_exact[rows, k_exact])
+    rate[on_grid] = 1 / x_grid[k_exact[on_grid]] - 1
+
+    solve = ~use_exact & np.isfinite(d_change[rows, k_change])
+    if solve.any():
+        cs = c[solve]
+        a = x_grid[k_change[solve]]
+        b = x_grid[k_change[solve] + 1]
+        fa = f_grid[solve, k_change[solve]]
+        x = (a + b) / 2
+        dt = t[1:] * cs[:, 1:]  # coefficients of the derivative.
+
+        for it in range(0, max_iter):
+            xp = x[:, None] ** t
+            f = (cs * xp).sum(axis=1)
+            df = (dt * xp[:, :-1]).sum(axis=1)
+
+            left = np.sign(f) == np.sign(fa)  # root lies between x and b.
+            a = np.where(left, x, a)
+            fa = np.where(left, f, fa)
+            b = np.where(left, b, x)
+
+            with np.errstate(divide='ignore', invalid='ignore'):
+                x_new = x - f / df
+            bisect = ~((x_new >= a) & (x_new <= b))
+            x_new = np.where(bisect, (a + b) / 2, x_new)
+            x_new = np.where(f == 0, x, x_new)
+
+            done = np.abs(x_new - x) <= tol * np.abs(x)
+            x = x_new
+            if done.all():
+                break
+
+        rate[solve] = 1 / x - 1
+
+    rate[~c.any(axis=1)] = np.nan  # no cash flow has no rate of return.
+
+    # a grid cell can hide a double root or a pair of roots, so rows with more than one sign change, or a sign
+    # change but no root on the grid, are solved by numpy_financial.irr.
+    s = np.sign(c)
+    last = np.maximum.accumulate(np.where(s != 0, t, 0), axis=1)  # last nonzero cash flow so far.
+    s = s[rows[:, None], last]
+    changes = (s[:, 1:] * s[:, :-1] < 0).sum(axis=1)
+    for i in np.where((changes > 1) | ((changes == 1) & np.isnan(rate)))[0]:
+        rate[i] = npf.irr(c[i])
+
+    return rate.reshape(shape)
+
+
+def Evaluate(flows, CC, imp_price, ccl, exp_price, co2, d_rate):
+    """
+    Price the annual energy flows of every permutation for a set of scenarios.
+
+    imp_price, ccl, exp_price, co2 and d_rate may be scalars or arrays of shape (n_scenarios,). The results
+    have shape (n_scenarios, n_perm), and the cash flows (n_scenarios, n_perm, n_years). IRR is returned as
+    a fraction and NPV in £.
+    """
+    imp_price, ccl, exp_price, co2, d_rate = np.broadcast_arrays(*[np.atleast_1d(np.asarray(x, dtype=float))
+                                                                   for x in (imp_price, ccl, exp_price, co2, d_rate)])
+    GIE_years = flows['GIE (kWh)']
+    GEE_years = flows['GEE (kWh)']
+
+    imp = (imp_price + ccl)[:, None]  # cost of each imported kWh (£/kWh)
+    exp = exp_price[:, None]  # income from each exported kWh (£/kWh)
+
+    ARC_base = flows['Energy sum (kWh)'] * (imp_price + ccl)  # annual running cost with no renewables (£)
+
+    Imp_cost = GIE_years[None, :, :] * imp[:, :, None]  # annual cost of imported electricity (£)
+    Exp_income = GEE_years[None, :, :] * exp[:, :, None]  # annual income from exported electricity (£)
+
+    CO2 = GIE_years[:, 0] * co2[:, None]  # CO2e emissions in the first year (kg)
+
+    return Price(ARC_base, Imp_cost, Exp_income, CO2, CC, d_rate)
+
+
+def Price(ARC_base, Imp_cost, Exp_income, CO2, CC, d_rate):
+    """
+    Cash flows, NPV and IRR of every scenario and permutation from the annual cost of imports and income from
+    exports, shape (n_scenarios, n_perm, n_years), and the annual running cost with no renewables, shape
+    (n_scenarios,). Shared by Evaluate and Tariff.Evaluate.
+    """
+    Ann_cost = Imp_cost - Exp_income
+    Cash_flow = ARC_base[:, None, None] - Ann_cost
+    Cash_flow[:, :, 0] = Cash_flow[:, :, 0] - CC[None, :]  # subtract capital cost from first year of cash flow.
+
+    ARC = Ann_cost[:, :, -1]  # annual running cost in the final year (£)
+
+    NPV_s = NPV(d_rate[:, None], Cash_flow)
+    IRR_s = IRR(Cash_flow)
+
+    return {'ARC (£)': ARC, 'CC (£)': np.broadcast_to(CC, ARC.shape), 'Cash flow (£)': Cash_flow,
+            'IRR': IRR_s, 'NPV (£)': NPV_s, 'CO2e Emissions (kg)': CO2}
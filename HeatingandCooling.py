@@ -336,9 +336,9 @@ def HC(PV_data, ST):
     TCd_c = pd.DataFrame.to_dict(TCd_c)
     TCd_h = pd.DataFrame.to_dict(TCd_h)
 
-    TCAf = dm4bem.TCAss(TCd_f, AssX)
-    TCAc = dm4bem.TCAss(TCd_c, AssX)
-    TCAh = dm4bem.TCAss(TCd_h, AssX)
+    TCAf = dm4bem.TCAss(TCd_f, AssX, sparse=True)
+    TCAc = dm4bem.TCAss(TCd_c, AssX, sparse=True)
+    TCAh = dm4bem.TCAss(TCd_h, AssX, sparse=True)
 
     DeltaT = 5
     DeltaBlind = 2
@@ -14,18 +14,312 @@ Inputs:
     - T_outlet, outlet temperature of water for DHW (C).
     - ST_A, dataframe of the different sizes of solar thermal collector arrays (m^2).
     - PV_Cap, dataframe of the different capacities of the PV solar installations (kWp).
+    - batch, dispatch all permutations together in one compiled call instead of one at a time.
+    - batch_years, dispatch every permutation and year of PV degradation together in one compiled call.
+    - n_anchor, number of years to dispatch (at least 2), the annual totals in between are interpolated (None = every year).
+    - cache, directory in which the annual energy flows are cached between runs (None = no cache).
+    - days, typical days from TypicalDays.Cluster to dispatch instead of the full year (None = full year).
+    - days_check, number of permutations also dispatched over the full year to report the error of the typical
+      days, which is printed and kept in Results.attrs['Typical days error'] (0 = no check).
+    - prune, skip the permutations whose bounds show they can't have the highest NPV or lowest CO2e emissions.
+      The number pruned is printed and kept in Results.attrs['Pruned'].
+    - store, directory of a results store which each chunk of permutations is written to as it is evaluated,
+      and which a later run with the same store and inputs resumes from, a store of other inputs raises (None = no store).
+    - chunk, number of permutations evaluated and written to the store at a time.
 
 Outputs:
     - Dataframe containing the results of every permutation.
 
+The dispatch of every permutation (Flows) is kept separate from the pricing of its energy flows
+(Finance.Evaluate), so tariff and discount rate changes can be evaluated without a new dispatch.
+
 Author: C.Gerike-ROberts 26th January 2023.
 """
+import hashlib
+import os
 import numpy as np
 import pandas as pd
-import numpy_financial as npf
+import Dispatch
+import Finance
+import Store
+import Telemetry
+import TypicalDays
+
+
+def Profiles(E, DHW, ST, PV):
+    """
+    Demand and generation profiles as contiguous float arrays, with one row per permutation for ST and PV.
+    """
+    E_arr = E['0'].to_numpy(dtype=float)  # electricity consumption as a contiguous array (kWh)
+    DHW_arr = DHW['Total Usage (kWh)'].to_numpy(dtype=float)  # DHW consumption as a contiguous array (kWh)
+    ST_all, PV_all = Generation(ST, PV)
+
+    return E_arr, DHW_arr, ST_all, PV_all
+
+
+def Generation(ST, PV):
+    """
+    ST and PV generation profiles as contiguous float arrays, with one row per permutation.
+    """
+    n_perm = len(ST.columns) - 1  # number of PV and ST permutations
+    ST_all = np.ascontiguousarray(ST.iloc[:, 1:(n_perm+1)].to_numpy(dtype=float).T)  # ST generation, one row per permutation
+    PV_all = np.ascontiguousarray(PV.iloc[:, 5:(n_perm+5)].to_numpy(dtype=float).T)  # PV generation, one row per permutation
+
+    return ST_all, PV_all
+
+
+def Anchor_years(n_years, pv_deg, n_anchor=None):
+    """
+    Years of analysis which are dispatched and their PV degradation factors.
+    """
+    years = np.arange(n_years)  # years of analysis which are dispatched.
+    if n_anchor is not None:
+        if n_anchor < 2:
+            raise ValueError('n_anchor must be at least 2, the first and last years of analysis')
+        years = np.unique(np.round(np.linspace(0, n_years - 1, n_anchor)).astype(int))
+    deg = 1 - (years * (pv_deg/100))  # PV degradation factor for each dispatched year.
+
+    return years, deg
+
+
+def Annual(sim, years, n_years):
+    """
+    Annual totals for every year of analysis from the totals of the dispatched years, shape (n_perm, len(years)).
+    """
+    if len(years) == n_years:
+        return sim
+
+    # interpolate the annual totals between the anchor years.
+    return np.array([np.interp(np.arange(n_years), years, sim[j]) for j in range(0, sim.shape[0])])
+
+
+def Bounds(E, DHW, ST, PV, B_cap, B_charge, B_discharge, n_years, pv_deg):
+    """
+    Lower and upper bounds on the annual imported and exported electricity of every permutation and year of
+    analysis, shape (n_perm, n_years), found hour by hour from the profiles without any dispatch.
+
+    Each hour is bounded whatever the battery and tank state of charge: the battery can't move more than
+    min(B_cap, power) in an hour, DHW imports replace the E imports, and the DHW imports can fall to minus the
+    PV generation when there is no ST, as in Dispatch. Over the year the battery can't discharge more than its
+    initial charge plus the PV it could have stored.
+    """
+    E_arr, DHW_arr, ST_all, PV_all = Profiles(E, DHW, ST, PV)
+    years, deg = Anchor_years(n_years, pv_deg)
+
+    E_pos = np.maximum(E_arr, 0)  # only positive demand is met by the dispatch.
+    DHW_r = np.where(DHW_arr > 0, np.maximum(DHW_arr - ST_all, 0), 0)  # DHW demand not met by ST (kWh)
+    dhw = DHW_r > 0  # hours in which the DHW imports may replace the E imports.
+    ch = min(B_cap, B_charge)  # most energy the battery can charge in an hour (kWh)
+    dis = min(B_cap, B_discharge)  # most energy the battery can discharge in an hour (kWh)
+
+    bounds = {k: np.zeros((ST_all.shape[0], n_years), dtype=float) for k in ['GIE min', 'GIE max', 'GEE min', 'GEE max']}
+
+    for y in range(0, n_years):
+        PV_deg = PV_all * deg[y]  # degraded PV production for this year of analysis (kWh)
+        E_min = np.maximum(E_pos - PV_deg - dis, 0)
+        E_max = np.maximum(E_pos - PV_deg, 0)
+        PV_r = np.maximum(PV_deg - E_pos, 0)  # PV left after meeting E demand (kWh)
+
+        # the battery can't discharge more over the year than its initial charge plus the PV it can store.
+        E_min_year = np.maximum(np.where(dhw, 0, E_min).sum(axis=1),
+                                np.where(dhw, 0, E_max).sum(axis=1) - B_cap/4 - np.minimum(PV_r, ch).sum(axis=1))
+        bounds['GIE min'][:, y] = np.where(dhw, np.minimum(E_min, np.where(ST_all > 0, 0, -PV_deg)), 0).sum(axis=1) + \
+            E_min_year
+        bounds['GIE max'][:, y] = np.maximum(E_max, DHW_r).sum(axis=1)
+        bounds['GEE min'][:, y] = np.maximum(PV_r - ch - DHW_r, 0).sum(axis=1)
+        bounds['GEE max'][:, y] = PV_r.sum(axis=1)
+
+    return bounds
+
+
+def Prune(bounds, Energy_sum, CC, imp_price, ccl, exp_price, co2, d_rate, IRR_min=0.1):
+    """
+    Permutations which can't have the highest NPV or the lowest CO2e emissions, from the bounds on their flows.
+
+    The highest NPV is only sought among permutations with an IRR of at least IRR_min, as in PHPP. A
+    permutation is pruned when its best NPV is below the worst NPV of another permutation whose worst IRR is at
+    least IRR_min, and its lowest CO2e emissions are above the highest emissions of another. The worst flows
+    give the lowest IRR when the capital cost is followed by savings. Prices and emissions factors must not be
+    negative. Returns a boolean array, True for the pruned permutations.
+    """
+    best = Finance.Evaluate({'GIE (kWh)': bounds['GIE min'], 'GEE (kWh)': bounds['GEE max'],
+                             'Energy sum (kWh)': Energy_sum}, CC, imp_price, ccl, exp_price, co2, d_rate)
+    worst = Finance.Evaluate({'GIE (kWh)': bounds['GIE max'], 'GEE (kWh)': bounds['GEE min'],
+                              'Energy sum (kWh)': Energy_sum}, CC, imp_price, ccl, exp_price, co2, d_rate)
+    NPV_max, CO2_min = best['NPV (£)'][0], best['CO2e Emissions (kg)'][0]
+    NPV_min, CO2_max = worst['NPV (£)'][0], worst['CO2e Emissions (kg)'][0]
+
+    feasible = worst['IRR'][0] >= IRR_min  # permutations certain to meet the IRR constraint, NaN never does.
+    NPV_floor = NPV_min[feasible].max() if feasible.any() else np.inf
+
+    return (NPV_max < NPV_floor) & (CO2_min > CO2_max.min())
+
+
+def Flows(E, DHW, ST, PV, B_cap, B_charge, B_discharge, TS_size, TS_leak, T_inlet, T_outlet, n_years, pv_deg,
+          batch=False, batch_years=False, n_anchor=None, cache=None, days=None, perms=None, hourly=False):
+    """
+    Annual energy flows of every permutation, the first stage of Optimiz.
+
+    Returns a dictionary with the imported and exported electricity of each permutation and year of analysis,
+    shape (n_perm, n_years), and the final year ST waste, annual PV generation and base energy demand. When
+    cache is a directory the flows are saved there and reloaded by later calls with the same inputs.
+
+    days, the hours and weights of typical days from TypicalDays.Cluster, dispatches only those hours and
+    weights them up to annual totals.
+
+    perms, the indices of the permutations to dispatch (None = every permutation).
+
+    hourly, also return the hourly imported and exported electricity of the dispatched years, shape
+    (n_perm, n_dispatched_years, n_hours), with the dispatched years, hours and hourly weights and the hourly
+    base demand, for pricing with time of use tariffs in Tariff.Evaluate.
+    """
+    E_arr, DHW_arr, ST_all, PV_all = Profiles(E, DHW, ST, PV)
+    if perms is not None:
+        ST_all, PV_all = ST_all[perms], PV_all[perms]
+    n_perm = ST_all.shape[0]  # number of PV and ST permutations
+    PV_gen = PV_all.sum(axis=1)  # annual PV generation (kWh)
+
+    if days is None:
+        hours, weights = np.arange(len(E_arr)), np.ones(len(E_arr))
+        total = lambda X: X.sum(axis=1)  # annual total of each row of an hourly array.
+    else:
+        hours, weights = days[0], days[1]
+        E_arr, DHW_arr, ST_all, PV_all = E_arr[hours], DHW_arr[hours], ST_all[:, hours], PV_all[:, hours]
+        total = lambda X: X @ weights
+
+    if cache is not None:
+        key = hashlib.sha1()
+        for x in (E_arr, DHW_arr, ST_all, PV_all):
+            key.update(x.tobytes())
+        key.update(repr((B_cap, B_charge, B_discharge, TS_size, TS_leak, T_inlet, T_outlet, n_years, pv_deg,
+                         n_anchor, hourly)).encode())
+        if days is not None:
+            key.update(np.asarray(days[0]).tobytes() + np.asarray(days[1], dtype=float).tobytes())
+        path = os.path.join(cache, key.hexdigest() + '.npz')
+        if os.path.exists(path):
+            with np.load(path) as f:
+                return {k: f[k] for k in f.files}
+
+    ## calculate annual imported and exported electricity of every permutation for the number of years of analysis.
+
+    years, deg = Anchor_years(n_years, pv_deg, n_anchor)
+    progress = Telemetry.Progress(n_perm * len(years), 'Flows', unit='dispatches')
+
+    GIE_sim = np.zeros((n_perm, len(years)), dtype=float)  # imported energy in the dispatched years (kWh)
+    GEE_sim = np.zeros((n_perm, len(years)), dtype=float)  # exported energy in the dispatched years (kWh)
+    if hourly:
+        GIE_h = np.zeros((n_perm, len(years), len(E_arr)), dtype=float)  # hourly imports of the dispatched years (kWh)
+        GEE_h = np.zeros((n_perm, len(years), len(E_arr)), dtype=float)  # hourly exports of the dispatched years (kWh)
+
+    if batch_years:
+        PV_deg = (PV_all[:, None, :] * deg[:, None]).reshape(n_perm * len(years), -1)  # one row per permutation and year
+        n_rows = n_perm * len(years)
+        rows = [np.zeros(n_rows, dtype=int), np.zeros(n_rows, dtype=int), np.repeat(np.arange(n_perm), len(years)),
+                np.arange(n_rows)]  # rows of E, DHW, ST and PV, the ST profile of a permutation is shared by its years.
+        GIE, GEE, ST_waste, B_SOC, TS_SOC = Dispatch.dispatch_batch(E_arr, DHW_arr, ST_all, PV_deg, B_cap, B_charge,
+                                                                    B_discharge, TS_size, TS_leak, T_inlet, T_outlet,
+                                                                    rows=rows)
+        GIE_sim[:, :] = total(GIE).reshape(n_perm, len(years))
+        GEE_sim[:, :] = total(GEE).reshape(n_perm, len(years))
+        ST_waste_tot_all = total(ST_waste).reshape(n_perm, len(years))[:, -1]  # final year (kWh)
+        Telemetry.Violation('hours with negative imports', np.count_nonzero(GIE < 0))
+        progress.update(n_perm * len(years))
+        if hourly:
+            GIE_h[:, :, :] = GIE.reshape(n_perm, len(years), -1)
+            GEE_h[:, :, :] = GEE.reshape(n_perm, len(years), -1)
+
+    else:
+        for y in range(0, len(years)):
+            PV_deg = PV_all * deg[y]  # degraded PV production for this year of analysis (kWh)
+
+            if batch:
+                GIE, GEE, ST_waste, B_SOC, TS_SOC = Dispatch.dispatch_batch(E_arr, DHW_arr, ST_all, PV_deg, B_cap,
+                                                                            B_charge, B_discharge, TS_size, TS_leak,
+                                                                            T_inlet, T_outlet)
+            else:
+                GIE = np.zeros(PV_deg.shape, dtype=float)  # grid imported electricity (kWh)
+                GEE = np.zeros(PV_deg.shape, dtype=float)  # grid exported electricity (kWh)
+                ST_waste = np.zeros(PV_deg.shape, dtype=float)  # wasted solar thermal generation (kWh)
+                for j in range(0, n_perm):
+                    GIE[j], GEE[j], ST_waste[j], B_SOC, TS_SOC = Dispatch.dispatch(E_arr, DHW_arr, ST_all[j],
+                                                                                   PV_deg[j], B_cap, B_charge,
+                                                                                   B_discharge, TS_size, TS_leak,
+                                                                                   T_inlet, T_outlet)
+                    progress.update()
+
+            if batch:
+                progress.update(n_perm)
+            Telemetry.Violation('hours with negative imports', np.count_nonzero(GIE < 0))
+
+            GIE_sim[:, y] = total(GIE)  # add total imported electricity to year of analysis.
+            GEE_sim[:, y] = total(GEE)  # add total exported electricity to year of analysis.
+            if hourly:
+                GIE_h[:, y, :] = GIE
+                GEE_h[:, y, :] = GEE
+
+        ST_waste_tot_all = total(ST_waste)  # wasted solar thermal generation in the final year (kWh)
+
+    flows = {'GIE (kWh)': Annual(GIE_sim, years, n_years), 'GEE (kWh)': Annual(GEE_sim, years, n_years), 'ST waste (kWh)': ST_waste_tot_all,
+             'PV gen (kWh)': PV_gen,
+             'Energy sum (kWh)': E['0'].sum() + DHW['Total Usage (kWh)'].sum()}
+    if hourly:
+        flows.update({'GIE hourly (kWh)': GIE_h, 'GEE hourly (kWh)': GEE_h, 'Demand hourly (kWh)': E_arr + DHW_arr,
+                      'Years': years, 'Hours': hours, 'Weights': weights})
+
+    if cache is not None:
+        os.makedirs(cache, exist_ok=True)
+        np.savez(path, **flows)
+
+    return flows
+
+
+def Results_table(flows, Fuel, d_rate, PV_Price, ST_Price, ST_A, PV_Cap, perms=None):
+    """
+    Results dataframe of the base scenario with no renewables and every permutation, from their energy flows.
+
+    perms, the permutations the flows are for (None = every permutation). The base scenario is row 0 and
+    permutation j is row j + 1.
+    """
+    ## define results dataframe
+    results_cols = ['PV (kW)', 'ST (m2)', 'IRR (%)', 'NPV (£ 000s)', 'IE (kWh)', 'PV (kWh)',
+                    'GE (kWh)', 'ARC (£)', 'CC (£)',
+                    'CO2e Emissions (kg)', 'ST Waste (kWh)']  # create column names for results dataframe
 
+    ## find results for base scenario with no renewable technology
+    Energy_sum = flows['Energy sum (kWh)']  # annual energy usage
+    ARC_base = Energy_sum * (Fuel['Import Price (£/kWh)']['Grid Electricity'] + Fuel['CCL (£/kWh)']['Grid Electricity'])
+    CO2 = Energy_sum * Fuel['CO2e Emissions (kgCO2e/kWh)']['Grid Electricity']
 
-def Optimiz(E , DHW, ST, PV, B_cap, B_charge, B_discharge, TS_size, TS_leak, T_inlet, T_outlet, ST_A, PV_Cap):
+    base_results = [0, 0, 0, 0, Energy_sum, 0, 0, ARC_base, 0, CO2, 0]  # collate data into list
+
+    ## price the annual energy flows of every permutation.
+
+    PV_iteration, ST_iteration, CC = Finance.Capital_cost(PV_Cap, ST_A, PV_Price, ST_Price)
+    if perms is None:
+        perms = np.arange(len(CC))
+    PV_iteration, ST_iteration, CC = PV_iteration[perms], ST_iteration[perms], CC[perms]
+
+    Fin = Finance.Evaluate(flows, CC, Fuel['Import Price (£/kWh)']['Grid Electricity'],
+                           Fuel['CCL (£/kWh)']['Grid Electricity'], Fuel['Export Price (£/kWh)']['Grid Electricity'],
+                           Fuel['CO2e Emissions (kgCO2e/kWh)']['Grid Electricity'], d_rate)
+
+    ## collate the results of every permutation into columns, below the base scenario.
+
+    perm_results = [PV_iteration, ST_iteration, np.round(Fin['IRR'][0] * 100, 2),
+                    np.round(Fin['NPV (£)'][0] / 1000, 3), flows['GIE (kWh)'][:, -1], flows['PV gen (kWh)'],
+                    flows['GEE (kWh)'][:, -1], Fin['ARC (£)'][0], CC, Fin['CO2e Emissions (kg)'][0],
+                    flows['ST waste (kWh)']]
+
+    Results = pd.DataFrame({results_cols[k]: np.concatenate([[base_results[k]], perm_results[k]]).astype(float)
+                            for k in range(0, len(results_cols))}, index=np.concatenate([[0], np.asarray(perms) + 1]))
+    Results.index.names = ['j']
+
+    return Results
+
+
+def Optimiz(E , DHW, ST, PV, B_cap, B_charge, B_discharge, TS_size, TS_leak, T_inlet, T_outlet, ST_A, PV_Cap,
+            batch=False, batch_years=False, n_anchor=None, cache=None, days=None, prune=False, store=None, chunk=16,
+            days_check=3):
 
     ## import additional information from excel spreadsheets
     Fuel = pd.read_excel('Financials.xlsx', sheet_name='Fuel', usecols='A:E', index_col=0)  # import fuel data
@@ -43,348 +337,81 @@ def Optimiz(E , DHW, ST, PV, B_cap, B_charge, B_discharge, TS_size, TS_leak, T_i
     st_deg = Gen['Input']['PV Degradation (%/year)']  # st degradation per year.
     d_rate = Gen['Input']['Discount Rate (%)'] / 100  # discount rate.
 
-    ## define results dataframe
-    results_cols = ['PV (kW)', 'ST (m2)', 'IRR (%)', 'NPV (£ 000s)', 'IE (kWh)', 'PV (kWh)',
-                    'GE (kWh)', 'ARC (£)', 'CC (£)',
-                    'CO2e Emissions (kg)', 'ST Waste (kWh)']  # create column names for results dataframe
-    Results = pd.DataFrame(columns=results_cols)  # create dataframe with column names
-
-    ## find results for base scenario with no renewable technology
-    E_sum = np.sum(E)  # sum annual energy usage
-    DHW_sum = np.sum(DHW)
-    Energy_sum = E_sum[0] + DHW_sum[0]
-    PV_cap = 0
-    ST_a = 0
-    PV_gen = 0
-    Exp_E = 0
-    IRR = 0
-    NPV = 0
-    ARC_base = Energy_sum * (Fuel['Import Price (£/kWh)']['Grid Electricity'] + Fuel['CCL (£/kWh)']['Grid Electricity'])
-    CC = 0
-    CO2 = Energy_sum * Fuel['CO2e Emissions (kgCO2e/kWh)']['Grid Electricity']
-    ST_waste_base = 0
-
-    base_results = [PV_cap, ST_a, IRR, NPV, Energy_sum, PV_gen, Exp_E, ARC_base, CC, CO2, ST_waste_base]  # collate data into list
-    numEl = len(base_results)  # find length of list
-    newRow = pd.DataFrame(np.array(base_results).reshape(1, numEl),
-                          columns=list(Results.columns))  # alter numpy array to collate with Fabric_type dataframe
-    Results = Results.append(newRow, ignore_index=True)
-
-    for j in range(0, (len(ST.columns)-1)):
-        ST_c = ST.iloc[:, (j+1)]  # define solar thermal generation for this iteration
-        PV_c = PV.iloc[:, (j+5)]  # define PV solar generation for this iteration
-
-        GIE_years = np.zeros(n_years, dtype=float)  # imported energy over analysis years (kWh)
-        GEE_years = np.zeros(n_years, dtype=float)  # exported energy over analysis years (kWh)
-
-
-        ## calcualate incoming cash flow for the number of years of analysis.
-
-        for h in range(0, n_years):
-            PV_deg = PV_c * (1 - (h * (pv_deg/100))) # extract PV production for time step (kWh)
-
-            GIE = np.zeros((len(PV)), dtype=float)  # grid imported electricity (kWh)
-            GEE = np.zeros((len(PV)), dtype=float)  # grid exported electricity (kWh)
-            B_SOC = np.zeros((len(PV) + 1), dtype=float)  # battery state of charge (kWh)
-            TS_SOC = np.zeros((len(PV) + 1), dtype=float)  # thermal storage state of charge (kWh)
-            ST_waste = np.zeros((len(PV)), dtype=float)  # wasted solar thermal generation (kWh)
-
-            TS_max = (4.2 * (T_outlet - T_inlet) * TS_size) * (1 / 3600)  # maximum storage size of hot water tank (kWh)
-
-            TS_SOC[0] = (TS_max / 4)  # set initial hot water capacity to half of maximum storage (kWh).
-
-            B_SOC[0] = (B_cap / 4)  # set initial battery capacity to half of maximum battery capacity (kWh).
-
-            ## calculate annual imported electricity, exported electricity and renewable technology utilisation for iteration.
-
-            for i in range(0, len(PV)):
-                PV_step = PV_deg[i]
-                ST_step = ST_c[i]  # extract ST production for time step (kWh)
-                E_step = E['0'][i]  # extract electricity consumption for time step (kWh)
-                DHW_step = DHW['Total Usage (kWh)'][i]  # extract DHW consumption for time step (kWh)
-
-                PV_step_r = 'x'  # initialise remaining PV production to zero.
-
-                ## determine how to meet E demand and the imported and exported electricity.
-
-                if E_step > 0:  # if electricity demand is greater than zero.
-                    if PV_step > 0:  # if pv production is greater than zero.
-                        if PV_step >= E_step:  # if pv production is greater or equal to electricity demand.
-                            PV_step_r = PV_step - E_step  # subtract electric demand to get remaining pv generation.
-                            E_step_r = 0  # electricity demand has been met with pv generation.
-                            if B_SOC[i] < B_cap:  # if battery state of charge is lower than battery maximum capacity.
-                                if (B_cap - B_SOC[i]) > B_charge:  # if remaining capacity is greater than the battery charging power.
-                                    if PV_step_r <= B_charge:  # if remaining PV generation is less than or equal to the battery charging power.
-                                        B_SOC[i + 1] = B_SOC[i] + PV_step_r  # add PV generation to battery capacity.
-                                    else:  # remaining PV generation is larger than the battery charging power.
-                                        B_SOC[i + 1] = B_SOC[i] + B_charge  # increase battery capacity by battery charging power.
-                                        PV_step_r = PV_step_r - B_charge  # export remaining PV generation after charging battery to the grid.
-                                else:  # remaining capacity is less than or equal to the battery charging power.
-                                    if PV_step_r >= (B_cap - B_SOC[i]):  # if remaining pv generation is greater than or equal to remaining battery capacity.
-                                        B_SOC[i + 1] = B_cap  # increase battery SOC to maximum charge.
-                                        PV_step_r = PV_step_r - (B_cap - B_SOC[i])  # export remaining PV generation after fully charging battery.
-                                    else:  # remaining pv generation is less than remaining battery capacity.
-                                        B_SOC[i + 1] = B_SOC[i] + PV_step_r  # increase battery SOC by remaining PV generation.
-                            else:  # battery is full.
-                                PV_step_r = PV_step_r  # export remaining pv generation.
-                        else:  # pv production is less than the electricity demand.
-                            E_step_r = E_step - PV_step  # remaining electricity demand after using all pv generation.
-                            PV_step_r = 0  # no remaining pv generation.
-                            if B_SOC[i] > 0:  # if battery soc is greater than zero.
-                                if B_SOC[i] >= B_discharge:  # if remaining battery capacity availability is larger than or equal to the battery discharge power.
-                                    if E_step_r <= B_discharge:  # if remaining electricity demand is less or equal to the battery discharge power.
-                                        B_SOC[i + 1] = B_SOC[i] - E_step_r  # reduce battery SOC by battery discharge power.
-                                        E_step_r = 0  # remaining electricity demand has been met with battery discharge power.
-                                    else:  # discharge battery power is too small to meet electricity demand.
-                                        E_step_r = E_step_r - B_discharge  # subtract battery discharge power from remaining electricity demand.
-                                        B_SOC[i + 1] = B_SOC[i] - B_discharge  # reduce battery SOC by battery discharge power.
-                                        GIE[i] = GIE[i] + E_step_r  # import electricity for remaining electricity demand and add to imported electricity demand for time step.
-                                        E_step_r = 0  # electricity demand has been met
-                                else:  # battery state of charge is less than the battery discharge power.
-                                    if E_step_r >= B_SOC[i]:  # if electricity demand is greater than or equal to the battery state of charge.
-                                        E_step_r = E_step_r - B_SOC[i]  # reduce remaining electricity demand by battery state of charge.
-                                        B_SOC[i + 1] = 0  # battery SOC is zero.
-                                        GIE[i] = GIE[i] + E_step_r  # import electricity to meet remaining electricity demand and add to imported electricity demand for time step.
-                                        E_step_r = 0  # remaining electricity demand has been met.
-                                    else:  # electricity demand is less than the battery state of charge.
-                                        B_SOC[i + 1] = B_SOC[i] - E_step_r  # reduce battery state of charge by remaining electricity demand.
-                                        E_step_r = 0  # remaining electricity demand has been met.
-                            else:  # no battery charge available.
-                                GIE[i] = GIE[i] + E_step_r  # import electricity to meet the rest of the demand.
-                                E_step_r = 0  # electricity demand has been met.
-
-                    elif B_SOC[i] > 0:  # else if battery state of charge is greater than zero.
-                        PV_step_r = 0  # set remaining PV generation to zero.
-                        if B_SOC[i] >= B_discharge:  # if remaining battery capacity availability is larger than or equal to the battery discharge power.
-                            if E_step <= B_discharge:  # if remaining electricity demand is less or equal to the battery discharge power.
-                                B_SOC[i + 1] = B_SOC[i] - E_step  # reduce battery SOC by battery discharge power.
-                                E_step_r = 0  # remaining electricity demand has been met with battery discharge power.
-                            else:  # discharge battery power is too small to meet electricity demand.
-                                E_step_r = E_step - B_discharge  # subtract battery discharge power from remaining electricity demand.
-                                B_SOC[i + 1] = B_SOC[i] - B_discharge  # reduce battery SOC by battery discharge power.
-                                GIE[i] = GIE[i] + E_step_r  # import electricity for remaining electricity demand and add to imported electricity demand for time step.
-                                E_step_r = 0  # electricity demand has been met
-                        else:  # battery state of charge is less than the battery discharge power.
-                            if E_step >= B_SOC[i]:  # if electricity demand is greater than or equal to the battery state of charge.
-                                E_step_r = E_step - B_SOC[i]  # reduce remaining electricity demand by battery state of charge.
-                                B_SOC[i + 1] = 0  # battery SOC is zero.
-                                GIE[i] = GIE[i] + E_step_r  # import electricity to meet remaining electricity demand and add to imported electricity demand for time step.
-                                E_step_r = 0  # remaining electricity demand has been met.
-                            else:  # electricity demand is less than the battery state of charge.
-                                B_SOC[i + 1] = B_SOC[i] - E_step  # reduce battery state of charge by remaining electricity demand.
-                                E_step_r = 0  # remaining electricity demand has been met.
-
-                    else:  # no battery charge or pv generation available.
-                        GIE[i] = GIE[i] + E_step  # add electricity demand to imported electricity
-                        E_step_r = 0  # electricity demand has been met by imported electricity
-                        PV_step_r = 0  # remaining PV generation is zero.
-
-                else:  # no electricity demand
-                    if PV_step > 0:  # if pv generation is greater than zero.
-                        if B_SOC[i] < B_cap:  # if battery is not full.
-                            if (B_cap - B_SOC[i]) >= B_charge:  # if remaining battery capacity availability is greater than battery charging power.
-                                if PV_step >= B_charge:  # if pv generation is larger than or equal to the battery charging power.
-                                    B_SOC[i + 1] = B_SOC[i] + B_charge  # increase battery state of charge by battery charging power.
-                                    PV_step_r = PV_step - B_charge  # export remaining pv generation after battery charging to the grid.
-                                else:
-                                    B_SOC[i + 1] = B_SOC[i] + PV_step  # charge battery with pv generation.
-                                    PV_step_r = 0  # remaining PV generation is zero.
-                            else:  # remaining battery capacity is less than charging power.
-                                if PV_step >= (B_cap - B_SOC[i]):  # if pv generation is larger than battery capacity availability.
-                                    B_SOC[i + 1] = B_cap  # battery is fully charged.
-                                    PV_step_r = PV_step - (B_cap - B_SOC[i])  # remaining pv generation after battery charging is exported to the grid.
-                                else:  # pv generation is less than the available battery capacity.
-                                    B_SOC[i + 1] = B_SOC[i] + PV_step  # charge battery from pv generation.
-                                    PV_step_r = 0  # remaining PV generation is zero.
-                        else:  # battery is full
-                            PV_step_r = PV_step  # pv generation is exported to the grid.
-                    else:  # no pv generation.
-                        PV_step_r = 0  # remaining pv generation is zero..
-
-                if E_step_r == 0:
-                    print('all good with E for this time step bro')
-                else:
-                    print('something wrong with the E for this time step bro')
-                    raise ValueError
-
-                ## determine how to meet DHW demand with imported electricity and ST generation
-                ## and what happens with excess ST generation.
-
-                if DHW_step > 0:  # if DHW consumption is greater than zero.
-                    if ST_step > 0:  # if ST production is greater than zero.
-                        if ST_step >= DHW_step:  # if ST generation is greater or equal to the DHW consumption.
-                            ST_step_r = ST_step - DHW_step  # remaining ST generation after meeting DHW consumption.
-                            if TS_SOC[i] < TS_max:
-                                if (TS_max - TS_SOC[i]) >= ST_step_r:  # if remaining thermal storage level availability is greater than or equal to remaining ST generation.
-                                    TS_SOC[i+1] = TS_SOC[i] + ST_step_r  # increase thermal storage level for next time step with remaining ST generation.
-                                    DHW_step_r = 0  # DHW consumption has been met.
-                                else:
-                                    TS_SOC[i+1] = TS_max  # set thermal storage level to max
-                                    ST_waste[i] = ST_step_r - (TS_max - TS_SOC[i])  # remaining ST generation after filling storage is added to wasted ST generation dataframe.
-                                    DHW_step_r = 0  # DHW consumption has been met.
-                        else:
-                            DHW_step_r = DHW_step - ST_step  # remaining DHW consumption after subtracting ST generation.
-                            if TS_SOC[i] > 0:  # if thermal storage level is larger than zero.
-                                if TS_SOC[i] >= DHW_step_r:  # if thermal storage level is larger than or equal to remaining DHW consumption.
-                                    TS_SOC[i+1] = TS_SOC[i] - DHW_step_r  # reduce thermal storage level for next time step by remaining DHW consumption.
-                                    DHW_step_r = 0  # DHW consumption has been met.
-                                else:
-                                    DHW_step_r = DHW_step_r - TS_SOC[i]  # reduce remaining DHW consumption by thermal storage level.
-                                    TS_SOC[i+1] = 0  # set thermal storage level to zero for next time step.
-                                    if PV_step_r > 0:  # if remaining PV production is greater than zero.
-                                        if PV_step_r >= DHW_step_r:  # if remaining PV generation is greater or equal to the remaining DHW consumption.
-                                            PV_step_r = PV_step_r - DHW_step_r  # Remaining PV generation
-                                            DHW_step_r = 0  # DHW consumption has been met.
-                                        else:
-                                            DHW_step_r = DHW_step_r - PV_step_r  # remaining DHW consumption
-                                            PV_step_r = 0  # remaining PV generation is zero.
-                                            GIE[i] = DHW_step_r  # remaining DHW consumption is met by imported electricity (kWh)
-                                            DHW_step_r = 0  # DHW consumption has been met.
-                                    else:
-                                        GIE[i] = DHW_step_r  # DHW demand comes from imported electricity (kWh)
-                                        DHW_step_r = 0  # DHW consumption has been met.
-                            elif PV_step_r > 0:  # if remaining pv generation is greater than zero.
-                                if PV_step_r >= DHW_step_r:  # if remaining PV generation is larger than or equal to domestic hot water consumption.
-                                    PV_step_r = PV_step_r - DHW_step_r  # Remaining PV generation is replaced in PV generation for time step.
-                                    DHW_step_r = 0  # DHW consumption has been met.
-                                else:
-                                    DHW_step_r = DHW_step_r - PV_step_r  # remaining DHW consumption
-                                    PV_step_r = 0  # PV generation is zero.
-                                    GIE[i] = DHW_step_r  # remaining DHW consumption is met by imported electricity (kWh)
-                                    DHW_step_r = 0  # DHW consumption has been met.
-                            else:
-                                GIE[i] = DHW_step_r  # DHW demand comes from imported electricity (kWh)
-                                DHW_step_r = 0  # DHW consumption has been met.
-
-                    elif TS_SOC[i] > 0:  # if Thermal Storage Level is greater than zero.
-                        if TS_SOC[i] >= DHW_step:  # if Thermal Storage Level is greater than or equal to the DHW consumption for time step (kWh)
-                            TS_SOC[i+1] = TS_SOC[i] - DHW_step  # update thermal storage level for next time step.
-                            DHW_step_r = 0  # DHW consumption has been met.
-                        else:
-                            DHW_step_r = DHW_step - TS_SOC[i]  # remaining DHW consumption
-                            TS_SOC[i+1] = 0  # thermal storage level is set to zero for next time step.
-                            if PV_step_r >= 0:  # if remaining PV production is greater than zero.
-                                if PV_step_r >= DHW_step_r:  # if PV generation is greater or equal to the remaining DHW consumption.
-                                    PV_step_r = PV_step_r - DHW_step_r  # Remaining PV generation
-                                    DHW_step_r = 0  # DHW consumption has been met.
-                                else:
-                                    DHW_step_r = DHW_step_r - PV_step_r  # remaining DHW consumption
-                                    PV_step_r = 0  # PV generation is zero.
-                                    GIE[i] = DHW_step_r  # remaining DHW consumption is met by imported electricity (kWh)
-                                    DHW_step_r = 0  # DHW consumption has been met.
-                            else:
-                                GIE[i] = DHW_step_r  # DHW demand comes from imported electricity (kWh)
-                                DHW_step_r = 0  # DHW consumption has been met.
-
-                    elif PV_step_r > 0:  # if remaining PV production is greater than zero.
-                        if PV_step_r >= DHW_step:
-                            PV_step_r = PV_step_r - DHW_step  # Remaining PV generation is replaced in PV generation for time step.
-                            DHW_step_r = 0  # DHW consumption has been met.
-                        else:
-                            DHW_step_r = DHW_step_r - PV_step  # remaining DHW consumption
-                            PV_step_r = 0  # PV generation is zero.
-                            GIE[i] = DHW_step_r  # remaining DHW consumption is met by imported electricity (kWh)
-                            DHW_step_r = 0  # DHW consumption has been met.
-
-                    else:
-                        GIE[i] = DHW_step  # DHW demand comes from imported electricity (kWh)
-                        DHW_step_r = 0  # DHW consumption has been met.
-
-                else:
-                    if TS_SOC[i] < TS_max:  # if time step thermal storage level is less than maximum storage level.
-                        if (TS_max - TS_SOC[i]) >= ST_step:  # if remaining thermal storage level availability is greater than or equal to remaining ST generation.
-                            TS_SOC[i+1] = TS_SOC[i] + ST_step  # add ST generation to thermal storage level for next time step.
-                            DHW_step_r = DHW['Total Usage (kWh)'][i]  # DHW consumption has been met.
-                        else:
-                            ST_step_r = ST_step - (TS_max - TS_SOC[i])  # remaining ST generation after maxing out thermal storage.
-                            TS_SOC[i+1] = TS_max  # set thermal storage level to max for next time step.
-                            ST_waste[i] = ST_step_r  # add remaining ST generation to ST waste array.
-                            DHW_step_r = DHW['Total Usage (kWh)'][i]  # DHW consumption has been met.
-                    else:
-                        ST_waste[i] = ST_step  # ST generation is wasted.
-                        DHW_step_r = DHW['Total Usage (kWh)'][i]  # DHW consumption has been met.
-
-                if DHW_step_r == 0:
-                    print('all good with DHW for this time step bro')
-                else:
-                    print('something wrong with the DHW for this time step bro')
-                    raise ValueError
-
-                GEE[i] = PV_step_r  # export remaining PV generation
-
-                TS_Litre_step = (3600 * TS_SOC[i+1]) / (4.2 * (T_outlet - T_inlet))  # determine litres of hot water in thermal storage (litres)
-                TS_leak_kWh = (TS_leak * TS_Litre_step) / 1000  # energy leakage from hot water tank (kWh)
-                TS_SOC[i+1] = TS_SOC[i+1] - TS_leak_kWh  # reduce thermal store state by the energy leakage (kWh).
-
-
-
-            GIE_tot = GIE.sum()  # sum together imported electricity array
-            GEE_tot = GEE.sum()  # sum together exported electricity array
-
-            GIE_years[h] = GIE_tot  # add total imported electricity to year of analysis.
-            GEE_years[h] = GEE_tot  # add total exported electricity to year of analysis.
-
-        ## analyse results and add to results dataframe.
-
-        ST_waste_tot = ST_waste.sum()  # sum together wasted solar thermal generation.
-
-        GIE_cost = GIE_years * (Fuel['Import Price (£/kWh)']['Grid Electricity'] + Fuel['CCL (£/kWh)']['Grid Electricity'])
-
-        GEE_cost = GEE_years * Fuel['Export Price (£/kWh)']['Grid Electricity']
-
-        Ann_cost = GIE_cost - GEE_cost
-
-        Cash_flow = ARC_base - Ann_cost
-
-        PV_iteration = round(PV_Cap[j], 2)
-        ST_iteration = round(ST_A[j], 2)
-
-        if PV_iteration > 0:
-            for a in range(0, len(PV_Price)):
-                min = float(PV_Price['Minimum'][a])
-                max = float(PV_Price['Maximum'][a])
-                if min <= PV_iteration <= max:
-                    PV_cost = PV_iteration * PV_Price['Cost (£/kWp)'][a]
-                    break
-                else:
-                    PV_iteration = PV_iteration
-        else:
-            PV_cost = 0
-
-        if ST_iteration > 0:
-            for a in range(0, len(ST_Price)):
-                min = float(ST_Price['Minimum'][a])
-                max = float(ST_Price['Maximum'][a])
-                if min <= ST_iteration <= max:
-                    ST_cost = ST_iteration * ST_Price['Cost (£/m2)'][a]
-                    break
-                else:
-                    ST_iteration = ST_iteration
-        else:
-            ST_cost = 0
-
-
-        ARC = (GIE_tot * (Fuel['Import Price (£/kWh)']['Grid Electricity'] + Fuel['CCL (£/kWh)']['Grid Electricity'])) - \
-              (GEE_tot * Fuel['Export Price (£/kWh)']['Grid Electricity'])
-
-        CC = PV_cost + ST_cost  # capital cost of installing renewables.
-        Cash_flow[0] = Cash_flow[0] - CC  # subtract capital cost from first year of cash flow.
-
-        IRR = round((npf.irr(Cash_flow) * 100), 2)  # calculate IRR (%)
-        NPV = round((npf.npv(d_rate, Cash_flow) / 1000), 3)  # calculate NPV (£ 000's)
-
-        CO2 = GIE_years[0] * Fuel['CO2e Emissions (kgCO2e/kWh)']['Grid Electricity']
-
-        PV_gen = PV_c.sum()  # sum together PV generation
-
-        base_results = [PV_iteration, ST_iteration, IRR, NPV, GIE_tot, PV_gen, GEE_tot, ARC, CC, CO2,
-                        ST_waste_tot]  # collate data into list
-        numEl = len(base_results)  # find length of list
-        newRow = pd.DataFrame(np.array(base_results).reshape(1, numEl),
-                              columns=list(Results.columns))  # alter numpy array to collate with Fabric_type dataframe
-        Results = Results.append(newRow, ignore_index=True)
-
-    Results.index.names = ['j']
+    ## skip the permutations which can't be optimal for either objective, then dispatch the rest and price their flows.
+
+    n_perm = len(PV_Cap)  # number of PV and ST permutations
+    pruned = np.zeros(n_perm, dtype=bool)
+    if prune:
+        PV_iteration, ST_iteration, CC = Finance.Capital_cost(PV_Cap, ST_A, PV_Price, ST_Price)
+        bounds = Bounds(E, DHW, ST, PV, B_cap, B_charge, B_discharge, n_years, pv_deg)
+        pruned = Prune(bounds, E['0'].sum() + DHW['Total Usage (kWh)'].sum(), CC,
+                       Fuel['Import Price (£/kWh)']['Grid Electricity'], Fuel['CCL (£/kWh)']['Grid Electricity'],
+                       Fuel['Export Price (£/kWh)']['Grid Electricity'],
+                       Fuel['CO2e Emissions (kgCO2e/kWh)']['Grid Electricity'], d_rate)
+        print(f'{pruned.sum()} of {len(pruned)} permutations pruned before dispatch.')
+
+    def table(perms):
+        # pruned permutations are kept in the results with no energy flows or financial results.
+        flows = {'GIE (kWh)': np.full((len(perms), n_years), np.nan), 'GEE (kWh)': np.full((len(perms), n_years), np.nan),
+                 'ST waste (kWh)': np.full(len(perms), np.nan), 'PV gen (kWh)': np.full(len(perms), np.nan),
+                 'Energy sum (kWh)': E['0'].sum() + DHW['Total Usage (kWh)'].sum()}
+        run = ~pruned[perms]
+        if run.any():
+            sim = Flows(E, DHW, ST, PV, B_cap, B_charge, B_discharge, TS_size, TS_leak, T_inlet, T_outlet, n_years,
+                        pv_deg, batch=batch, batch_years=batch_years, n_anchor=n_anchor, cache=cache, days=days,
+                        perms=perms[run])
+            for k in ['GIE (kWh)', 'GEE (kWh)', 'ST waste (kWh)', 'PV gen (kWh)']:
+                flows[k][run] = sim[k]
+
+        return Results_table(flows, Fuel, d_rate, PV_Price, ST_Price, ST_A, PV_Cap, perms=perms)
+
+    if store is None:
+        Results = table(np.arange(n_perm))
+
+    else:
+        # write the results a chunk of permutations at a time, skipping those already in the store.
+        key = hashlib.sha1()  # the store is only resumed by a run with the same inputs.
+        for x in Profiles(E, DHW, ST, PV) + (ST_A, PV_Cap):
+            key.update(np.ascontiguousarray(x, dtype=float).tobytes())
+        for x in (Fuel, Gen, PV_Price, ST_Price):
+            key.update(x.to_csv().encode())
+        key.update(repr((B_cap, B_charge, B_discharge, TS_size, TS_leak, T_inlet, T_outlet, n_years, pv_deg,
+                         n_anchor, prune)).encode())
+        if days is not None:
+            key.update(np.asarray(days[0]).tobytes() + np.asarray(days[1], dtype=float).tobytes())
+
+        Results = table(np.arange(0))
+        S = Store.Open(store, list(Results.columns), n_perm + 1, inputs=key.hexdigest())
+        pending = Store.Pending(S)
+        todo = pending[pending > 0] - 1  # permutations not yet in the store.
+        if len(todo) == 0 and len(pending) > 0:
+            Store.Write(S, Results.index, Results)  # only the base case is left, a complete store isn't written.
+        progress = Telemetry.Progress(len(todo), 'Optimiz', unit='permutations')
+        for c in range(0, len(todo), chunk):
+            Results = table(todo[c:(c + chunk)])
+            Store.Write(S, Results.index, Results)
+            progress.update(len(Results) - 1)
+        Results = Store.Load(store)
+
+    Results.attrs['Pruned'] = int(pruned.sum())  # number of permutations skipped by prune.
+
+    ## check the typical days against the full year on a few of the permutations.
+
+    if days is not None and days_check:
+        perms = np.unique(np.round(np.linspace(0, n_perm - 1, days_check)).astype(int))
+        perms = perms[~pruned[perms]]
+        if len(perms) > 0:
+            kw = dict(batch=batch, batch_years=batch_years, n_anchor=n_anchor, cache=cache, perms=perms)
+            full = Flows(E, DHW, ST, PV, B_cap, B_charge, B_discharge, TS_size, TS_leak, T_inlet, T_outlet,
+                         n_years, pv_deg, **kw)
+            reduced = Flows(E, DHW, ST, PV, B_cap, B_charge, B_discharge, TS_size, TS_leak, T_inlet, T_outlet,
+                            n_years, pv_deg, days=days, **kw)
+            error = TypicalDays.Error(reduced, full)
+            error.index = pd.Index(perms + 1, name='j')
+            Results.attrs['Typical days error'] = error
+            print(f'Largest relative error of the typical days against the full year, {len(perms)} permutations: '
+                  + ', '.join(f'{k} {v:.1%}' for k, v in error.abs().max().items()))
     Results.to_csv('Results.csv')
+    Telemetry.Summary()
 
-    return Results
\ No newline at end of file
+    return Results
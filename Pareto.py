@@ -0,0 +1,202 @@
+"""
+Code to search for the NPV, CO2e emissions and capital cost Pareto front of the PV/ST permutation and the
+battery and hot water tank sizes.
+
+Instead of dispatching a full grid of designs, an NSGA-II style search is used. A population of designs is
+evolved by crossover and mutation, ranked by non-dominated sorting and crowding distance, and the best ranked
+designs are kept for the next generation. Every design is dispatched once, repeated designs are taken from a
+cache, and the Pareto front of every design dispatched is returned.
+
+The tank leakage stays fixed at TS_leak, as there is no cost of better insulation to trade it against. The
+battery charge and discharge power are only searched when they are priced by P_cost, otherwise they are set
+to the battery capacity (a 1C battery), as without a cost the search only pushes them to their upper bounds.
+
+Inputs:
+    - E, electricity demand profile.
+    - DHW, domestic hot water demand profile.
+    - ST, solar thermal generation profile.
+    - PV, PV solar generation profile.
+    - TS_leak, thermal leakage of hot water cylinder (W/L).
+    - T_inlet, inlet temperature of water for DHW (C).
+    - T_outlet, outlet temperature of water for DHW (C).
+    - ST_A, dataframe of the different sizes of solar thermal collector arrays (m^2).
+    - PV_Cap, dataframe of the different capacities of the PV solar installations (kWp).
+    - Bounds, dictionary of (min, max) of 'B_cap' (kWh), 'B_charge' (kW), 'B_discharge' (kW) and 'TS_size' (L),
+      the power bounds are only needed with P_cost.
+    - B_cost, capital cost of battery storage (£/kWh).
+    - TS_cost, capital cost of hot water storage (£/L).
+    - P_cost, capital cost of battery power (£/kW), of the larger of the charge and discharge power
+      (None = power fixed to the battery capacity).
+
+Outputs:
+    - Dataframe of the Pareto optimal designs, the non-dominated designs of every design dispatched.
+    - Number of designs dispatched during the search.
+"""
+import numpy as np
+import pandas as pd
+import Dispatch
+import Finance
+import Optimisation
+
+variables = ['j', 'B_cap', 'B_charge', 'B_discharge', 'TS_size']  # decision variables of the search.
+
+
+def Fronts(F):
+    """
+    Non-dominated sorting rank of each row of the objectives F, shape (n, n_obj), all minimised. Rank 0 is
+    the Pareto front.
+    """
+    F = np.asarray(F, dtype=float)
+    le = (F[:, None, :] <= F[None, :, :]).all(axis=2)
+    lt = (F[:, None, :] < F[None, :, :]).any(axis=2)
+    dom = le & lt  # dom[a, b], design a dominates design b.
+
+    rank = np.full(len(F), -1)
+    n_dom = dom.sum(axis=0)  # number of designs dominating each design.
+    r = 0
+    while (rank < 0).any():
+        front = (n_dom == 0) & (rank < 0)
+        rank[front] = r
+        n_dom = n_dom - dom[front].sum(axis=0)
+        r += 1
+
+    return rank
+
+
+def Crowding(F, rank):
+    """
+    Crowding distance of each row of the objectives F within its front.
+    """
+    F = np.asarray(F, dtype=float)
+    dist = np.zeros(len(F))
+    for r in np.unique(rank):
+        idx = np.where(rank == r)[0]
+        for k in range(0, F.shape[1]):
+            order = idx[np.argsort(F[idx, k])]
+            span = F[order[-1], k] - F[order[0], k]
+            dist[order[0]] = dist[order[-1]] = np.inf
+            if span > 0 and len(order) > 2:
+                dist[order[1:-1]] += (F[order[2:], k] - F[order[:-2], k]) / span
+
+    return dist
+
+
+def Search(E, DHW, ST, PV, TS_leak, T_inlet, T_outlet, ST_A, PV_Cap, Bounds, B_cost, TS_cost, P_cost=None,
+           pop=40, generations=25, n_anchor=3, resolution=(0.1, 0.1, 0.1, 10), seed=0):
+    """
+    Pareto front of NPV (maximised), CO2e emissions and capital cost (minimised).
+
+    The battery and tank sizes are rounded to resolution, so nearby designs share one dispatch. Annual flows
+    are dispatched for n_anchor years of PV degradation and interpolated in between (None = every year).
+    """
+    ## import additional information from excel spreadsheets
+    Fuel = pd.read_excel('Financials.xlsx', sheet_name='Fuel', usecols='A:E', index_col=0)  # import fuel data
+
+    Gen = pd.read_excel('Financials.xlsx', sheet_name='General', usecols='A:B', index_col=0)  # import general data
+
+    PV_Price = pd.read_excel('Financials.xlsx', sheet_name='PV Pricing', usecols='A:C')  # import general data
+
+    ST_Price = pd.read_excel('Financials.xlsx', sheet_name='ST Pricing', usecols='A:C')  # import general data
+
+    n_years = Gen['Input']['Number of Years']  # number of years for analysis.
+    pv_deg = Gen['Input']['PV Degradation (%/year)']  # pv degradation per year.
+    d_rate = Gen['Input']['Discount Rate (%)'] / 100  # discount rate.
+
+    E_arr, DHW_arr, ST_all, PV_all = Optimisation.Profiles(E, DHW, ST, PV)
+    n_perm = ST_all.shape[0]
+    years, deg = Optimisation.Anchor_years(n_years, pv_deg, n_anchor)
+    PV_iteration, ST_iteration, CC_roof = Finance.Capital_cost(PV_Cap, ST_A, PV_Price, ST_Price)
+    Energy_sum = E['0'].sum() + DHW['Total Usage (kWh)'].sum()  # annual energy usage (kWh)
+
+    power = P_cost is not None  # battery power is searched, otherwise it follows the capacity.
+    b = {v: Bounds[v] if (power or v not in ('B_charge', 'B_discharge')) else Bounds['B_cap'] for v in variables[1:]}
+    lo = np.array([0] + [b[v][0] for v in variables[1:]], dtype=float)
+    hi = np.array([n_perm - 1] + [b[v][1] for v in variables[1:]], dtype=float)
+    step = np.array((1,) + tuple(resolution), dtype=float)
+
+    cache = {}  # objectives of every design dispatched so far.
+
+    def evaluate(X):
+        X = np.clip(np.round(X / step) * step, lo, hi)
+        if not power:
+            X[:, 2] = X[:, 3] = X[:, 1]  # a 1C battery, charge and discharge power equal to its capacity.
+        keys = [tuple(x) for x in X]
+        new = [k for k in dict.fromkeys(keys) if k not in cache]
+
+        if len(new) > 0:
+            D = np.array(new)
+            j = D[:, 0].astype(int)
+            n = len(D)
+
+            # dispatch every new design and anchor year in one compiled call, keeping only the annual totals.
+            rows = np.repeat(np.arange(n), len(years))
+            PV_deg = (PV_all[j][:, None, :] * deg[:, None]).reshape(n * len(years), -1)
+            zero = np.zeros(len(rows), dtype=int)
+            GIE, GEE = Dispatch.dispatch_sums(E_arr, DHW_arr, ST_all, PV_deg, D[rows, 1], D[rows, 2], D[rows, 3],
+                                              D[rows, 4], TS_leak, T_inlet, T_outlet,
+                                              rows=[zero, zero, j[rows], np.arange(len(rows))])
+            flows = {'GIE (kWh)': Optimisation.Annual(GIE.reshape(n, len(years)), years, n_years),
+                     'GEE (kWh)': Optimisation.Annual(GEE.reshape(n, len(years)), years, n_years),
+                     'Energy sum (kWh)': Energy_sum}
+            CC = CC_roof[j] + D[:, 1] * B_cost + D[:, 4] * TS_cost  # capital cost of renewables and storage.
+            if power:
+                CC = CC + np.maximum(D[:, 2], D[:, 3]) * P_cost  # capital cost of the battery inverter.
+
+            Fin = Finance.Evaluate(flows, CC, Fuel['Import Price (£/kWh)']['Grid Electricity'],
+                                   Fuel['CCL (£/kWh)']['Grid Electricity'],
+                                   Fuel['Export Price (£/kWh)']['Grid Electricity'],
+                                   Fuel['CO2e Emissions (kgCO2e/kWh)']['Grid Electricity'], d_rate)
+
+            for k in range(0, n):
+                cache[new[k]] = (-Fin['NPV (£)'][0, k], Fin['CO2e Emissions (kg)'][0, k], CC[k],
+                                 Fin['IRR'][0, k])
+
+        return X, np.array([cache[k][:3] for k in keys])
+
+    ## initial population from a latin hypercube sample of the design space.
+
+    rng = np.random.default_rng(seed)
+    U = (rng.permuted(np.tile(np.arange(pop), (len(lo), 1)), axis=1).T + rng.random((pop, len(lo)))) / pop
+    X, F = evaluate(lo + U * (hi - lo))
+
+    for g in range(0, generations):
+        rank = Fronts(F)
+        dist = Crowding(F, rank)
+
+        # binary tournament on rank then crowding distance.
+        a, b = rng.integers(0, len(X), (2, pop))
+        better = (rank[a] < rank[b]) | ((rank[a] == rank[b]) & (dist[a] > dist[b]))
+        parents = X[np.where(better, a, b)]
+
+        # blend crossover and gaussian mutation.
+        mates = parents[rng.permutation(pop)]
+        w = rng.uniform(-0.25, 1.25, parents.shape)
+        child = parents + w * (mates - parents)
+        mutate = rng.random(child.shape) < 1 / len(lo)
+        child = child + mutate * rng.normal(0, 0.1, child.shape) * (hi - lo)
+        child, F_child = evaluate(np.clip(child, lo, hi))
+
+        # keep the best of parents and children, dropping repeated designs.
+        X_all, idx = np.unique(np.vstack([X, child]), axis=0, return_index=True)
+        F_all = np.vstack([F, F_child])[idx]
+        rank = Fronts(F_all)
+        dist = Crowding(F_all, rank)
+        keep = np.lexsort((-dist, rank))[:pop]
+        X, F = X_all[keep], F_all[keep]
+
+    ## collate the Pareto front of every design dispatched.
+
+    D = np.array(list(cache.keys()))
+    F_cache = np.array(list(cache.values()))
+    front = Fronts(F_cache[:, :3]) == 0
+    D, F_cache = D[front], F_cache[front]
+    j = D[:, 0].astype(int)
+
+    Front = pd.DataFrame({'j': j, 'PV (kW)': PV_iteration[j], 'ST (m2)': ST_iteration[j],
+                          'B_cap (kWh)': D[:, 1], 'B_charge (kW)': D[:, 2], 'B_discharge (kW)': D[:, 3],
+                          'TS_size (L)': D[:, 4], 'IRR (%)': np.round(F_cache[:, 3] * 100, 2),
+                          'NPV (£ 000s)': np.round(-F_cache[:, 0] / 1000, 3), 'CO2e Emissions (kg)': F_cache[:, 1],
+                          'CC (£)': F_cache[:, 2]})
+    Front = Front.sort_values('NPV (£ 000s)', ascending=False, ignore_index=True)
+
+    return Front, len(cache)
@@ -0,0 +1,148 @@
+"""
+Code to find the cost optimal roof layout, battery size and hot water tank size together with the hourly
+dispatch of the battery and tank, as one sparse linear program solved with scipy.optimize.linprog (HiGHS).
+
+The roof layout is a convex combination of the PV/ST permutations from PV_ST_Orientatiosn.PV_ST, so the PV
+capacity and ST area are continuous but the generation profiles, roof constraint and capital cost of the
+permutations are kept. Unlike the greedy rules of Dispatch, the battery and tank are charged and discharged
+with knowledge of the whole year. The hot water tank can also be heated with electricity.
+
+Inputs:
+    - E, electricity demand profile.
+    - DHW, domestic hot water demand profile.
+    - ST, solar thermal generation profile.
+    - PV, PV solar generation profile.
+    - TS_leak, thermal leakage of hot water cylinder (W/L).
+    - T_inlet, inlet temperature of water for DHW (C).
+    - T_outlet, outlet temperature of water for DHW (C).
+    - ST_A, dataframe of the different sizes of solar thermal collector arrays (m^2).
+    - PV_Cap, dataframe of the different capacities of the PV solar installations (kWp).
+    - B_cost, capital cost of battery storage (£/kWh).
+    - TS_cost, capital cost of hot water storage (£/L).
+    - c_charge, battery charging power per kWh of capacity (kW/kWh).
+    - c_discharge, battery discharging power per kWh of capacity (kW/kWh).
+
+Outputs:
+    - Dictionary of the optimal sizes, annual energy flows, annualised cost and hourly dispatch.
+"""
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from scipy.optimize import linprog
+import Dispatch
+import Finance
+import Optimisation
+
+
+def Optimal(E, DHW, ST, PV, TS_leak, T_inlet, T_outlet, ST_A, PV_Cap, B_cost, TS_cost,
+            c_charge=3.3/8, c_discharge=5.5/8):
+
+    ## import additional information from excel spreadsheets
+    Fuel = pd.read_excel('Financials.xlsx', sheet_name='Fuel', usecols='A:E', index_col=0)  # import fuel data
+
+    Gen = pd.read_excel('Financials.xlsx', sheet_name='General', usecols='A:B', index_col=0)  # import general data
+
+    PV_Price = pd.read_excel('Financials.xlsx', sheet_name='PV Pricing', usecols='A:C')  # import general data
+
+    ST_Price = pd.read_excel('Financials.xlsx', sheet_name='ST Pricing', usecols='A:C')  # import general data
+
+    n_years = Gen['Input']['Number of Years']  # number of years for analysis.
+    d_rate = Gen['Input']['Discount Rate (%)'] / 100  # discount rate.
+    imp = Fuel['Import Price (£/kWh)']['Grid Electricity'] + Fuel['CCL (£/kWh)']['Grid Electricity']
+    exp = Fuel['Export Price (£/kWh)']['Grid Electricity']
+
+    crf = d_rate / (1 - (1 + d_rate) ** -n_years)  # capital recovery factor, annualises the capital cost.
+
+    E_arr, DHW_arr, ST_all, PV_all = Optimisation.Profiles(E, DHW, ST, PV)
+    n_perm, n = ST_all.shape
+    PV_iteration, ST_iteration, CC_roof = Finance.Capital_cost(PV_Cap, ST_A, PV_Price, ST_Price)
+
+    k_L = 4.2 * (T_outlet - T_inlet) / 3600  # energy stored per litre of hot water (kWh/L)
+    leak = (TS_leak * 3600 / (4.2 * (T_outlet - T_inlet))) / 1000  # fraction of the stored energy lost per hour.
+
+    ## variable layout: hourly import, export, battery charge, battery discharge, immersion heating and used ST,
+    ## then the battery and tank state of charge, the permutation weights and the battery and tank sizes.
+
+    names = ['GIE', 'GEE', 'B_ch', 'B_dis', 'Heat', 'ST_use']
+    off = {k: i * n for i, k in enumerate(names)}
+    off['B_SOC'] = 6 * n
+    off['TS_SOC'] = 7 * n + 1
+    off['w'] = 8 * n + 2
+    off['B_cap'] = off['w'] + n_perm
+    off['TS_max'] = off['B_cap'] + 1
+    n_var = off['TS_max'] + 1
+
+    t = np.arange(n)
+    ones = np.ones(n)
+
+    def block(rows, var, vals, idx=None):
+        cols = off[var] + (t if idx is None else idx)
+        return sp.coo_matrix((vals, (rows, cols)), shape=(n, n_var))
+
+    # electricity balance, PV + import + discharge >= E + charge + heating + export (spare PV is curtailed).
+    w_pv = sp.coo_matrix(PV_all.T)
+    A_bus = (-block(t, 'GIE', ones) - block(t, 'B_dis', ones) + block(t, 'B_ch', ones) + block(t, 'Heat', ones) +
+             block(t, 'GEE', ones) - sp.hstack([sp.csr_matrix((n, off['w'])), w_pv,
+                                                sp.csr_matrix((n, n_var - off['w'] - n_perm))]))
+    b_bus = -E_arr
+
+    # ST used can't be more than the ST generation of the roof layout.
+    A_st = block(t, 'ST_use', ones) - sp.hstack([sp.csr_matrix((n, off['w'])), sp.coo_matrix(ST_all.T),
+                                                 sp.csr_matrix((n, n_var - off['w'] - n_perm))])
+    b_st = np.zeros(n)
+
+    # storage state of charge and power limits.
+    size_col = lambda var, c: sp.coo_matrix((np.full(n, c), (t, np.full(n, off[var]))), shape=(n, n_var))
+    A_lim = sp.vstack([block(t, 'B_SOC', ones, t + 1) - size_col('B_cap', 1),
+                       block(t, 'TS_SOC', ones, t + 1) - size_col('TS_max', 1),
+                       block(t, 'B_ch', ones) - size_col('B_cap', c_charge),
+                       block(t, 'B_dis', ones) - size_col('B_cap', c_discharge)])
+    b_lim = np.zeros(4 * n)
+
+    # the roof layout is a weighted combination of the permutations.
+    A_roof = sp.coo_matrix((np.ones(n_perm), (np.zeros(n_perm), off['w'] + np.arange(n_perm))), shape=(1, n_var))
+
+    # battery and tank energy balances, with the final state of charge equal to the initial one.
+    A_b = block(t, 'B_SOC', ones, t + 1) - block(t, 'B_SOC', ones) - block(t, 'B_ch', ones) + block(t, 'B_dis', ones)
+    A_ts = (block(t, 'TS_SOC', ones, t + 1) - block(t, 'TS_SOC', np.full(n, 1 - leak)) - block(t, 'ST_use', ones) -
+            block(t, 'Heat', ones))
+    A_cyc = sp.coo_matrix(([1, -1, 1, -1], ([0, 0, 1, 1], [off['B_SOC'] + n, off['B_SOC'], off['TS_SOC'] + n,
+                                                         off['TS_SOC']])), shape=(2, n_var))
+
+    A_ub = sp.vstack([A_bus, A_st, A_lim]).tocsr()
+    b_ub = np.concatenate([b_bus, b_st, b_lim])
+    A_eq = sp.vstack([A_b, A_ts, A_cyc, A_roof]).tocsr()
+    b_eq = np.concatenate([np.zeros(n), -DHW_arr, np.zeros(2), [1]])
+
+    ## annualised capital cost plus the cost of imports less the income from exports.
+
+    c = np.zeros(n_var)
+    c[off['GIE']:off['GIE'] + n] = imp
+    c[off['GEE']:off['GEE'] + n] = -exp
+    c[off['w']:off['w'] + n_perm] = crf * CC_roof
+    c[off['B_cap']] = crf * B_cost
+    c[off['TS_max']] = crf * TS_cost / k_L
+
+    res = linprog(c, A_ub=A_ub, b_ub=b_ub, A_eq=A_eq, b_eq=b_eq, bounds=(0, None), method='highs')
+    if res.status != 0:
+        raise ValueError('linear program could not be solved: ' + res.message)
+
+    x = res.x
+    w = x[off['w']:off['w'] + n_perm]
+    B_cap = x[off['B_cap']]
+    TS_size = x[off['TS_max']] / k_L
+
+    ## dispatch the optimal sizes with the greedy rules as a baseline.
+
+    GIE_g, GEE_g, ST_waste_g, B_SOC_g, TS_SOC_g = Dispatch.dispatch(E_arr, DHW_arr, w @ ST_all, w @ PV_all, B_cap,
+                                                                     c_charge * B_cap, c_discharge * B_cap, TS_size,
+                                                                     TS_leak, T_inlet, T_outlet)
+
+    return {'PV (kW)': w @ PV_iteration, 'ST (m2)': w @ ST_iteration, 'Weights': w,
+            'B_cap (kWh)': B_cap, 'B_charge (kW)': c_charge * B_cap, 'B_discharge (kW)': c_discharge * B_cap,
+            'TS_size (L)': TS_size, 'CC (£)': w @ CC_roof + B_cost * B_cap + TS_cost * TS_size,
+            'Annual cost (£)': res.fun, 'IE (kWh)': x[off['GIE']:off['GIE'] + n].sum(),
+            'GE (kWh)': x[off['GEE']:off['GEE'] + n].sum(), 'Greedy IE (kWh)': GIE_g.sum(),
+            'Greedy GE (kWh)': GEE_g.sum(),
+            'Dispatch': pd.DataFrame({k: x[off[k]:off[k] + n] for k in names + ['B_SOC', 'TS_SOC']},
+                                     index=E.index)}
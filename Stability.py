@@ -0,0 +1,94 @@
+"""
+Code to find the largest stable time step of the thermal models without a full eigen decomposition.
+
+The explicit Euler method is stable when the time step is below 2 / rho(A), where rho(A) is the spectral radius
+of the state matrix, the largest magnitude of its eigenvalues. The spectral radius is estimated from the
+largest eigenvalue alone, with ARPACK (scipy.sparse.linalg.eigs) or power iteration, or bounded by the
+Gershgorin circles, so large models don't pay for every eigenvalue. Power iteration approaches the radius from
+below, so it is only used to estimate the radius and not for time steps. The implicit Euler, Crank-Nicolson and
+zero-order hold methods are stable for any time step.
+
+Inputs:
+    - A, state matrix of a model, or a list of the state matrices of the free floating, cooling and heating models.
+    - method, integrator of TCM_funcs.solver, 'euler', 'zoh', 'implicit' or 'cn'.
+    - step, period the time step must divide, 3600 s to divide an hour.
+
+Outputs:
+    - Spectral radius, largest stable time step and largest stable time step which divides the period (s).
+"""
+import numpy as np
+import scipy.sparse as sp
+from scipy.sparse.linalg import eigs, ArpackNoConvergence
+
+
+def Radius(A, estimate='auto', iters=200):
+    """
+    Spectral radius of A by one of the estimates:
+        'gershgorin', largest sum of the absolute values of a row, an upper bound.
+        'power', power iteration, approaching the radius from below. A lower bound, so it can give an unstable
+        time step and Max_time_step doesn't accept it.
+        'eigs', largest magnitude eigenvalue from ARPACK, for dense or sparse A.
+        'auto', 'eigs', or the Gershgorin bound if ARPACK doesn't converge.
+    """
+    n = A.shape[0]
+
+    if estimate == 'gershgorin':
+        return float(abs(A).sum(axis=1).max())
+
+    if estimate == 'power':
+        x = np.ones(n) / np.sqrt(n)
+        rho = 0.
+        for i in range(0, iters):
+            x = A @ x
+            rho = np.linalg.norm(x)
+            if rho == 0:
+                break
+            x = x / rho
+        return float(rho)
+
+    if estimate not in ('eigs', 'auto'):
+        raise ValueError('Unknown estimate of the spectral radius ' + str(estimate))
+
+    if n < 3:
+        return float(np.abs(np.linalg.eigvals(A.toarray() if sp.issparse(A) else A)).max())
+    try:
+        return float(np.abs(eigs(A.astype(float), k=1, which='LM', return_eigenvectors=False)).max())
+    except ArpackNoConvergence:
+        if estimate == 'eigs':
+            raise
+        return Radius(A, 'gershgorin')
+
+
+def Max_time_step(A, method='euler', estimate='auto'):
+    """
+    Largest stable time step (s) of the models for the integrator method, the time step must be below it. A may
+    be one state matrix or a list of them, e.g. [Af, Ac, Ah]. The radius must not be underestimated, so the
+    'power' estimate is rejected.
+    """
+    if method in ('zoh', 'implicit', 'cn'):
+        return np.inf
+    if method != 'euler':
+        raise ValueError('Unknown solver method ' + str(method))
+    if estimate == 'power':
+        raise ValueError("The 'power' estimate is a lower bound of the spectral radius and can give an unstable "
+                         "time step, use 'auto', 'eigs' or 'gershgorin'")
+
+    As = A if isinstance(A, (list, tuple)) else [A]
+
+    return min(2. / Radius(Ai, estimate) for Ai in As)
+
+
+def Time_step(A, method='euler', step=3600, estimate='auto'):
+    """
+    Largest time step (s) which divides step and is stable for the models and integrator method, e.g. the
+    time step for TCM_funcs.rad and TCM_funcs.solver with step=3600.
+    """
+    dtmax = Max_time_step(A, method, estimate)
+    step = int(round(step))
+    divisors = [d for d in range(step, 0, -1) if step % d == 0]
+
+    for d in divisors:
+        if d < dtmax:
+            return d
+
+    raise ValueError(f'No time step dividing {step} s is stable, the largest stable time step is {dtmax:.3g} s.')
@@ -0,0 +1,114 @@
+"""
+Code to evaluate every permutation against many realisations of the electricity and DHW demand profiles.
+
+ElectricityProfile.EP and DomesticHotWater.DoHoWa draw random appliance and hot water use times, so the
+results of a single realisation are noisy. Here K realisations, stacked as arrays of shape (K, n_hours), are
+dispatched with every permutation and year of PV degradation by the compiled kernel of Dispatch, which keeps
+only the annual totals of each row. Every realisation is priced as a scenario of Finance.Price. The mean, P10
+and P90 of NPV, IRR and CO2e emissions of each permutation are reported.
+
+Inputs:
+    - E, electricity demand realisations, a dataframe with one column per realisation or an array (K, n_hours).
+    - DHW, domestic hot water demand realisations, as for E.
+    - ST, solar thermal generation profile.
+    - PV, PV solar generation profile.
+    - B_cap, battery capacity (kWh).
+    - B_charge, battery charging power (kW).
+    - B_discharge, battery discharging power (kW).
+    - TS_size, size of hot water cylinder (L).
+    - TS_leak, thermal leakage of hot water cylinder (W/L).
+    - T_inlet, inlet temperature of water for DHW (C).
+    - T_outlet, outlet temperature of water for DHW (C).
+    - ST_A, dataframe of the different sizes of solar thermal collector arrays (m^2).
+    - PV_Cap, dataframe of the different capacities of the PV solar installations (kWp).
+    - n_anchor, number of years to dispatch, the annual totals in between are interpolated (None = every year).
+    - chunk, number of (realisation, permutation, year) rows dispatched together, limiting the memory used.
+
+Outputs:
+    - Dataframe of the mean, P10 and P90 NPV, IRR and CO2e emissions of every permutation, indexed by j as in
+      Optimisation.Optimiz.
+"""
+import numpy as np
+import pandas as pd
+import Dispatch
+import Finance
+import Optimisation
+
+
+def Realisations(X, n_hours):
+    """
+    Demand realisations as a float array of shape (K, n_hours).
+    """
+    X = X.to_numpy(dtype=float).T if isinstance(X, pd.DataFrame) else np.atleast_2d(np.asarray(X, dtype=float))
+    if X.shape[1] != n_hours:
+        raise ValueError('demand realisations must have the same length as the generation profiles')
+
+    return X
+
+
+def Robust(E, DHW, ST, PV, B_cap, B_charge, B_discharge, TS_size, TS_leak, T_inlet, T_outlet, ST_A, PV_Cap,
+           n_anchor=None, chunk=2048):
+
+    ## import additional information from excel spreadsheets
+    Fuel = pd.read_excel('Financials.xlsx', sheet_name='Fuel', usecols='A:E', index_col=0)  # import fuel data
+
+    Gen = pd.read_excel('Financials.xlsx', sheet_name='General', usecols='A:B', index_col=0)  # import general data
+
+    PV_Price = pd.read_excel('Financials.xlsx', sheet_name='PV Pricing', usecols='A:C')  # import general data
+
+    ST_Price = pd.read_excel('Financials.xlsx', sheet_name='ST Pricing', usecols='A:C')  # import general data
+
+    n_years = Gen['Input']['Number of Years']  # number of years for analysis.
+    pv_deg = Gen['Input']['PV Degradation (%/year)']  # pv degradation per year.
+    d_rate = Gen['Input']['Discount Rate (%)'] / 100  # discount rate.
+    imp = Fuel['Import Price (£/kWh)']['Grid Electricity'] + Fuel['CCL (£/kWh)']['Grid Electricity']
+    exp = Fuel['Export Price (£/kWh)']['Grid Electricity']
+    co2 = Fuel['CO2e Emissions (kgCO2e/kWh)']['Grid Electricity']
+
+    ST_all, PV_all = Optimisation.Generation(ST, PV)
+    n_perm, n_hours = ST_all.shape
+    E_K = Realisations(E, n_hours)
+    DHW_K = Realisations(DHW, n_hours)
+    K = len(E_K)
+    if len(DHW_K) != K:
+        raise ValueError('E and DHW must have the same number of realisations')
+
+    years, deg = Optimisation.Anchor_years(n_years, pv_deg, n_anchor)
+    PV_iteration, ST_iteration, CC = Finance.Capital_cost(PV_Cap, ST_A, PV_Price, ST_Price)
+
+    ## dispatch every realisation, permutation and year, chunk rows at a time, keeping only the annual totals.
+
+    per = n_perm * len(years)  # profiles dispatched for each realisation.
+    PV_deg = (PV_all[:, None, :] * deg[:, None]).reshape(per, n_hours)  # one row per permutation and year
+
+    n_rows = K * per
+    GIE_sim = np.zeros(n_rows, dtype=float)  # imported energy in the dispatched years (kWh)
+    GEE_sim = np.zeros(n_rows, dtype=float)  # exported energy in the dispatched years (kWh)
+
+    for r in range(0, n_rows, chunk):
+        i = np.arange(r, min(r + chunk, n_rows))  # flattened (realisation, permutation, year) rows.
+        k, p = np.divmod(i, per)
+        rows = [k, k, p // len(years), p]  # rows of E_K, DHW_K, ST_all and PV_deg dispatched in this chunk.
+        GIE_sim[i], GEE_sim[i] = Dispatch.dispatch_sums(E_K, DHW_K, ST_all, PV_deg, B_cap, B_charge, B_discharge,
+                                                        TS_size, TS_leak, T_inlet, T_outlet, rows=rows)
+
+    GIE_years = Optimisation.Annual(GIE_sim.reshape(-1, len(years)), years, n_years).reshape(K, n_perm, n_years)
+    GEE_years = Optimisation.Annual(GEE_sim.reshape(-1, len(years)), years, n_years).reshape(K, n_perm, n_years)
+
+    ## price each realisation as a scenario and summarise the spread of the results.
+
+    ARC_base = (E_K.sum(axis=1) + DHW_K.sum(axis=1)) * imp  # annual running cost with no renewables (£)
+    Fin = Finance.Price(ARC_base, GIE_years * imp, GEE_years * exp, GIE_years[:, :, 0] * co2, CC, np.full(K, d_rate))
+
+    stats = {'NPV': Fin['NPV (£)'] / 1000, 'IRR': Fin['IRR'] * 100, 'CO2e': Fin['CO2e Emissions (kg)']}
+    units = {'NPV': ' (£ 000s)', 'IRR': ' (%)', 'CO2e': ' (kg)'}
+
+    Results = pd.DataFrame({'PV (kW)': PV_iteration, 'ST (m2)': ST_iteration, 'CC (£)': CC},
+                           index=np.arange(1, n_perm + 1))
+    for k, X in stats.items():
+        Results[k + ' mean' + units[k]] = np.nanmean(X, axis=0)
+        Results[k + ' P10' + units[k]] = np.nanpercentile(X, 10, axis=0)
+        Results[k + ' P90' + units[k]] = np.nanpercentile(X, 90, axis=0)
+    Results.index.names = ['j']
+
+    return Results
@@ -0,0 +1,121 @@
+"""
+Code to store the results of a sweep on disk as they are evaluated, so a long sweep can be resumed after it
+stops and its results analysed without loading them all into memory.
+
+Each column of the results is a .npy file of float64 values, with a row for every result, and a done.npy file
+marks the rows which have been written. Rows are written in chunks as they are evaluated and marked done once
+their values are flushed to disk, so a sweep which stops part way through resumes from the rows not yet done.
+
+Inputs:
+    - path, directory of the results store.
+    - columns, list of the column names of the results.
+    - n_rows, number of rows of results.
+    - inputs, hash of the inputs the results were evaluated from, so a store isn't resumed with other inputs.
+
+Outputs:
+    - Dictionary of the memory mapped columns and done markers of the store.
+"""
+import json
+import os
+import numpy as np
+import pandas as pd
+
+
+def Open(path, columns, n_rows, inputs=None):
+    """
+    Open the store in path, creating it when it doesn't exist. An existing store must have the same columns
+    and number of rows. inputs is a hash of the inputs of the results, kept in inputs.json next to
+    columns.json, and an existing store must have been written with the same inputs (None = not checked).
+    """
+    meta = os.path.join(path, 'columns.json')
+    keys = os.path.join(path, 'inputs.json')
+
+    if os.path.exists(meta):
+        with open(meta) as f:
+            if json.load(f) != list(columns):
+                raise ValueError('results store ' + path + ' has different columns')
+        if inputs is not None:
+            stored = None
+            if os.path.exists(keys):
+                with open(keys) as f:
+                    stored = json.load(f)
+            if stored != inputs:
+                raise ValueError('results store ' + path + ' was written with different inputs')
+        store = Columns(path, mode='r+')
+        if len(store['done']) != n_rows:
+            raise ValueError('results store ' + path + ' has a different number of rows')
+        return store
+
+    os.makedirs(path, exist_ok=True)
+    for k in range(0, len(columns)):
+        col = np.lib.format.open_memmap(os.path.join(path, f'{k:03d}.npy'), mode='w+', dtype=float, shape=(n_rows,))
+        col[:] = np.nan
+        col.flush()
+    done = np.lib.format.open_memmap(os.path.join(path, 'done.npy'), mode='w+', dtype=bool, shape=(n_rows,))
+    done.flush()
+    with open(keys, 'w') as f:
+        json.dump(inputs, f)
+    with open(meta, 'w') as f:
+        json.dump(list(columns), f)  # written last, so a store is only reopened once it is complete.
+
+    return Columns(path, mode='r+')
+
+
+def Columns(path, mode='r'):
+    """
+    Memory mapped columns of the store in path, with the done markers under 'done'. Nothing is read from disk
+    until the columns are indexed.
+    """
+    with open(os.path.join(path, 'columns.json')) as f:
+        columns = json.load(f)
+
+    store = {'path': path, 'columns': columns,
+             'done': np.load(os.path.join(path, 'done.npy'), mmap_mode=mode)}
+    for k in range(0, len(columns)):
+        store[columns[k]] = np.load(os.path.join(path, f'{k:03d}.npy'), mmap_mode=mode)
+
+    return store
+
+
+def Pending(store):
+    """
+    Rows of the store which haven't been written.
+    """
+    return np.where(~store['done'])[0]
+
+
+def Write(store, rows, values):
+    """
+    Write the values, shape (len(rows), n_columns) or a dataframe with the store's columns, to the rows of
+    the store and mark them done. Nothing is written, and the sort indexes are kept, when rows is empty.
+    """
+    rows = np.asarray(rows, dtype=int)
+    if len(rows) == 0:
+        return
+    if isinstance(values, pd.DataFrame):
+        values = values[store['columns']]
+    values = np.asarray(values, dtype=float)
+
+    for k in range(0, len(store['columns'])):
+        store[store['columns'][k]][rows] = values[:, k]
+        store[store['columns'][k]].flush()
+
+    store['done'][rows] = True  # only marked done once the values are on disk.
+    store['done'].flush()
+
+    for file in os.listdir(store['path']):
+        if file.startswith('order_'):
+            os.remove(os.path.join(store['path'], file))  # sort indexes of Analytics are out of date.
+
+
+def Load(path, index_name='j'):
+    """
+    Dataframe of the rows of the store in path which have been written.
+    """
+    store = Columns(path)
+    rows = np.where(store['done'])[0]
+
+    Results = pd.DataFrame({k: store[k][rows] for k in store['columns']}, index=rows)
+    Results.index.names = [index_name]
+
+    return Results
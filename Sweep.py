@@ -0,0 +1,141 @@
+"""
+Code to run the Optimiz permutations for several battery and hot water tank sizes in parallel.
+
+The demand and generation profiles are put into shared memory once, and every storage size and PV/ST
+permutation is dispatched in a pool of worker processes. The results are merged in a fixed order, so they are
+identical to running Optimiz for each storage size in turn. Scripts calling Sweep must guard their entry
+point with if __name__ == '__main__' on platforms which spawn worker processes.
+
+Inputs:
+    - E, electricity demand profile.
+    - DHW, domestic hot water demand profile.
+    - ST, solar thermal generation profile.
+    - PV, PV solar generation profile.
+    - Storage, list of (B_cap, B_charge, B_discharge, TS_size) tuples of the storage sizes to evaluate.
+    - TS_leak, thermal leakage of hot water cylinder (W/L).
+    - T_inlet, inlet temperature of water for DHW (C).
+    - T_outlet, outlet temperature of water for DHW (C).
+    - ST_A, dataframe of the different sizes of solar thermal collector arrays (m^2).
+    - PV_Cap, dataframe of the different capacities of the PV solar installations (kWp).
+    - workers, number of worker processes (None = number of cpus, 1 = run in this process).
+    - n_anchor, number of years to dispatch, the annual totals in between are interpolated (None = every year).
+
+Outputs:
+    - Dataframe containing the results of every storage size and permutation.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+import pandas as pd
+import Dispatch
+import Optimisation
+
+_shared = {}  # profiles attached from shared memory in each worker.
+
+
+def _attach(name, n_steps, n_perm):
+    shm = shared_memory.SharedMemory(name=name)
+    data = np.ndarray((2 + 2 * n_perm, n_steps), dtype=np.float64, buffer=shm.buf)
+    _shared.update({'shm': shm, 'E': data[0], 'DHW': data[1], 'ST': data[2:(2 + n_perm)],
+                    'PV': data[(2 + n_perm):]})
+
+
+def _detach():
+    shm = _shared.pop('shm', None)
+    _shared.clear()  # the views of the shared memory are released before it is closed.
+    if shm is not None:
+        _close(shm)
+
+
+def _close(shm):
+    try:
+        shm.close()
+    except BufferError:
+        pass  # the traceback of an error still holds a view of the buffer, it is closed once that is released.
+
+
+def _task(args):
+    j, storage, deg, TS_leak, T_inlet, T_outlet = args
+    B_cap, B_charge, B_discharge, TS_size = storage
+
+    GIE_sim = np.zeros(len(deg), dtype=float)
+    GEE_sim = np.zeros(len(deg), dtype=float)
+
+    for y in range(0, len(deg)):
+        PV_deg = _shared['PV'][j] * deg[y]  # degraded PV production for this year of analysis (kWh)
+        GIE, GEE, ST_waste, B_SOC, TS_SOC = Dispatch.dispatch(_shared['E'], _shared['DHW'], _shared['ST'][j], PV_deg,
+                                                              B_cap, B_charge, B_discharge, TS_size, TS_leak,
+                                                              T_inlet, T_outlet)
+        GIE_sim[y] = GIE.sum()
+        GEE_sim[y] = GEE.sum()
+
+    return GIE_sim, GEE_sim, ST_waste.sum()
+
+
+def Sweep(E, DHW, ST, PV, Storage, TS_leak, T_inlet, T_outlet, ST_A, PV_Cap, workers=None, n_anchor=None):
+
+    ## import additional information from excel spreadsheets
+    Fuel = pd.read_excel('Financials.xlsx', sheet_name='Fuel', usecols='A:E', index_col=0)  # import fuel data
+
+    Gen = pd.read_excel('Financials.xlsx', sheet_name='General', usecols='A:B', index_col=0)  # import general data
+
+    PV_Price = pd.read_excel('Financials.xlsx', sheet_name='PV Pricing', usecols='A:C')  # import general data
+
+    ST_Price = pd.read_excel('Financials.xlsx', sheet_name='ST Pricing', usecols='A:C')  # import general data
+
+    n_years = Gen['Input']['Number of Years']  # number of years for analysis.
+    pv_deg = Gen['Input']['PV Degradation (%/year)']  # pv degradation per year.
+    d_rate = Gen['Input']['Discount Rate (%)'] / 100  # discount rate.
+
+    ## put the profiles into shared memory and dispatch every storage size and permutation.
+
+    E_arr, DHW_arr, ST_all, PV_all = Optimisation.Profiles(E, DHW, ST, PV)
+    n_perm, n_steps = ST_all.shape
+    years, deg = Optimisation.Anchor_years(n_years, pv_deg, n_anchor)
+
+    tasks = [(j, tuple(storage), deg, TS_leak, T_inlet, T_outlet) for storage in Storage for j in range(0, n_perm)]
+
+    shm = shared_memory.SharedMemory(create=True, size=(2 + 2 * n_perm) * n_steps * 8)
+    data = None
+    try:
+        data = np.ndarray((2 + 2 * n_perm, n_steps), dtype=np.float64, buffer=shm.buf)
+        data[0] = E_arr
+        data[1] = DHW_arr
+        data[2:(2 + n_perm)] = ST_all
+        data[(2 + n_perm):] = PV_all
+
+        if workers == 1:
+            _attach(shm.name, n_steps, n_perm)
+            out = [_task(task) for task in tasks]
+        else:
+            workers = workers or os.cpu_count()
+            with ProcessPoolExecutor(max_workers=workers, initializer=_attach,
+                                     initargs=(shm.name, n_steps, n_perm)) as pool:
+                out = list(pool.map(_task, tasks, chunksize=max(1, len(tasks) // (4 * workers))))
+    finally:
+        del data  # views of shm.buf must be released before it is closed, or close hides the error raised.
+        _detach()
+        _close(shm)
+        shm.unlink()
+
+    ## price the energy flows of each storage size and merge the results in order.
+
+    Energy_sum = E['0'].sum() + DHW['Total Usage (kWh)'].sum()  # annual energy usage (kWh)
+    PV_gen = PV_all.sum(axis=1)  # annual PV generation (kWh)
+
+    frames = []
+    for s in range(0, len(Storage)):
+        rows = out[(s * n_perm):((s + 1) * n_perm)]
+        flows = {'GIE (kWh)': Optimisation.Annual(np.array([r[0] for r in rows]), years, n_years),
+                 'GEE (kWh)': Optimisation.Annual(np.array([r[1] for r in rows]), years, n_years),
+                 'ST waste (kWh)': np.array([r[2] for r in rows]), 'PV gen (kWh)': PV_gen,
+                 'Energy sum (kWh)': Energy_sum}
+        Results = Optimisation.Results_table(flows, Fuel, d_rate, PV_Price, ST_Price, ST_A, PV_Cap)
+        for k, col in enumerate(['B_cap (kWh)', 'B_charge (kW)', 'B_discharge (kW)', 'TS_size (L)']):
+            Results.insert(k, col, Storage[s][k])
+        frames.append(Results)
+
+    Results = pd.concat(frames, keys=range(0, len(Storage)), names=['s', 'j'])
+
+    return Results
@@ -6,10 +6,16 @@ Created on We Nov 10 2021
 File with all the functions
 """
 
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
+from scipy.linalg import expm, lu_factor, lu_solve, solve_continuous_lyapunov
 import dm4bem
+import Stability
+import Telemetry
+
+log = Telemetry.Logger('TCM_funcs')
 
 
 def building_characteristics(bc_ex):
@@ -225,7 +231,7 @@ def u_assembly(TCd, rad_surf_tot):
         T = TCd_i['T']
         T = T[:, ~np.isnan(T).any(axis=0)]
         if np.shape(T)[1] == 0:
-            print('No Temp')
+            log.debug('No Temp')
         else:
             u = np.append(u, T, axis=1)
 
@@ -236,7 +242,7 @@ def u_assembly(TCd, rad_surf_tot):
         Q = TCd_j['Q']
         Q = Q[:, ~np.isnan(Q).any(axis=0)]
         if np.shape(Q)[1] == 0:
-            print('No Heat Flow')
+            log.debug('No Heat Flow')
         else:
             u = np.append(u, Q, axis=1)
 
@@ -253,7 +259,7 @@ def u_assembly_c(TCd_c, rad_surf_tot):
         T = TCd_i['T']
         T = T[:, ~np.isnan(T).any(axis=0)]
         if np.shape(T)[1] == 0:
-            print('No Temp')
+            log.debug('No Temp')
         else:
             u_c = np.append(u_c, T, axis=1)
 
@@ -286,10 +292,10 @@ def assembly(TCd, tcd_dorwinsky, tcd_n):
     for i in range(0, len([TCd_last_node][0])):
         TCd_last_node[i] = len(TCd[str(i + 1)]['A'][0]) - 1
 
-    print(TCd_last_node)
+    log.debug(TCd_last_node)
 
     IA_nodes = np.arange(len(TCd[str(0)]['A'][0]))  # create vector with the nodes for inside air
-    print(IA_nodes)
+    log.debug(IA_nodes)
 
     # create assembly matrix containing ventilation, windows, doors and skylights
     AssX = np.zeros((len(TCd_last_node), 4))
@@ -310,12 +316,200 @@ def assembly(TCd, tcd_dorwinsky, tcd_n):
 
     AssX = AssX.astype(int)
 
-    print(AssX)
+    log.debug(AssX)
 
     return AssX
 
 
-def solver(TCAf, TCAc, TCAh, dt, u, u_c, t, Tisp, DeltaT, DeltaBlind, Kpc, Kph, rad_surf_tot):
+def zoh(A, B, dt):
+    """
+    Exact zero-order hold discretisation of dx/dt = A x + B u over a time step dt, with u held constant over
+    the step. Returns Ad = expm(A dt) and Bd = int_0^dt expm(A s) ds B, found together from the matrix
+    exponential of the augmented matrix [[A, B], [0, 0]] so A doesn't need to be invertible.
+    """
+    n, m = B.shape[-2:]
+    M = np.zeros(B.shape[:-2] + (n + m, n + m))  # A and B may be stacked with leading variant axes.
+    M[..., :n, :n] = A
+    M[..., :n, n:] = B
+    E = expm(M * dt)
+
+    return E[..., :n, :n].astype(A.dtype), E[..., :n, n:].astype(B.dtype)
+
+
+def step(Ad, x, bu):
+    """
+    State after one time step from state x, where bu is the input term dt B u (or Bd u). Ad is either the
+    transition matrix of an explicit method, the LU factors of (I - dt A) of the implicit method, or the LU
+    factors of (I - dt/2 A) and the matrix (I + dt/2 A) of the Crank-Nicolson method. The implicit methods are
+    solved for the new state without forming the inverse.
+    """
+    if isinstance(Ad, tuple) and isinstance(Ad[0], tuple):
+        return lu_solve(Ad[0], Ad[1] @ x + bu, check_finite=False)
+    if isinstance(Ad, tuple):
+        return lu_solve(Ad, x + bu, check_finite=False)
+
+    return Ad @ x + bu
+
+
+def discretise(SS, dt, method='euler', n_sub=1):
+    """
+    Discretise the state space models [A, B, C, D] of the free floating ('f'), cooling ('c') and heating ('h')
+    models over the time step dt, returning [Ad, Bd, C, D] of each model for simulate. For the implicit method
+    Ad is the LU factors of (I - dt A), and for the Crank-Nicolson method ('cn') the LU factors of
+    (I - dt/2 A) with (I + dt/2 A). Explicit Euler takes n_sub sub-steps of dt / n_sub with the inputs
+    held over dt.
+    """
+    n_tC = SS['f'][0].shape[0]
+    I = np.eye(n_tC)
+    I = I.astype(np.float32)
+
+    SSd = {}
+    for mode, [A, B, C, D] in SS.items():
+        if method == 'zoh':
+            [Ad, Bd] = zoh(A, B, dt)
+        elif method == 'implicit':
+            [Ad, Bd] = [lu_factor(I - dt * A), dt * B]
+        elif method == 'cn':
+            [Ad, Bd] = [(lu_factor(I - (dt / 2) * A), I + (dt / 2) * A), dt * B]
+        elif n_sub == 1:
+            [Ad, Bd] = [I + dt * A, dt * B]
+        else:
+            M = I + (dt / n_sub) * A
+            [Ad, Bd] = [I, 0 * B]
+            for i in range(0, n_sub):
+                [Ad, Bd] = [M @ Ad, M @ Bd + (dt / n_sub) * B]
+        SSd[mode] = [Ad, Bd, C, D]
+
+    return SSd
+
+
+def simulate(SS, u, u_c, Tisp, DeltaT, DeltaBlind, Kpc, Kph, name='solver'):
+    """
+    Integrate the discretised models SS from discretise over the inputs u (blinds open) and u_c (blinds
+    closed), switching between the free floating, cooling and heating models at each step. The states start
+    from 0 and the indoor temperature from Tisp[0].
+
+    Returns the indoor temperature y, the HVAC heat flow qHVAC and the states of every step, as float32.
+    """
+    # inputs as arrays, with the blinds open (u) or closed (u_c), and their terms in the state and output
+    # equations of the free floating, cooling and heating models for every step, computed before the time loop.
+    U = [np.ascontiguousarray(u), np.ascontiguousarray(u_c)]
+    Ad = {m: SS[m][0] for m in SS}
+    Bu = {m: [Ui @ SS[m][1].T for Ui in U] for m in SS}
+    Du = {m: [Ui @ SS[m][3][0] for Ui in U] for m in SS}
+    Cy = {m: SS[m][2][0] for m in SS}
+    Kp = {'f': 0, 'c': Kpc, 'h': Kph}
+
+    n_steps = U[0].shape[0]
+    temp_exp = np.zeros([n_steps, Cy['f'].shape[0]], dtype=np.float32)
+    y = np.zeros(n_steps, dtype=np.float32)
+    qHVAC = np.zeros(n_steps, dtype=np.float32)
+    y[0] = Tisp[0]
+
+    progress = Telemetry.Progress(n_steps - 1, name, unit='steps')
+    for k in range(n_steps - 1):
+        progress.update()
+        i = 1 if y[k] > Tisp[k] + DeltaBlind else 0
+        if y[k] > DeltaT + Tisp[k]:
+            m, j = 'c', k + 1
+        elif y[k] < Tisp[k]:
+            m, j = 'h', k + 1
+        else:
+            m, j = 'f', k  # free floating output takes the inputs of step k.
+        temp_exp[k + 1] = step(Ad[m], temp_exp[k], Bu[m][i][k])
+        y[k + 1] = Cy[m] @ temp_exp[k + 1] + Du[m][i][j]
+        qHVAC[k + 1] = Kp[m] * (Tisp[k + 1] - y[k + 1])
+
+    return y, qHVAC, temp_exp
+
+
+def reduce(SS, order, method='balanced'):
+    """
+    Reduce the state space models [A, B, C, D] of the free floating ('f'), cooling ('c') and heating ('h')
+    models to order states, keeping the dominant thermal modes. The models share their states in the solver,
+    so one projection is found for all three and applied to each:
+        'balanced', balanced truncation with the sum of the controllability and observability gramians of the
+        three models.
+        'modal', the order slowest modes of the free floating model.
+    The discarded states are residualised (set to their steady state) rather than dropped, so the reduced
+    models keep the steady state response of the full models.
+    """
+    SS = {mode: [X.astype(float) for X in M] for mode, M in SS.items()}
+    n = SS['f'][0].shape[0]
+
+    if method == 'balanced':
+        P = sum(solve_continuous_lyapunov(A, -B @ B.T) for [A, B, C, D] in SS.values())
+        Q = sum(solve_continuous_lyapunov(A.T, -C.T @ C) for [A, B, C, D] in SS.values())
+        # square roots of the gramians, which may be singular, from their eigen decompositions.
+        [w, V] = np.linalg.eigh((P + P.T) / 2)
+        Lp = V * np.sqrt(np.clip(w, 0, None))
+        [w, V] = np.linalg.eigh((Q + Q.T) / 2)
+        Lq = V * np.sqrt(np.clip(w, 0, None))
+        [U, hsv, Vt] = np.linalg.svd(Lq.T @ Lp)
+        r = np.count_nonzero(hsv > hsv[0] * 1e-12)  # states which are neither uncontrollable nor unobservable.
+        T = Lp @ Vt[:r].T / np.sqrt(hsv[:r])
+        Ti = (U[:, :r] / np.sqrt(hsv[:r])).T @ Lq.T
+    elif method == 'modal':
+        [lam, V] = np.linalg.eig(SS['f'][0])
+        idx = np.argsort(np.abs(lam.real))  # slowest modes first.
+        T = V[:, idx].real
+        Ti = np.linalg.solve(T, np.eye(n))
+    else:
+        raise ValueError('Unknown reduction method ' + str(method))
+
+    k = min(order, T.shape[1])
+    SSr = {}
+    for mode, [A, B, C, D] in SS.items():
+        [A, B, C] = [Ti @ A @ T, Ti @ B, C @ T]
+        [A11, A12, A21, A22] = [A[:k, :k], A[:k, k:], A[k:, :k], A[k:, k:]]
+        [X21, Xb] = [np.linalg.solve(A22, A21), np.linalg.solve(A22, B[k:])] if k < len(A) else [A21, B[k:]]
+        SSr[mode] = [(A11 - A12 @ X21).astype(np.float32), (B[:k] - A12 @ Xb).astype(np.float32),
+                     (C[:, :k] - C[:, k:] @ X21).astype(np.float32), (D - C[:, k:] @ Xb).astype(np.float32)]
+
+    return SSr
+
+
+def reduction_error(SS, SSr, dt, u, u_c, Tisp, DeltaT, DeltaBlind, Kpc, Kph, method='zoh'):
+    """
+    Simulate the full models SS and the reduced models SSr from reduce over the inputs, and report the
+    largest and mean absolute errors of the indoor temperature (C) and qHVAC (W), and the error in the HVAC
+    energy (%), of the reduced models.
+    """
+    if DeltaBlind == -1:
+        u_c = u
+    Tisp = Tisp * np.ones(u.shape[0])
+    Tisp = Tisp.astype(np.float32)
+
+    [y, qHVAC, temp_exp] = simulate(discretise(SS, dt, method), u, u_c, Tisp, DeltaT, DeltaBlind, Kpc, Kph)
+    [y_r, qHVAC_r, temp_r] = simulate(discretise(SSr, dt, method), u, u_c, Tisp, DeltaT, DeltaBlind, Kpc, Kph)
+
+    err = {'T max (C)': np.abs(y_r - y).max(), 'T mean (C)': np.abs(y_r - y).mean(),
+           'qHVAC max (W)': np.abs(qHVAC_r - qHVAC).max(), 'qHVAC mean (W)': np.abs(qHVAC_r - qHVAC).mean(),
+           'Energy (%)': 100 * (np.abs(qHVAC_r).sum() / np.abs(qHVAC).sum() - 1)}
+    log.info(f'Reduced from {SS["f"][0].shape[0]} to {SSr["f"][0].shape[0]} states, errors: '
+             + ', '.join(f'{k} {v:.3g}' for k, v in err.items()))
+
+    return err
+
+
+def solver(TCAf, TCAc, TCAh, dt, u, u_c, t, Tisp, DeltaT, DeltaBlind, Kpc, Kph, rad_surf_tot, method='euler',
+           order=None, reduction='balanced'):
+    """
+    Simulate the indoor temperature and HVAC heat flow of the building over the inputs u, switching between
+    the free floating (f), cooling (c) and heating (h) models at each time step.
+
+    method, discretisation of the state equations:
+        'euler', explicit Euler, stable only for dt below 2 / rho(A) of each model, from Stability. Larger dt
+        are integrated in sub-steps of the largest stable time step which divides dt.
+        'zoh', exact zero-order hold transition matrices expm(A dt), stable for any dt.
+        'implicit', implicit (backward) Euler, stable for any dt. (I - dt A) of each model is LU factorised
+        once and the factors are reused at every step.
+        'cn', Crank-Nicolson (trapezoidal), second order and stable for any dt, with (I - dt/2 A) LU
+        factorised once as for 'implicit'. Stiff modes decay with alternating sign at large dt.
+
+    order, number of states the models are reduced to with reduce (None = full models), by the reduction method
+    'balanced' or 'modal'. reduction_error reports the error of a reduced model.
+    """
     TCAf['A'] = TCAf['A'].astype(np.float32)
     TCAf['G'] = TCAf['G'].astype(np.float32)
     TCAf['b'] = TCAf['b'].astype(np.float32)
@@ -334,9 +528,13 @@ def solver(TCAf, TCAc, TCAh, dt, u, u_c, t, Tisp, DeltaT, DeltaBlind, Kpc, Kph,
     TCAh['C'] = TCAh['C'].astype(np.float32)
     TCAh['f'] = TCAh['f'].astype(np.float32)
     TCAh['y'] = TCAh['y'].astype(np.float32)
-    [Af, Bf, Cf, Df] = dm4bem.tc2ss(TCAf['A'], TCAf['G'], TCAf['b'], TCAf['C'], TCAf['f'], TCAf['y'])
-    [Ac, Bc, Cc, Dc] = dm4bem.tc2ss(TCAc['A'], TCAc['G'], TCAc['b'], TCAc['C'], TCAc['f'], TCAc['y'])
-    [Ah, Bh, Ch, Dh] = dm4bem.tc2ss(TCAh['A'], TCAh['G'], TCAh['b'], TCAh['C'], TCAh['f'], TCAh['y'])
+    # cooling and heating models by low-rank updates of the free floating model.
+    [[Af, Bf, Cf, Df], [Ac, Bc, Cc, Dc], [Ah, Bh, Ch, Dh]] = dm4bem.tc2ss_variants(TCAf, [TCAc, TCAh])
+
+    if order is not None:
+        SS = reduce({'f': [Af, Bf, Cf, Df], 'c': [Ac, Bc, Cc, Dc], 'h': [Ah, Bh, Ch, Dh]}, order, reduction)
+        [[Af, Bf, Cf, Df], [Ac, Bc, Cc, Dc], [Ah, Bh, Ch, Dh]] = [SS['f'], SS['c'], SS['h']]
+        log.info(f'Models reduced to {Af.shape[0]} states')
 
     # define values from input tensor
 
@@ -345,93 +543,32 @@ def solver(TCAf, TCAc, TCAh, dt, u, u_c, t, Tisp, DeltaT, DeltaBlind, Kpc, Kph,
     else:
         u_c = u_c
 
-    # Maximum time-step
-    dtmax = min(-2. / np.linalg.eig(Af)[0])
-    print(f'Maximum time step f: {dtmax:.2f} s')
-
-    if dtmax <= dt:
-        raise ValueError('Free cooling time-step unstable.')
-
-    dtmax = min(-2. / np.linalg.eig(Ac)[0])
-    print(f'Maximum time step c: {dtmax:.2f} s')
-
-    if dtmax <= dt:
-        raise ValueError('Cooling time-step unstable.')
+    if method not in ('euler', 'zoh', 'implicit', 'cn'):
+        raise ValueError('Unknown solver method ' + str(method))
 
-    dtmax = min(-2. / np.linalg.eig(Ah)[0])
-    print(f'Maximum time step h: {dtmax:.2f} s')
+    n_sub = 1
+    if method == 'euler':
+        # Maximum time-step
+        dtmax = Stability.Max_time_step([Af, Ac, Ah])
+        log.info(f'Maximum time step: {dtmax:.2f} s')
 
-    if dtmax <= dt:
-         raise ValueError('Heating time-step unstable.')
-
-    # Step response
-    # -------------
-    duration = 3600 * 24 * 1  # [s]
-    # number of steps
-    n = int(np.floor(duration / dt))
-
-    t_ss = np.arange(0, n * dt, dt)  # time
-
-    # Vectors of state and input (in time)
-    n_tC = Af.shape[0]  # no of state variables (temps with capacity)
-    # u = [To To To Tsp Phio Phii Qaux Phia]
-    u_ss = np.zeros([(u.shape[1]), n])
-    u_ss[0:3, :] = np.ones([3, n])
-    u_ss[4:6, :] = 1
-
-    # initial values for temperatures obtained by explicit and implicit Euler
-    temp_exp = np.zeros([n_tC, t_ss.shape[0]])
-    temp_imp = np.zeros([n_tC, t_ss.shape[0]])
-
-    I = np.eye(n_tC)
-    for k in range(n - 1):
-        temp_exp[:, k + 1] = (I + dt * Ac) @ \
-                             temp_exp[:, k] + dt * Bc @ u_ss[:, k]
-        temp_imp[:, k + 1] = np.linalg.inv(I - dt * Ac) @ \
-                             (temp_imp[:, k] + dt * Bc @ u_ss[:, k])
-
-    y_exp = Cc @ temp_exp + Dc @ u_ss
-    y_imp = Cc @ temp_imp + Dc @ u_ss
+        if dtmax <= dt:
+            h = Stability.Time_step([Af, Ac, Ah], 'euler', step=dt)
+            n_sub = int(round(dt / h))
+            log.warning(f'Time step {dt} s unstable, integrating in {n_sub} sub-steps of {h} s')
 
     fig, axs = plt.subplots(2, 1, figsize=(12, 6))
-    # axs[0].plot(t_ss / 3600, y_exp.T, t_ss / 3600, y_imp.T)
-    # axs[0].set(ylabel='$T_i$ [°C]', title='Step input: To = 1°C')
 
     # initial values for temperatures
-    temp_exp = np.zeros([n_tC, t.shape[0]])
-    temp_imp = np.zeros([n_tC, t.shape[0]])
     Tisp = Tisp * np.ones(u.shape[0])
-    y = np.zeros(u.shape[0])
-    y[0] = Tisp[0]
-    qHVAC = 0 * np.ones(u.shape[0])
-
-    y = y.astype(np.float32)
-    qHVAC = qHVAC.astype(np.float32)
     Tisp = Tisp.astype(np.float32)
-    temp_exp = temp_exp.astype(np.float32)
+
     # integration in time
-    I = np.eye(n_tC)
-    I = I.astype(np.float32)
-    for k in range(u.shape[0] - 1):
-        if y[k] > Tisp[k] + DeltaBlind:
-            us = u_c
-        else:
-            us = u
-        if y[k] > DeltaT + Tisp[k]:
-            temp_exp[:, k + 1] = (I + dt * Ac) @ temp_exp[:, k] \
-                                 + dt * Bc @ us.iloc[k, :]
-            y[k + 1] = Cc @ temp_exp[:, k + 1] + Dc @ us.iloc[k + 1]
-            qHVAC[k + 1] = Kpc * (Tisp[k + 1] - y[k + 1])
-        elif y[k] < Tisp[k]:
-            temp_exp[:, k + 1] = (I + dt * Ah) @ temp_exp[:, k] \
-                                 + dt * Bh @ us.iloc[k, :]
-            y[k + 1] = Ch @ temp_exp[:, k + 1] + Dh @ us.iloc[k + 1]
-            qHVAC[k + 1] = Kph * (Tisp[k + 1] - y[k + 1])
-        else:
-            temp_exp[:, k + 1] = (I + dt * Af) @ temp_exp[:, k] \
-                                 + dt * Bf @ us.iloc[k, :]
-            y[k + 1] = Cf @ temp_exp[:, k + 1] + Df @ us.iloc[k]
-            qHVAC[k + 1] = 0
+    SS = discretise({'f': [Af, Bf, Cf, Df], 'c': [Ac, Bc, Cc, Dc], 'h': [Ah, Bh, Ch, Dh]}, dt, method, n_sub)
+    [y, qHVAC, temp_exp] = simulate(SS, u, u_c, Tisp, DeltaT, DeltaBlind, Kpc, Kph)
+
+    Telemetry.Violation('steps below the set point', np.count_nonzero(y < Tisp))
+    Telemetry.Violation('steps above the cooling set point', np.count_nonzero(y > Tisp + DeltaT))
 
     # plot indoor and outdoor temperature
     axs[0].plot(t / 3600, rad_surf_tot['temperature'], label='$T_{outdoor}$', color='blue')
@@ -457,3 +594,209 @@ def solver(TCAf, TCAc, TCAh, dt, u, u_c, t, Tisp, DeltaT, DeltaBlind, Kpc, Kph,
     plt.show()
 
     return qHVAC
+
+
+def ss_stack(TCAs):
+    """
+    State space models of N variants of a building, stacked for solver_batch. TCAs is a list of the assembled
+    (TCAf, TCAc, TCAh) thermal circuits of each variant, which must have the same number of nodes and inputs.
+
+    Returns a dictionary of [A, B, C, D] for the free floating ('f'), cooling ('c') and heating ('h') models,
+    as float32 arrays of shape (N, n, n), (N, n, m), (N, 1, n) and (N, 1, m).
+    """
+    SS = {'f': [], 'c': [], 'h': []}
+    for TCA in TCAs:
+        TCA = [{k: TC[k].astype(np.float32) for k in ('A', 'G', 'b', 'C', 'f', 'y')} for TC in TCA]
+        for mode, ss in zip(('f', 'c', 'h'), dm4bem.tc2ss_variants(TCA[0], TCA[1:])):
+            SS[mode].append(ss)
+
+    shapes = {tuple(ss[0].shape) + tuple(ss[1].shape) for mode in SS for ss in SS[mode]}
+    if len(shapes) != 1:
+        raise ValueError('Variants must have state space models of the same size.')
+
+    return {mode: [np.stack([ss[i] for ss in SS[mode]]).astype(np.float32) for i in range(0, 4)] for mode in SS}
+
+
+def solver_batch(SS, dt, u, u_c, Tisp, DeltaT, DeltaBlind, Kpc, Kph, method='euler'):
+    """
+    Simulate N variants of a building together, e.g. different insulation thicknesses, window U-values or
+    ventilation rates, with the same control as solver. SS is the dictionary of stacked state space models from
+    ss_stack. Each variant switches between its free floating, cooling and heating models and opens or closes
+    its blinds on its own indoor temperature, and every step of all the variants is a few batched matrix
+    products.
+
+    u and u_c are the inputs with the blinds open and closed, shared by every variant, shape (n_steps, m), or
+    one per variant, shape (N, n_steps, m). For method='implicit' the step matrices (I - dt A)^-1 and
+    (I - dt A)^-1 dt B are found once with a batched solve, so each step stays a matrix product, and likewise
+    (I - dt/2 A)^-1 (I + dt/2 A) and (I - dt/2 A)^-1 dt B for method='cn'. For method='euler' a dt which is
+    unstable for any variant is integrated in sub-steps, as in solver.
+
+    Returns qHVAC of every variant, shape (N, n_steps), without plotting.
+    """
+    if method not in ('euler', 'zoh', 'implicit', 'cn'):
+        raise ValueError('Unknown solver method ' + str(method))
+
+    if DeltaBlind == -1:
+        u_c = u
+
+    U = np.asarray(u, dtype=np.float32)
+    Uc = np.asarray(u_c, dtype=np.float32)
+    if U.ndim == 2:
+        U = U[None]
+    if Uc.ndim == 2:
+        Uc = Uc[None]
+
+    A = np.stack([SS[mode][0] for mode in ('f', 'c', 'h')])  # (3, N, n, n), models in order f, c, h.
+    B = np.stack([SS[mode][1] for mode in ('f', 'c', 'h')])
+    C = np.stack([SS[mode][2][:, 0, :] for mode in ('f', 'c', 'h')])
+    D = np.stack([SS[mode][3][:, 0, :] for mode in ('f', 'c', 'h')])
+    N, n = A.shape[1], A.shape[2]
+    n_steps = U.shape[1]
+    I = np.eye(n, dtype=np.float32)
+
+    n_sub = 1
+    if method == 'euler':
+        # Maximum time-step of each variant and model
+        dtmax = np.array([[Stability.Max_time_step(A[i, j]) for j in range(0, N)] for i in range(0, 3)])
+        log.info(f'Maximum time step f, c, h: {dtmax.min(axis=1)} s')
+
+        if (dtmax <= dt).any():
+            h = Stability.Time_step([A[i, j] for i in range(0, 3) for j in range(0, N)], 'euler', step=dt)
+            n_sub = int(round(dt / h))
+            log.warning(f'Time step {dt} s unstable for variants {np.where((dtmax <= dt).any(axis=0))[0]}, '
+                        f'integrating in {n_sub} sub-steps of {h} s')
+
+    # transition matrices of every model and variant, computed once.
+    if method == 'zoh':
+        [Ad, Bd] = zoh(A, B, dt)
+    elif method == 'implicit':
+        M = I - dt * A
+        [Ad, Bd] = [np.linalg.solve(M, np.broadcast_to(I, M.shape)), np.linalg.solve(M, dt * B)]
+    elif method == 'cn':
+        M = I - (dt / 2) * A
+        [Ad, Bd] = [np.linalg.solve(M, I + (dt / 2) * A), np.linalg.solve(M, dt * B)]
+    elif n_sub == 1:
+        [Ad, Bd] = [I + dt * A, dt * B]
+    else:
+        M = I + (dt / n_sub) * A
+        [Ad, Bd] = [I, 0 * B]
+        for i in range(0, n_sub):
+            [Ad, Bd] = [M @ Ad, M @ Bd + (dt / n_sub) * B]
+    Ad = Ad.astype(np.float32)
+    Bd = Bd.astype(np.float32)
+
+    Tisp = (Tisp * np.ones(n_steps)).astype(np.float32)
+    Kp = np.array([0, Kpc, Kph], dtype=np.float32)
+    x = np.zeros((N, n), dtype=np.float32)
+    y = np.full(N, Tisp[0], dtype=np.float32)
+    qHVAC = np.zeros((N, n_steps), dtype=np.float32)
+    v = np.arange(0, N)
+    n_below = n_above = 0
+
+    # integration in time
+    progress = Telemetry.Progress(n_steps - 1, 'solver_batch', unit='steps')
+    for k in range(n_steps - 1):
+        progress.update()
+        blind = (y > Tisp[k] + DeltaBlind)[:, None]
+        us = np.where(blind, Uc[:, k], U[:, k])
+        us_1 = np.where(blind, Uc[:, k + 1], U[:, k + 1])
+        mode = np.where(y > DeltaT + Tisp[k], 1, np.where(y < Tisp[k], 2, 0))
+        x = np.matmul(Ad[mode, v], x[:, :, None])[:, :, 0] + np.matmul(Bd[mode, v], us[:, :, None])[:, :, 0]
+        us_y = np.where((mode == 0)[:, None], us, us_1)  # free floating output takes the inputs of step k.
+        y = np.einsum('ij,ij->i', C[mode, v], x) + np.einsum('ij,ij->i', D[mode, v], us_y)
+        qHVAC[:, k + 1] = Kp[mode] * (Tisp[k + 1] - y)
+        n_below += np.count_nonzero(y < Tisp[k + 1])
+        n_above += np.count_nonzero(y > Tisp[k + 1] + DeltaT)
+
+    Telemetry.Violation('steps below the set point', n_below)
+    Telemetry.Violation('steps above the cooling set point', n_above)
+
+    return qHVAC
+
+
+def _chunk(args):
+    """
+    Simulate one chunk of solver_parallel from its spin-up start, returning its results from the chunk start.
+    """
+    [SS, u, u_c, Tisp, DeltaT, DeltaBlind, Kpc, Kph, n_spin] = args
+    [y, qHVAC, temp_exp] = simulate(SS, u, u_c, Tisp, DeltaT, DeltaBlind, Kpc, Kph, name='solver_parallel')
+
+    return y[n_spin:], qHVAC[n_spin:]
+
+
+def solver_parallel(TCAf, TCAc, TCAh, dt, u, u_c, Tisp, DeltaT, DeltaBlind, Kpc, Kph, method='euler', chunks=8,
+                    spinup=14 * 24 * 3600, check='boundary', tol=0.05, processes=None):
+    """
+    Simulate the building as solver does, splitting the steps into chunks which are simulated at the same time
+    in a pool of processes. Each chunk starts a spin-up period (s) before its first step, from the same initial
+    state as the whole simulation, so its states have converged to those of a serial run by the chunk start.
+
+    check, how the stitched result is checked against the serial run:
+        'boundary', the indoor temperature at the start of each chunk is compared with that at the end of the
+        chunk before, which are equal in a serial run.
+        'serial', the serial run is also simulated and the indoor temperatures compared.
+        None, no check.
+    Differences above tol (C) are logged as a warning and counted as a violation. An unstable dt for
+    method='euler' is integrated in sub-steps, as in solver.
+
+    Returns qHVAC, as from solver, without plotting.
+    """
+    if method not in ('euler', 'zoh', 'implicit', 'cn'):
+        raise ValueError('Unknown solver method ' + str(method))
+
+    if DeltaBlind == -1:
+        u_c = u
+
+    SS = {mode: [X[0] for X in M] for mode, M in ss_stack([(TCAf, TCAc, TCAh)]).items()}
+
+    n_sub = 1
+    if method == 'euler':
+        As = [SS[mode][0] for mode in ('f', 'c', 'h')]
+        if Stability.Max_time_step(As) <= dt:
+            h = Stability.Time_step(As, 'euler', step=dt)
+            n_sub = int(round(dt / h))
+            log.warning(f'Time step {dt} s unstable, integrating in {n_sub} sub-steps of {h} s')
+
+    SSd = discretise(SS, dt, method, n_sub)
+    u = np.ascontiguousarray(u)
+    u_c = np.ascontiguousarray(u_c)
+    n_steps = u.shape[0]
+    Tisp = Tisp * np.ones(n_steps)
+    Tisp = Tisp.astype(np.float32)
+
+    # chunk i simulates steps bounds[i] to bounds[i + 1], from n_spin steps before bounds[i].
+    bounds = np.linspace(0, n_steps - 1, chunks + 1).astype(int)
+    n_spin = int(np.ceil(spinup / dt))
+    jobs = []
+    for i in range(0, chunks):
+        start = max(0, bounds[i] - n_spin)
+        stop = bounds[i + 1] + 1
+        jobs.append([SSd, u[start:stop], u_c[start:stop], Tisp[start:stop], DeltaT, DeltaBlind, Kpc, Kph,
+                     bounds[i] - start])
+
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        results = list(pool.map(_chunk, jobs))
+
+    y = np.zeros(n_steps, dtype=np.float32)
+    qHVAC = np.zeros(n_steps, dtype=np.float32)
+    for i in range(0, chunks):
+        y[bounds[i]:(bounds[i + 1] + 1)] = results[i][0]
+        qHVAC[bounds[i]:(bounds[i + 1] + 1)] = results[i][1]
+
+    if check == 'boundary':
+        err = max([abs(results[i][0][0] - results[i - 1][0][-1]) for i in range(1, chunks)], default=0)
+    elif check == 'serial':
+        [y_s, qHVAC_s, temp_exp] = simulate(SSd, u, u_c, Tisp, DeltaT, DeltaBlind, Kpc, Kph)
+        err = np.abs(y - y_s).max()
+        log.info(f'HVAC energy: {qHVAC.sum() * dt / 3.6e6:.1f} kWh, serial {qHVAC_s.sum() * dt / 3.6e6:.1f} kWh')
+    else:
+        err = 0
+    log.info(f'Largest temperature difference from the serial run: {err:.2e} C')
+    if err > tol:
+        log.warning(f'Chunks differ from the serial run by up to {err:.2e} C, lengthen the spin-up.')
+        Telemetry.Violation('parallel chunks above the error tolerance')
+
+    Telemetry.Violation('steps below the set point', np.count_nonzero(y < Tisp))
+    Telemetry.Violation('steps above the cooling set point', np.count_nonzero(y > Tisp + DeltaT))
+
+    return qHVAC
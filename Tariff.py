@@ -0,0 +1,150 @@
+"""
+Code to price the hourly imported and exported electricity of every permutation with time of use tariffs and
+hourly grid carbon intensity.
+
+The hourly flows from Optimisation.Flows(hourly=True) are priced against any number of tariff scenarios
+with matrix products, so Agile style import prices, SEG export prices and carbon intensity series can be
+compared without a new dispatch. Tariff series are aligned to the simulation index once and kept in a bounded
+cache.
+
+Inputs:
+    - flows, dictionary of hourly energy flows from Optimisation.Flows(hourly=True).
+    - CC, capital cost of each permutation (£).
+    - imp_price, import price of grid electricity (£/kWh).
+    - ccl, climate change levy on grid electricity (£/kWh).
+    - exp_price, export price of grid electricity (£/kWh).
+    - co2, CO2e emissions of grid electricity (kgCO2e/kWh).
+    - d_rate, discount rate (-).
+    - index, index of the simulation profiles, e.g. E.index.
+    - tz, time zone of the simulation profiles when their index has none, for tariffs with a time zone.
+
+Each price or emissions factor may be a scalar, a pandas series with a datetime index, or a dataframe with
+one column per scenario. Series finer than the simulation time step are averaged over each step.
+
+Outputs:
+    - Dictionary of ARC, CC, cash flows, IRR, NPV and CO2e emissions for every scenario and permutation, as
+      from Finance.Evaluate.
+"""
+import calendar
+import functools
+import hashlib
+import numpy as np
+import pandas as pd
+import Finance
+import Optimisation
+
+
+class _Hashed:
+    """
+    Tariff and simulation index, hashed and compared by a sha1 of their values, so they can key the lru_cache of
+    _align.
+    """
+    def __init__(self, T, idx):
+        self.T = T
+        self.idx = idx
+        key = hashlib.sha1()
+        key.update(T.to_numpy(dtype=float).tobytes())
+        key.update(pd.DatetimeIndex(pd.to_datetime(T.index)).asi8.tobytes())
+        key.update(idx.asi8.tobytes())
+        self.key = key.hexdigest()
+
+    def __hash__(self):
+        return hash(self.key)
+
+    def __eq__(self, other):
+        return self.key == other.key
+
+
+@functools.lru_cache(maxsize=32)
+def _align(hashed, tz):
+    """
+    Tariff of a _Hashed tariff and simulation index aligned to the index, as an array of shape
+    (n_scenarios, len(index)). Cached by Align.
+    """
+    T = hashed.T.copy()
+    idx = hashed.idx
+    T.index = pd.DatetimeIndex(pd.to_datetime(T.index))
+
+    # compare naive local times, tz-aware tariffs are moved to the time zone of the simulation.
+    local = idx.tz if idx.tz is not None else tz
+    if T.index.tz is not None:
+        T.index = T.index.tz_convert(local).tz_localize(None)
+    if idx.tz is not None:
+        idx = idx.tz_localize(None)
+    T = T.sort_index()
+
+    step = pd.Series(idx).diff().median()  # simulation time step.
+    if pd.Series(T.index).diff().median() < step:
+        T = T.resample(step).mean()  # average finer tariffs over each simulation time step.
+
+    year = idx[0].year
+    if (T.index.year != year).any():
+        if not calendar.isleap(year):
+            T = T[~((T.index.month == 2) & (T.index.day == 29))]  # the simulation year has no 29 February.
+        T.index = T.index.map(lambda t: t.replace(year=year))  # same year as the simulation profiles.
+        T = T.sort_index()  # a tariff over two calendar years wraps around the simulation year.
+
+    T = T[~T.index.duplicated(keep='last')]  # repeated times, e.g. the hour the clocks go back, keep the last.
+    T = T.reindex(idx, method='ffill').bfill()  # steps before the first tariff value take the first value.
+
+    aligned = np.ascontiguousarray(T.to_numpy(dtype=float).T)
+    aligned.flags.writeable = False  # shared by every call with the same tariff.
+
+    return aligned
+
+
+def Align(tariff, index, tz='Europe/London'):
+    """
+    Tariff or carbon intensity series as a float array of shape (n_scenarios, len(index)).
+
+    Scalars give one scenario with a flat rate. Series and dataframes are averaged to the simulation time step
+    when they are finer, moved to the year of the simulation and matched to each time step, taking the last
+    value at or before it. A 29 February is dropped when the simulation year isn't a leap year, and a
+    simulation 29 February takes the last tariff of 28 February. A tariff over two calendar years, e.g. April
+    to March, wraps around the simulation year. Tariffs with a time zone are converted to the local time of the
+    simulation, the time zone of index or tz when index has none. The most recently aligned tariffs are
+    cached, so the same tariff is only aligned once, and the arrays returned are read only.
+    """
+    if np.ndim(tariff) == 0:
+        return np.full((1, len(index)), float(tariff))
+
+    T = tariff.to_frame() if isinstance(tariff, pd.Series) else pd.DataFrame(tariff)
+    idx = pd.DatetimeIndex(pd.to_datetime(index))
+
+    return _align(_Hashed(T, idx), tz)
+
+
+def Evaluate(flows, CC, imp_price, ccl, exp_price, co2, d_rate, index):
+    """
+    Price the hourly energy flows of every permutation for a set of tariff scenarios.
+
+    The aligned tariffs broadcast against each other, each with one or n_scenarios rows, and d_rate may be a
+    scalar or an array of shape (n_scenarios,). The results have shape (n_scenarios, n_perm), and the cash
+    flows (n_scenarios, n_perm, n_years). IRR is returned as a fraction and NPV in £.
+    """
+    imp, ccl, exp, co2 = [Align(x, index) for x in (imp_price, ccl, exp_price, co2)]
+    n_scen = max(len(imp), len(ccl), len(exp), len(co2), np.size(d_rate))
+    d_rate = np.broadcast_to(np.atleast_1d(np.asarray(d_rate, dtype=float)), (n_scen,))
+
+    # tariffs at the dispatched hours, weighted up to annual totals for typical days.
+    hours, weights = flows['Hours'], flows['Weights']
+    imp = np.broadcast_to((imp + ccl)[:, hours] * weights, (n_scen, len(hours)))  # cost of each imported kWh (£/kWh)
+    exp = np.broadcast_to(exp[:, hours] * weights, (n_scen, len(hours)))  # income from each exported kWh (£/kWh)
+    co2 = np.broadcast_to(co2[:, hours] * weights, (n_scen, len(hours)))  # emissions of each imported kWh (kg/kWh)
+
+    GIE_h = flows['GIE hourly (kWh)']
+    GEE_h = flows['GEE hourly (kWh)']
+    n_perm, n_sim, n_hours = GIE_h.shape
+    n_years = flows['GIE (kWh)'].shape[1]
+
+    ARC_base = imp @ flows['Demand hourly (kWh)']  # annual running cost with no renewables (£)
+
+    # annual cost of imports and income from exports of the dispatched years, interpolated to every year.
+    Imp_sim = (GIE_h.reshape(-1, n_hours) @ imp.T).reshape(n_perm, n_sim, n_scen).transpose(2, 0, 1)
+    Exp_sim = (GEE_h.reshape(-1, n_hours) @ exp.T).reshape(n_perm, n_sim, n_scen).transpose(2, 0, 1)
+    Imp_cost = Optimisation.Annual(Imp_sim.reshape(-1, n_sim), flows['Years'], n_years).reshape(n_scen, n_perm, -1)
+    Exp_income = Optimisation.Annual(Exp_sim.reshape(-1, n_sim), flows['Years'], n_years).reshape(n_scen, n_perm, -1)
+
+    CO2 = (GIE_h[:, 0, :] @ co2.T).T  # CO2e emissions in the first year (kg)
+
+    return Finance.Price(ARC_base, Imp_cost, Exp_income, CO2, np.asarray(CC, dtype=float), d_rate)
@@ -0,0 +1,94 @@
+"""
+Code to report the progress of long loops and count rule violations without printing on every step.
+
+Messages go through the python logging module under the 'PHPP' logger, which only shows warnings until Level
+is called, so hot loops stay quiet by default. Progress reports are throttled to one every few seconds and
+give the rate and estimated time remaining. Violations are counted by name instead of being printed, and
+Summary reports the counts.
+
+Usage:
+    Telemetry.Level('INFO')  # show progress reports.
+    progress = Telemetry.Progress(n_perm, 'Optimiz', unit='permutations')
+    for j in range(0, n_perm):
+        ...
+        progress.update()
+    Telemetry.Violation('negative imports', n)
+    Telemetry.Summary()
+"""
+import logging
+import time
+from collections import Counter
+
+log = logging.getLogger('PHPP')
+log.addHandler(logging.NullHandler())
+
+violations = Counter()  # number of each violation since the last Summary.
+
+
+def Logger(name):
+    """
+    Logger for a module, e.g. Telemetry.Logger('TCM_funcs').
+    """
+    return log.getChild(name)
+
+
+def Level(level='INFO'):
+    """
+    Show messages of level and above on the console, e.g. 'DEBUG', 'INFO' or 'WARNING'.
+    """
+    if not any(isinstance(h, logging.StreamHandler) for h in log.handlers):
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter('%(asctime)s %(name)s %(levelname)s: %(message)s', '%H:%M:%S'))
+        log.addHandler(handler)
+    log.setLevel(level)
+
+
+def Violation(name, n=1):
+    """
+    Count n occurrences of the violation name.
+    """
+    if n:
+        violations[name] += int(n)
+
+
+def Summary(reset=True):
+    """
+    Log the counts of every violation as a warning and return them.
+    """
+    counts = dict(violations)
+    for name, n in counts.items():
+        log.warning(f'{name}: {n}')
+    if reset:
+        violations.clear()
+
+    return counts
+
+
+class Progress:
+    """
+    Throttled progress of a loop of total items, logged at most once every `every` seconds.
+    """
+
+    def __init__(self, total, name, unit='steps', every=5.0, logger=None):
+        self.total = total
+        self.name = name
+        self.unit = unit
+        self.every = every
+        self.log = logger or Logger(name)
+        self.n = 0
+        self.start = self.last = time.perf_counter()
+
+    def update(self, n=1):
+        self.n += n
+        now = time.perf_counter()
+        if now - self.last >= self.every or self.n >= self.total:
+            self.last = now
+            if self.log.isEnabledFor(logging.INFO):
+                self.log.info(self.message(now))
+
+    def message(self, now=None):
+        elapsed = (now or time.perf_counter()) - self.start
+        rate = self.n / elapsed if elapsed > 0 else float('inf')
+        eta = (self.total - self.n) / rate if rate > 0 else float('inf')
+        return (f'{self.n}/{self.total} {self.unit} ({100 * self.n / max(self.total, 1):.0f}%), '
+                f'{rate:.1f} {self.unit}/s, ETA {time.strftime("%H:%M:%S", time.gmtime(min(eta, 86399)))}')
@@ -0,0 +1,85 @@
+"""
+Code to reduce the year of hourly demand and generation profiles to a few weighted typical days.
+
+The joint 24 hour profiles of E, DHW, PV and ST of every day are clustered with k-medoids. Each cluster is
+represented by its medoid, a real day of the year, weighted by the number of days in the cluster. The
+medoids are dispatched in date order as one short profile and the annual totals are the weighted sums, which
+is quick enough to screen sizing candidates before a final full year run.
+
+Inputs:
+    - E, electricity demand profile.
+    - DHW, domestic hot water demand profile.
+    - ST, solar thermal generation profile.
+    - PV, PV solar generation profile.
+    - k, number of typical days.
+
+Outputs:
+    - Hours of the year making up the typical days.
+    - Weight of each of those hours in the annual totals.
+    - Cluster of each day of the year.
+"""
+import numpy as np
+import pandas as pd
+from scipy.spatial.distance import cdist
+import Optimisation
+
+
+def Cluster(E, DHW, ST, PV, k=18, seed=0, max_iter=100):
+    E_arr, DHW_arr, ST_all, PV_all = Optimisation.Profiles(E, DHW, ST, PV)
+    n = len(E_arr)
+    n_days = n // 24  # the hours after the last full day are covered by scaling the weights.
+
+    # daily feature vectors, each profile scaled by its standard deviation. PV and ST use the largest arrays.
+    profiles = [E_arr, DHW_arr, ST_all.max(axis=0), PV_all.max(axis=0)]
+    X = np.hstack([(p[:(n_days * 24)] / (p.std() or 1)).reshape(n_days, 24) for p in profiles])
+    D = cdist(X, X)  # distance between every pair of days.
+
+    # k-medoids++ initialisation followed by alternating assignment and medoid update.
+    rng = np.random.default_rng(seed)
+    medoids = [rng.integers(n_days)]
+    for c in range(1, k):
+        d2 = D[:, medoids].min(axis=1) ** 2
+        if d2.sum() > 0:
+            medoids.append(rng.choice(n_days, p=d2 / d2.sum()))
+        else:
+            # every day is a copy of a medoid, pick the next uniformly from the other days.
+            medoids.append(rng.choice(np.setdiff1d(np.arange(n_days), medoids)))
+    medoids = np.array(medoids)
+
+    for it in range(0, max_iter):
+        labels = D[:, medoids].argmin(axis=1)
+        new = medoids.copy()
+        for c in range(0, k):
+            members = np.where(labels == c)[0]
+            if len(members) > 0:
+                new[c] = members[D[np.ix_(members, members)].sum(axis=1).argmin()]
+        if (new == medoids).all():
+            break
+        medoids = new
+
+    labels = D[:, medoids].argmin(axis=1)
+    order = np.argsort(medoids)  # dispatch the typical days in date order.
+    medoids = medoids[order]
+    labels = np.argsort(order)[labels]
+
+    weights = np.bincount(labels, minlength=k) * (n / (n_days * 24))
+    hours = (medoids[:, None] * 24 + np.arange(24)).ravel()
+
+    return hours, np.repeat(weights, 24), labels
+
+
+def Error(reduced, full):
+    """
+    Relative error of the annual imported and exported electricity and ST waste of every permutation from
+    the typical days, against the full year flows from Optimisation.Flows.
+    """
+    err = {}
+    for key in ['GIE (kWh)', 'GEE (kWh)', 'ST waste (kWh)']:
+        r = np.asarray(reduced[key], dtype=float)
+        f = np.asarray(full[key], dtype=float)
+        if r.ndim == 2:
+            r, f = r[:, 0], f[:, 0]  # first year of analysis.
+        with np.errstate(divide='ignore', invalid='ignore'):
+            err[key] = np.where(f != 0, (r - f) / f, 0.0)
+
+    return pd.DataFrame(err)
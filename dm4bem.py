@@ -13,10 +13,12 @@ https://github.com/pvlib/pvlib-python/blob/master/pvlib/iotools/epw.py
 import numpy as np
 import pandas as pd
 import sys
-from scipy.linalg import block_diag
+from scipy.linalg import block_diag, lu_factor, lu_solve
+import scipy.sparse as sp
+from scipy.sparse.linalg import splu
 
 
-def TCAss(TCd, AssX):
+def TCAss(TCd, AssX, sparse=False):
     """
     Parameters
     ----------
@@ -37,6 +39,12 @@ def TCAss(TCd, AssX):
              ...
              [TC<-, node, <-TC, node]]
 
+    sparse : bool
+        DESCRIPTION.
+        Assemble with scipy.sparse matrices, without forming the dense
+        disassembled matrix Kd or inverting G. A, G and C are returned as
+        sparse CSR matrices with the same values.
+
     Returns
     -------
     TCa : Dictionary
@@ -63,6 +71,34 @@ def TCAss(TCd, AssX):
                     TCdf['global 1st node'][AssX[:, 2]] + AssX[:, 3]])
     Ass = Ass.astype(int)
 
+    if sparse:
+        nθ = int(sum(size_f_eachTCd))
+        # assembled node of each disassembled node: merged nodes Ass[1] go
+        # to the node Ass[0] they merge with, the others keep their order
+        target = np.arange(nθ)
+        target[Ass[1]] = Ass[0]
+        kept = np.ones(nθ, dtype=bool)
+        kept[Ass[1]] = False
+        new_index = np.cumsum(kept) - 1
+        Adθ = sp.coo_matrix((np.ones(nθ), (np.arange(nθ), new_index[target])),
+                            shape=(nθ, int(kept.sum()))).tocsr()
+
+        Aa = sp.block_diag([sp.coo_matrix(np.atleast_2d(x)) for x in TCdf.A],
+                           format='csr') @ Adθ
+        Ga = sp.block_diag([sp.coo_matrix(np.atleast_2d(x)) for x in TCdf.G],
+                           format='csr')
+        Cd = sp.block_diag([sp.coo_matrix(np.atleast_2d(x)) for x in TCdf.C],
+                           format='csr')
+        Ca = (Adθ.T @ Cd @ Adθ).tocsr()
+
+        ba = np.hstack([np.ravel(x) for x in TCdf.b]).astype(float)
+        fa = Adθ.T @ np.hstack([np.ravel(x) for x in TCdf.f]).astype(float)
+        fa[fa.nonzero()] = 1
+        ya = Adθ.T @ np.hstack([np.ravel(x) for x in TCdf.y]).astype(float)
+        ya[ya.nonzero()] = 1
+
+        return {'A': Aa, 'G': Ga, 'b': ba, 'C': Ca, 'f': fa, 'y': ya}
+
     # Disassembling matrix for temperatures Adθ
     # - matrix that keeps the indexes of themperature nodes
     Adθ = np.eye(sum(size_f_eachTCd))
@@ -140,7 +176,115 @@ def TCAss(TCd, AssX):
     return TCa
 
 
-def tc2ss(A, G, b, C, f, y):
+def K11_solver(K11):
+    """
+    Solver of K11 X = R from a single factorisation of K11: a sparse LU
+    factorisation when K11 is sparse and large, otherwise a dense LU.
+    """
+    if K11.shape[0] == 0:
+        return lambda R: np.zeros((0,) + np.shape(R)[1:])
+    if sp.issparse(K11) and K11.shape[0] > 100:
+        lu = splu(sp.csc_matrix(K11, dtype=float))
+        return lambda R: lu.solve(np.asarray(R, dtype=float))
+    K11 = K11.toarray() if sp.issparse(K11) else K11
+    lu = lu_factor(np.asarray(K11, dtype=float))
+    return lambda R: lu_solve(lu, np.asarray(R, dtype=float))
+
+
+def _ss_parts(A, G, b, C, f, y, K11_solve=None):
+    """
+    Blocks of K, solutions of K11 and inverse capacities from which
+    _ss_assemble forms the state space model of the circuit, kept by ss_model
+    so they can be updated by ss_update.
+    """
+    dtype = np.result_type(A.dtype, G.dtype, C.dtype)
+    [A, G, C] = [X.astype(float) for X in (A, G, C)]
+    diagC = C.diagonal() if sp.issparse(C) else np.diag(C)
+
+    rC = np.nonzero(diagC)[0]          # rows of non-zero elements in C
+    r0 = np.nonzero(diagC == 0)[0]     # rows of zero elements in C
+
+    if rC.size == 0:
+        sys.exit('Error in dm4bem.tc2ss: capacity C matrix is zero')
+
+    def dense(M):
+        return M.toarray() if sp.issparse(M) else np.asarray(M)
+
+    K = -A.T @ G @ A
+    K = sp.csr_matrix(K) if sp.issparse(K) else K
+    K12 = dense(K[r0, :][:, rC])
+    K21 = dense(K[rC, :][:, r0])
+    K22 = dense(K[rC, :][:, rC])
+
+    Kb = A.T @ G
+    Kb = sp.csr_matrix(Kb) if sp.issparse(Kb) else Kb
+    Kb1 = dense(Kb[r0, :])
+    Kb2 = dense(Kb[rC, :])
+
+    if K11_solve is None:
+        K11_solve = K11_solver(K[r0, :][:, r0])
+
+    # effective inputs: temperature sources on branches, then flow sources
+    # in nodes without (f0) and with (fC) capacity
+    ib = np.nonzero(b)[0]
+    i_f = np.nonzero(f)[0]
+    p0 = np.full(diagC.size, -1)
+    p0[r0] = np.arange(r0.size)     # position of each node in r0
+    pC = np.full(diagC.size, -1)
+    pC[rC] = np.arange(rC.size)     # position of each node in rC
+    f0 = np.nonzero(p0[i_f] >= 0)[0]
+    fC = np.nonzero(pC[i_f] >= 0)[0]
+
+    # single solve of K11 for K12, the temperature sources and the flow
+    # sources in nodes without capacity
+    E0 = np.zeros([r0.size, f0.size])
+    E0[p0[i_f[f0]], np.arange(f0.size)] = 1
+    X = K11_solve(np.hstack([K12, Kb1[:, ib], E0]))
+    X12 = X[:, :rC.size]
+    Xb = X[:, rC.size:(rC.size + ib.size)]
+    Xf = X[:, (rC.size + ib.size):]
+
+    invC = 1 / diagC[rC]
+
+    return {'dtype': dtype, 'r0': r0, 'rC': rC, 'p0': p0, 'pC': pC,
+            'ib': ib, 'i_f': i_f, 'f0': f0, 'fC': fC, 'y': np.asarray(y),
+            'K12': K12, 'K21': K21, 'K22': K22, 'Kb2': Kb2[:, ib],
+            'X12': X12, 'Xb': Xb, 'Xf': Xf, 'invC': invC,
+            'K11_solve': K11_solve}
+
+
+def _ss_assemble(P):
+    """
+    State space model [As, Bs, Cs, Ds] from the parts of _ss_parts.
+    """
+    [rC, ib, i_f, f0, fC, pC, p0, y] = [P[k] for k in
+                                        ('rC', 'ib', 'i_f', 'f0', 'fC',
+                                         'pC', 'p0', 'y')]
+    [K21, K22, X12, Xb, Xf, invC] = [P[k] for k in
+                                     ('K21', 'K22', 'X12', 'Xb', 'Xf', 'invC')]
+
+    # State equation
+    As = invC[:, None] * (-K21 @ X12 + K22)
+    Bs = np.zeros([rC.size, ib.size + i_f.size])
+    Bs[:, :ib.size] = invC[:, None] * (-K21 @ Xb + P['Kb2'])
+    Bs[:, ib.size + f0] = invC[:, None] * (-K21 @ Xf)
+    Bs[pC[i_f[fC]], ib.size + fC] = invC[pC[i_f[fC]]]
+
+    # observation equation for outputs that are states or not states
+    iy = np.nonzero(y)[0]
+    Cs = np.zeros([iy.size, rC.size])
+    Ds = np.zeros([iy.size, ib.size + i_f.size])
+    yC = np.nonzero(pC[iy] >= 0)[0]
+    y0 = np.nonzero(p0[iy] >= 0)[0]
+    Cs[yC, pC[iy[yC]]] = y[iy[yC]]
+    Cs[y0, :] = -X12[p0[iy[y0]], :]
+    Ds[y0, :ib.size] = -Xb[p0[iy[y0]], :]     # feed-through if no capacity
+    Ds[np.ix_(y0, ib.size + f0)] = -Xf[p0[iy[y0]], :]
+
+    return As.astype(P['dtype']), Bs, Cs, Ds
+
+
+def tc2ss(A, G, b, C, f, y, K11_solve=None):
     """
         Parameters
         ----------
@@ -163,6 +307,13 @@ def tc2ss(A, G, b, C, f, y):
         y : TYPE np.array
             vector indicating the temperatures in the outputs:
                 1 for output nodes, otherwise 0
+        K11_solve : function
+            solver of K11 X = R (None = factorise K11), e.g. from a
+            low-rank update in tc2ss_variants
+
+        A, G and C may be scipy.sparse matrices, as from TCAss(sparse=True).
+        K11 is factorised once and solved for all the columns needed, and
+        the diagonal capacity matrix is inverted elementwise.
 
         Returns
         -------
@@ -176,69 +327,219 @@ def tc2ss(A, G, b, C, f, y):
             {4} nodes output temperatures
 
     """
+    return _ss_assemble(_ss_parts(A, G, b, C, f, y, K11_solve))
 
-    rC = np.nonzero(np.diag(C))[0]          # rows of non-zero elements in C
-    r0 = np.nonzero(np.diag(C) == 0)[0]     # rows of zero elements in C
-    # idx_nonzero = {'C': rC,
-    #                'b': np.nonzero(b)[0],
-    #                'f': np.nonzero(f)[0],
-    #                'y': np.nonzero(y)[0]}
 
-    if rC.size == 0:
-        sys.exit('Error in dm4bem.tc2ss: capacity C matrix is zero')
+def tc2ss_variants(TC, variants):
+    """
+    State space models of the thermal circuit TC and of its variants, e.g.
+    the cooling and heating circuits which differ from the free floating one
+    only by the conductance of the controller branch.
+
+    K11 of TC is factorised once. A variant with the same A, C and diagonal
+    G as TC, except for r conductances, is solved with a Sherman-Morrison-
+    Woodbury update of rank r of that factorisation instead of a new
+    conversion. Its b, f and y may differ. Other variants are converted in
+    full with tc2ss.
+
+    Parameters
+    ----------
+    TC : dictionary {'A': A, 'G': G, 'b': b, 'C': C, 'f': f, 'y': y}
+    variants : list of dictionaries of the same form
+
+    Returns
+    -------
+    List of [As, Bs, Cs, Ds] of TC followed by each of the variants.
+    """
+    def dense(M):
+        return M.toarray() if sp.issparse(M) else np.asarray(M)
+
+    def diagonal(M):
+        return M.diagonal() if sp.issparse(M) else np.diag(M)
 
-    CC = np.diag(C[np.nonzero(C)])
+    [A, G, C] = [TC[k].astype(float) for k in ('A', 'G', 'C')]
+    diagC = diagonal(C)
+    r0 = np.nonzero(diagC == 0)[0]
     K = -A.T @ G @ A
+    K = sp.csr_matrix(K) if sp.issparse(K) else K
+    solve = K11_solver(K[r0, :][:, r0])
+    diagonal_G = np.count_nonzero(dense(G) - np.diag(diagonal(G))) == 0
+
+    SS = [list(tc2ss(A, G, TC['b'], C, TC['f'], TC['y'], solve))]
+    for V in variants:
+        same = (V['A'].shape == A.shape and V['C'].shape == C.shape
+                and np.array_equal(dense(V['A']), dense(A))
+                and np.array_equal(dense(V['C']), dense(C)) and diagonal_G
+                and np.count_nonzero(dense(V['G'])
+                                     - np.diag(diagonal(V['G']))) == 0)
+        if not same:
+            SS.append(list(tc2ss(V['A'], V['G'], V['b'], V['C'],
+                                 V['f'], V['y'])))
+            continue
+
+        # K11 of the variant = K11 + U W U' for the r changed conductances
+        dg = diagonal(V['G']).astype(float) - diagonal(G).astype(float)
+        d = np.nonzero(dg)[0]
+        if d.size == 0:
+            V_solve = solve
+        else:
+            U = dense(A[d, :])[:, r0].T.astype(float)
+            Z = solve(U)
+            S = np.diag(-1 / dg[d]) + U.T @ Z
+
+            def V_solve(R, Z=Z, S=S, U=U):
+                Y = solve(R)
+                return Y - Z @ np.linalg.solve(S, U.T @ Y)
+        SS.append(list(tc2ss(V['A'], V['G'], V['b'], V['C'], V['f'],
+                             V['y'], V_solve)))
+
+    return SS
+
+
+def ss_model(TC):
+    """
+    State space model of the thermal circuit TC = {'A': A, 'G': G, 'b': b,
+    'C': C, 'f': f, 'y': y}, kept with the factorisation of K11 and the parts
+    of the conversion so it can be updated by ss_update.
 
-    K11 = K[r0, :][:, r0]
-    K12 = K[r0, :][:, rC]
-    K21 = K[rC, :][:, r0]
-    K22 = K[rC, :][:, rC]
+    Returns
+    -------
+    Dictionary of the circuit 'TC', the conversion 'parts' and the state
+    space model 'SS' = [As, Bs, Cs, Ds].
+    """
+    parts = _ss_parts(TC['A'], TC['G'], TC['b'], TC['C'], TC['f'], TC['y'])
+
+    return {'TC': TC, 'parts': parts, 'SS': list(_ss_assemble(parts))}
+
+
+def ss_update(model, dG=None, dC=None):
+    """
+    Model of ss_model after changes to a few conductances and capacities,
+    e.g. the insulation of one wall or the U-value of one window, without
+    assembling or converting the circuit again.
+
+    Changing r conductances changes K by a matrix of rank r, so the blocks
+    of K and the solutions of K11 are corrected with a Sherman-Morrison-
+    Woodbury update of rank r of the factorisation of K11. Changes of
+    capacity only scale the rows of the state equation. A capacity which
+    changes from or to zero changes the states, and the circuit is converted
+    again.
+
+    Parameters
+    ----------
+    model : dictionary from ss_model or ss_update
+    dG : dictionary {branch: change in conductance} of the assembled circuit
+    dC : dictionary {node: change in capacity} of the assembled circuit
+
+    Returns
+    -------
+    Updated model, as from ss_model. The model given is not changed.
+    """
+    TC, P = model['TC'], model['parts']
+    dG, dC = dG or {}, dC or {}
+    d = np.array([k for k in dG if dG[k] != 0], dtype=int)
+    dg = np.array([dG[k] for k in d], dtype=float)
+
+    G, C = TC['G'].copy(), TC['C'].copy()
+    if sp.issparse(G):
+        G = (G + sp.csr_matrix((dg, (d, d)), shape=G.shape)).astype(G.dtype)
+    else:
+        G[d, d] += dg
+    nodes = np.array(list(dC), dtype=int)
+    if sp.issparse(C):
+        C = (C + sp.csr_matrix((np.array(list(dC.values()), dtype=float),
+                                (nodes, nodes)), shape=C.shape)).astype(C.dtype)
+    else:
+        C[nodes, nodes] += np.array(list(dC.values()))
+    TC = dict(TC, G=G, C=C)
+
+    diagC = C.diagonal() if sp.issparse(C) else np.diag(C)
+    if not np.array_equal(np.nonzero(diagC)[0], P['rC']):
+        return ss_model(TC)
+
+    P = dict(P, invC=1 / diagC[P['rC']].astype(float))
+
+    if d.size:
+        A = TC['A']
+        U = (A[d, :].toarray() if sp.issparse(A) else A[d, :]).T.astype(float)
+        U0, UC = U[P['r0']], U[P['rC']]
+        E = -dg     # K changes by U diag(E) U'
+
+        # branches with temperature sources change the input columns of Kb
+        jb = np.searchsorted(P['ib'], d)
+        on_b = (jb < P['ib'].size) & (P['ib'][np.minimum(jb, P['ib'].size - 1)] == d)
+        Kb2 = P['Kb2'].copy()
+        Kb2[:, jb[on_b]] += UC[:, on_b] * dg[on_b]
+
+        # K11^-1 of the changed right hand sides, then the update of K11
+        solve = P['K11_solve']
+        Z0 = solve(U0)
+        Y12 = P['X12'] + (Z0 * E) @ UC.T
+        Yb = P['Xb'].copy()
+        Yb[:, jb[on_b]] += Z0[:, on_b] * dg[on_b]
+        Y = np.hstack([Y12, Yb, P['Xf']])
+        S = np.diag(1 / E) + U0.T @ Z0
+        X = Y - Z0 @ np.linalg.solve(S, U0.T @ Y)
+
+        def K11_solve(R):
+            Y = solve(R)
+            return Y - Z0 @ np.linalg.solve(S, U0.T @ Y)
+
+        nC, nb = P['rC'].size, P['ib'].size
+        P.update({'K12': P['K12'] + (U0 * E) @ UC.T,
+                  'K21': P['K21'] + (UC * E) @ U0.T,
+                  'K22': P['K22'] + (UC * E) @ UC.T, 'Kb2': Kb2,
+                  'X12': X[:, :nC], 'Xb': X[:, nC:(nC + nb)],
+                  'Xf': X[:, (nC + nb):], 'K11_solve': K11_solve})
+
+    return {'TC': TC, 'parts': P, 'SS': list(_ss_assemble(P))}
+
+
+def element_delta(TCd, AssX, element, TCk):
+    """
+    Changes of the conductances and capacities of the assembled circuit of
+    TCAss(TCd, AssX) when the circuit of one element is replaced by TCk,
+    e.g. a wall from Element_Types with another insulation thickness. TCk
+    must have the same branches and nodes as the element it replaces.
+
+    Returns
+    -------
+    dG, dC : dictionaries of the changes for ss_update
+    """
+    def diag(M):
+        M = M.toarray() if sp.issparse(M) else np.asarray(M, dtype=float)
+        return np.diag(M) if M.ndim == 2 else np.ravel(M)
+
+    keys = list(TCd.keys())
+    k = keys.index(element)
+    size_b = np.array([np.size(TCd[key]['b']) for key in keys])
+    size_f = np.array([np.size(TCd[key]['f']) for key in keys])
+    first_b = np.cumsum(size_b) - size_b     # global 1st branch of each TC
+    first_f = np.cumsum(size_f) - size_f     # global 1st node of each TC
+
+    # assembled node of each disassembled node, as in TCAss
+    Ass = np.array([first_f[AssX[:, 0]] + AssX[:, 1],
+                    first_f[AssX[:, 2]] + AssX[:, 3]]).astype(int)
+    target = np.arange(size_f.sum())
+    target[Ass[1]] = Ass[0]
+    kept = np.ones(size_f.sum(), dtype=bool)
+    kept[Ass[1]] = False
+    new_index = np.cumsum(kept) - 1
+
+    dg = diag(TCk['G']) - diag(TCd[element]['G'])
+    dc = diag(TCk['C']) - diag(TCd[element]['C'])
+    if dg.size != size_b[k] or dc.size != size_f[k]:
+        raise ValueError('TCk must have the same branches and nodes as element ' + str(element))
+
+    dG = {int(first_b[k] + i): dg[i] for i in np.nonzero(dg)[0]}
+    dC = {}
+    for i in np.nonzero(dc)[0]:
+        node = int(new_index[target[first_f[k] + i]])
+        dC[node] = dC.get(node, 0) + dc[i]
+
+    return dG, dC
 
-    Kb = A.T @ G
-    Kb1 = Kb[r0, :]
-    Kb2 = Kb[rC, :]
 
-    # State equation
-    As = np.linalg.inv(CC) @ (
-        -K21 @ np.linalg.inv(K11) @ K12 + K22)
-    Bs = np.linalg.inv(CC) @ np.hstack([
-        -K21 @ np.linalg.inv(K11) @ Kb1 + Kb2,
-        -K21 @ np.linalg.inv(K11),
-        np.eye(CC.shape[0])])
-    # re-arragne B s in order of f-sources
-    # index B for sources [b f0 fC]
-    idx_new = np.hstack([np.arange(b.size), b.size + r0, b.size + rC])
-    Bs[:, idx_new] = np.array(Bs)
-    # indexes of effective inputs [b f]
-    inp = np.hstack([np.nonzero(b)[0], A.shape[0] + np.nonzero(f)[0]])
-    # extract actual inputs (inputs <> 0)
-    Bs = Bs[:, inp]
-
-    # Ds if outputs are all states
-    Ds = np.zeros([y[rC].size, np.hstack([b, f]).size])
-
-    # observation equation for outputs that are not states
-    Cso = -np.linalg.inv(K11) @ K12
-    Dso = -np.linalg.inv(K11) @ np.hstack(
-        [Kb1, np.eye(r0.size), np.zeros([r0.size, CC.shape[0]])])
-
-    # observation equation for any output
-    Cx = np.zeros([y.size, As.shape[0]])
-    Cs = np.diag(y[rC])
-    Cx[rC, :] = Cs
-    Cx[r0, :] = Cso
-    Cs = Cx[np.nonzero(y)[0], :]
-
-    Dx = np.zeros([y.size, np.hstack([b, f]).shape[0]])
-    Dx[r0, :] = Dso     # feed-through if no capacity
-    Dx[:, idx_new] = np.array(Dx)   # rearange in order of f-sources
-    Ds = Dx[np.nonzero(y)[0], :][:, inp]
-
-    return As, Bs, Cs, Ds
-
-
-# ===========================================================================
 def sol_rad_tilt_surf(weather_data, surface_orientation, albedo):
     """
     Created on Fri Sep 10 11:04:48 2021
@@ -0,0 +1,41 @@
+import os
+import shutil
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, root)  # the modules sit at the top level.
+
+
+@pytest.fixture
+def financials(tmp_path, monkeypatch):
+    # the optimisers read Financials.xlsx from, and write Results.csv to, the working directory.
+    shutil.copy(os.path.join(root, 'Financials.xlsx'), tmp_path)
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def profiles():
+    # four weeks of hourly demand and generation, with the PV and ST profiles of five permutations of the roof
+    # laid out as in PV_ST_Orientatiosn.PV_ST. Permutation 0 has no PV or ST.
+    rng = np.random.default_rng(0)
+    index = pd.date_range('2023-06-01 01:00', periods=24 * 28, freq='h', name='local_time')
+    hour = index.hour.to_numpy()
+    sun = np.clip(np.sin(np.pi * (hour - 5) / 15), 0, None) * rng.uniform(0.2, 1, (len(index) // 24, 1)).repeat(24)
+
+    PV_Cap = np.array([0., 1.26, 2.52, 3.78, 5.04])
+    ST_A = np.array([0., 7.75, 5.2, 2.6, 0.])
+    E = pd.DataFrame({'0': rng.gamma(2, 0.15, len(index)) + 0.4 * ((hour >= 17) & (hour <= 21))}, index=index)
+    DHW = pd.DataFrame({'Total Usage (kWh)': rng.gamma(1, 0.3, len(index)) * np.isin(hour, [7, 8, 19, 20])},
+                       index=index)
+    ST = pd.DataFrame(np.outer(sun, 0.45 * ST_A), index=index)
+    ST.insert(0, 'S', sun)
+    PV = pd.DataFrame(np.outer(sun, 0.8 * PV_Cap), index=index)
+    for k, col in enumerate(['S', 'electricity', 'irradiance_direct', 'irradiance_diffuse', 'temperature']):
+        PV.insert(k, col, sun)
+
+    return E, DHW, ST, PV, ST_A, PV_Cap
@@ -0,0 +1,43 @@
+import os
+
+import numpy as np
+
+import Analytics
+import Store
+
+
+def store(path, n=500):
+    rng = np.random.default_rng(0)
+    values = np.column_stack([np.round(rng.normal(0, 10, n), 1), rng.uniform(0, 30, n), rng.uniform(0, 1e4, n)])
+    S = Store.Open(path, ['NPV (£ 000s)', 'IRR (%)', 'CO2e Emissions (kg)'], n)
+    Store.Write(S, np.arange(0, n, 3), values[::3])  # a store part way through a sweep.
+    return Store.Load(path)
+
+
+def test_top_and_filter_match_pandas(tmp_path):
+    path = str(tmp_path / 'results')
+    Results = store(path)
+    where = {'IRR (%)': (10, None), 'CO2e Emissions (kg)': (None, 8000)}
+    ok = Results[(Results['IRR (%)'] >= 10) & (Results['CO2e Emissions (kg)'] <= 8000)]
+
+    assert Analytics.Filter(path, where).equals(ok)
+    top = Analytics.Top(path, 'NPV (£ 000s)', k=7, where=where, block=16)
+    assert list(top['NPV (£ 000s)']) == sorted(ok['NPV (£ 000s)'], reverse=True)[:7]
+    bottom = Analytics.Top(path, 'CO2e Emissions (kg)', k=3, ascending=True)
+    assert list(bottom.index) == list(Results['CO2e Emissions (kg)'].nsmallest(3).index)
+
+    assert os.path.exists(os.path.join(path, 'order_000.npy'))
+    Store.Write(Store.Open(path, list(Results.columns), 500), [1], [[1e3, 50., 0.]])
+    assert not os.path.exists(os.path.join(path, 'order_000.npy'))  # the sort index is rebuilt after a write.
+    assert Analytics.Top(path, 'NPV (£ 000s)', k=1).index[0] == 1
+
+
+def test_pareto_matches_brute_force(tmp_path):
+    path = str(tmp_path / 'results')
+    Results = store(path)
+    front = Analytics.Pareto(path, {'NPV (£ 000s)': 'max', 'CO2e Emissions (kg)': 'min'}, {'IRR (%)': (5, None)})
+
+    ok = Results[Results['IRR (%)'] >= 5]
+    npv, co2 = ok['NPV (£ 000s)'].to_numpy(), ok['CO2e Emissions (kg)'].to_numpy()
+    dominated = [((npv >= a) & (co2 <= b) & ((npv > a) | (co2 < b))).any() for a, b in zip(npv, co2)]
+    assert sorted(front.index) == sorted(ok.index[~np.array(dominated)])
@@ -0,0 +1,270 @@
+import numpy as np
+
+import Dispatch
+
+
+def legacy_dispatch(E, DHW, ST, PV, B_cap, B_charge, B_discharge, TS_size, TS_leak, T_inlet, T_outlet):
+    # the hourly loop of the original Optimisation.Optimiz, with its prints and comments removed.
+    GIE = np.zeros(len(E))
+    GEE = np.zeros(len(E))
+    B_SOC = np.zeros(len(E) + 1)
+    TS_SOC = np.zeros(len(E) + 1)
+    ST_waste = np.zeros(len(E))
+
+    TS_max = (4.2 * (T_outlet - T_inlet) * TS_size) * (1 / 3600)
+    TS_SOC[0] = (TS_max / 4)
+    B_SOC[0] = (B_cap / 4)
+    E_step_r = DHW_step_r = 0  # the original loop reads these before they are set in some branches.
+
+    for i in range(0, len(E)):
+        PV_step = PV[i]
+        ST_step = ST[i]
+        E_step = E[i]
+        DHW_step = DHW[i]
+
+        PV_step_r = 'x'
+
+        if E_step > 0:
+            if PV_step > 0:
+                if PV_step >= E_step:
+                    PV_step_r = PV_step - E_step
+                    E_step_r = 0
+                    if B_SOC[i] < B_cap:
+                        if (B_cap - B_SOC[i]) > B_charge:
+                            if PV_step_r <= B_charge:
+                                B_SOC[i + 1] = B_SOC[i] + PV_step_r
+                            else:
+                                B_SOC[i + 1] = B_SOC[i] + B_charge
+                                PV_step_r = PV_step_r - B_charge
+                        else:
+                            if PV_step_r >= (B_cap - B_SOC[i]):
+                                B_SOC[i + 1] = B_cap
+                                PV_step_r = PV_step_r - (B_cap - B_SOC[i])
+                            else:
+                                B_SOC[i + 1] = B_SOC[i] + PV_step_r
+                    else:
+                        PV_step_r = PV_step_r
+                else:
+                    E_step_r = E_step - PV_step
+                    PV_step_r = 0
+                    if B_SOC[i] > 0:
+                        if B_SOC[i] >= B_discharge:
+                            if E_step_r <= B_discharge:
+                                B_SOC[i + 1] = B_SOC[i] - E_step_r
+                                E_step_r = 0
+                            else:
+                                E_step_r = E_step_r - B_discharge
+                                B_SOC[i + 1] = B_SOC[i] - B_discharge
+                                GIE[i] = GIE[i] + E_step_r
+                                E_step_r = 0
+                        else:
+                            if E_step_r >= B_SOC[i]:
+                                E_step_r = E_step_r - B_SOC[i]
+                                B_SOC[i + 1] = 0
+                                GIE[i] = GIE[i] + E_step_r
+                                E_step_r = 0
+                            else:
+                                B_SOC[i + 1] = B_SOC[i] - E_step_r
+                                E_step_r = 0
+                    else:
+                        GIE[i] = GIE[i] + E_step_r
+                        E_step_r = 0
+
+            elif B_SOC[i] > 0:
+                PV_step_r = 0
+                if B_SOC[i] >= B_discharge:
+                    if E_step <= B_discharge:
+                        B_SOC[i + 1] = B_SOC[i] - E_step
+                        E_step_r = 0
+                    else:
+                        E_step_r = E_step - B_discharge
+                        B_SOC[i + 1] = B_SOC[i] - B_discharge
+                        GIE[i] = GIE[i] + E_step_r
+                        E_step_r = 0
+                else:
+                    if E_step >= B_SOC[i]:
+                        E_step_r = E_step - B_SOC[i]
+                        B_SOC[i + 1] = 0
+                        GIE[i] = GIE[i] + E_step_r
+                        E_step_r = 0
+                    else:
+                        B_SOC[i + 1] = B_SOC[i] - E_step
+                        E_step_r = 0
+
+            else:
+                GIE[i] = GIE[i] + E_step
+                E_step_r = 0
+                PV_step_r = 0
+
+        else:
+            if PV_step > 0:
+                if B_SOC[i] < B_cap:
+                    if (B_cap - B_SOC[i]) >= B_charge:
+                        if PV_step >= B_charge:
+                            B_SOC[i + 1] = B_SOC[i] + B_charge
+                            PV_step_r = PV_step - B_charge
+                        else:
+                            B_SOC[i + 1] = B_SOC[i] + PV_step
+                            PV_step_r = 0
+                    else:
+                        if PV_step >= (B_cap - B_SOC[i]):
+                            B_SOC[i + 1] = B_cap
+                            PV_step_r = PV_step - (B_cap - B_SOC[i])
+                        else:
+                            B_SOC[i + 1] = B_SOC[i] + PV_step
+                            PV_step_r = 0
+                else:
+                    PV_step_r = PV_step
+            else:
+                PV_step_r = 0
+
+        if E_step_r != 0:
+            raise ValueError
+
+        if DHW_step > 0:
+            if ST_step > 0:
+                if ST_step >= DHW_step:
+                    ST_step_r = ST_step - DHW_step
+                    if TS_SOC[i] < TS_max:
+                        if (TS_max - TS_SOC[i]) >= ST_step_r:
+                            TS_SOC[i+1] = TS_SOC[i] + ST_step_r
+                            DHW_step_r = 0
+                        else:
+                            TS_SOC[i+1] = TS_max
+                            ST_waste[i] = ST_step_r - (TS_max - TS_SOC[i])
+                            DHW_step_r = 0
+                else:
+                    DHW_step_r = DHW_step - ST_step
+                    if TS_SOC[i] > 0:
+                        if TS_SOC[i] >= DHW_step_r:
+                            TS_SOC[i+1] = TS_SOC[i] - DHW_step_r
+                            DHW_step_r = 0
+                        else:
+                            DHW_step_r = DHW_step_r - TS_SOC[i]
+                            TS_SOC[i+1] = 0
+                            if PV_step_r > 0:
+                                if PV_step_r >= DHW_step_r:
+                                    PV_step_r = PV_step_r - DHW_step_r
+                                    DHW_step_r = 0
+                                else:
+                                    DHW_step_r = DHW_step_r - PV_step_r
+                                    PV_step_r = 0
+                                    GIE[i] = DHW_step_r
+                                    DHW_step_r = 0
+                            else:
+                                GIE[i] = DHW_step_r
+                                DHW_step_r = 0
+                    elif PV_step_r > 0:
+                        if PV_step_r >= DHW_step_r:
+                            PV_step_r = PV_step_r - DHW_step_r
+                            DHW_step_r = 0
+                        else:
+                            DHW_step_r = DHW_step_r - PV_step_r
+                            PV_step_r = 0
+                            GIE[i] = DHW_step_r
+                            DHW_step_r = 0
+                    else:
+                        GIE[i] = DHW_step_r
+                        DHW_step_r = 0
+
+            elif TS_SOC[i] > 0:
+                if TS_SOC[i] >= DHW_step:
+                    TS_SOC[i+1] = TS_SOC[i] - DHW_step
+                    DHW_step_r = 0
+                else:
+                    DHW_step_r = DHW_step - TS_SOC[i]
+                    TS_SOC[i+1] = 0
+                    if PV_step_r >= 0:
+                        if PV_step_r >= DHW_step_r:
+                            PV_step_r = PV_step_r - DHW_step_r
+                            DHW_step_r = 0
+                        else:
+                            DHW_step_r = DHW_step_r - PV_step_r
+                            PV_step_r = 0
+                            GIE[i] = DHW_step_r
+                            DHW_step_r = 0
+                    else:
+                        GIE[i] = DHW_step_r
+                        DHW_step_r = 0
+
+            elif PV_step_r > 0:
+                if PV_step_r >= DHW_step:
+                    PV_step_r = PV_step_r - DHW_step
+                    DHW_step_r = 0
+                else:
+                    DHW_step_r = DHW_step_r - PV_step
+                    PV_step_r = 0
+                    GIE[i] = DHW_step_r
+                    DHW_step_r = 0
+
+            else:
+                GIE[i] = DHW_step
+                DHW_step_r = 0
+
+        else:
+            if TS_SOC[i] < TS_max:
+                if (TS_max - TS_SOC[i]) >= ST_step:
+                    TS_SOC[i+1] = TS_SOC[i] + ST_step
+                    DHW_step_r = DHW[i]
+                else:
+                    ST_step_r = ST_step - (TS_max - TS_SOC[i])
+                    TS_SOC[i+1] = TS_max
+                    ST_waste[i] = ST_step_r
+                    DHW_step_r = DHW[i]
+            else:
+                ST_waste[i] = ST_step
+                DHW_step_r = DHW[i]
+
+        if DHW_step_r != 0:
+            raise ValueError
+
+        GEE[i] = PV_step_r
+
+        TS_Litre_step = (3600 * TS_SOC[i+1]) / (4.2 * (T_outlet - T_inlet))
+        TS_leak_kWh = (TS_leak * TS_Litre_step) / 1000
+        TS_SOC[i+1] = TS_SOC[i+1] - TS_leak_kWh
+
+    return GIE, GEE, ST_waste, B_SOC, TS_SOC
+
+
+def profiles(n=24 * 21, seed=0):
+    # hours with and without demand and generation, so every branch of the dispatch rules is taken.
+    rng = np.random.default_rng(seed)
+    E = rng.gamma(1, 0.6, n) * (rng.random(n) > 0.2)
+    DHW = rng.gamma(1, 0.4, n) * (rng.random(n) > 0.5)
+    ST = np.clip(rng.normal(0.2, 0.6, n), 0, None)
+    PV = np.clip(rng.normal(0.4, 1.2, n), 0, None)
+    E[0] = 0.5
+    return E, DHW, ST, PV
+
+
+def test_dispatch_reproduces_the_original_loop_exactly():
+    E, DHW, ST, PV = profiles()
+    for B_cap, B_charge, B_discharge, TS_size in [(8, 3.3, 5.5, 300), (0, 0, 0, 0), (2, 5, 1, 20), (20, 1, 1, 1000)]:
+        args = (B_cap, B_charge, B_discharge, TS_size, 0.27, 10, 60)
+        new = Dispatch.dispatch(E, DHW, ST, PV, *args)
+        old = legacy_dispatch(E, DHW, ST, PV, *args)
+        for x, y in zip(new, old):
+            assert np.array_equal(x, y)
+
+
+def test_dispatch_batch_and_sums_match_dispatch():
+    E, DHW, ST, PV = profiles()
+    rng = np.random.default_rng(1)
+    ST_all = ST * rng.uniform(0, 2, (6, 1))
+    PV_all = PV * rng.uniform(0, 2, (6, 1))
+    B_cap = np.array([0, 2, 5, 8, 10, 20])
+    args = (3.3, 5.5, 300, 0.27, 10, 60)
+
+    batch = Dispatch.dispatch_batch(E, DHW, ST_all, PV_all, B_cap, *args)
+    GIE_sum, GEE_sum = Dispatch.dispatch_sums(E, DHW, ST_all, PV_all, B_cap, *args)
+    for r in range(0, 6):
+        single = Dispatch.dispatch(E, DHW, ST_all[r], PV_all[r], B_cap[r], *args)
+        for x, y in zip(batch, single):
+            assert np.array_equal(x[r], y)
+        assert np.isclose(GIE_sum[r], single[0].sum()) and np.isclose(GEE_sum[r], single[1].sum())
+
+    rows = [np.zeros(3, dtype=int), np.zeros(3, dtype=int), [5, 0, 5], [0, 0, 3]]  # shared profile rows.
+    GIE_rows, GEE_rows = Dispatch.dispatch_sums(E, DHW, ST_all, PV_all, 8, *args, rows=rows)
+    single = Dispatch.dispatch(E, DHW, ST_all[5], PV_all[3], 8, *args)
+    assert np.isclose(GIE_rows[2], single[0].sum())
@@ -0,0 +1,76 @@
+import numpy as np
+import scipy.sparse as sp
+
+import dm4bem
+
+
+def circuit(G_controller=0.):
+    # 4 nodes, two with capacity. Branches 0, 4 and 5 have temperature sources, the outdoor air and the set
+    # point of the controller, and nodes 0 and 3 have flow sources.
+    A = np.array([[1, 0, 0, 0],
+                  [-1, 1, 0, 0],
+                  [0, -1, 1, 0],
+                  [0, 0, -1, 1],
+                  [0, 0, 0, 1],
+                  [0, 0, 0, 1],
+                  [0, -1, 0, 1]], dtype=float)
+    G = np.diag([120., 60., 35., 80., 15., G_controller, 5.])
+    C = np.diag([0., 4e6, 0., 8e4])
+    return {'A': A, 'G': G, 'b': np.array([1, 0, 0, 0, 1, 1, 0]), 'C': C, 'f': np.array([1, 0, 0, 1]),
+            'y': np.array([0, 0, 0, 1])}
+
+
+def reference(TC):
+    # state space model from the inverse of K11, solved for the nodes without capacity.
+    A, G, C = TC['A'], TC['G'], np.diag(TC['C'])
+    r0, rC = np.nonzero(C == 0)[0], np.nonzero(C)[0]
+    K, Kb = -A.T @ G @ A, (A.T @ G)[:, np.nonzero(TC['b'])[0]]
+    F = np.eye(len(C))[:, np.nonzero(TC['f'])[0]]
+    X = np.linalg.inv(K[np.ix_(r0, r0)])
+    As = (K[np.ix_(rC, rC)] - K[np.ix_(rC, r0)] @ X @ K[np.ix_(r0, rC)]) / C[rC, None]
+    Bs = (np.hstack([Kb, F])[rC] - K[np.ix_(rC, r0)] @ X @ np.hstack([Kb, F])[r0]) / C[rC, None]
+    # temperatures of all the nodes from the states and inputs, then the outputs.
+    T = np.zeros((len(C), len(rC) + Bs.shape[1]))
+    T[rC, :len(rC)] = np.eye(len(rC))
+    T[r0] = -X @ np.hstack([K[np.ix_(r0, rC)], np.hstack([Kb, F])[r0]])
+    Y = T[np.nonzero(TC['y'])[0]]
+    return As, Bs, Y[:, :len(rC)], Y[:, len(rC):]
+
+
+def same(SS, expected):
+    return all(np.allclose(x, y, rtol=1e-10, atol=1e-14) for x, y in zip(SS, expected))
+
+
+def test_tc2ss_variants_match_full_conversions():
+    TC, cooling, heating = circuit(), circuit(1e3), circuit(1e4)
+    heating['b'] = np.array([1, 0, 0, 0, 1, 0, 1])  # other inputs are allowed.
+    other = circuit(1e3)
+    other['C'] = np.diag([0., 4e6, 2e3, 8e4])  # different nodes with capacity, converted in full.
+
+    SS = dm4bem.tc2ss_variants(TC, [cooling, heating, other, circuit()])
+    assert same(dm4bem.tc2ss(*(TC[k] for k in 'AGbCfy')), reference(TC))
+    for S, V in zip(SS, [TC, cooling, heating, other, TC]):
+        assert same(S, reference(V))
+
+    sparse = {k: (sp.csr_matrix(TC[k]) if k in 'AGC' else TC[k]) for k in TC}
+    sparse_cooling = {k: (sp.csr_matrix(cooling[k]) if k in 'AGC' else cooling[k]) for k in cooling}
+    for S, V in zip(dm4bem.tc2ss_variants(sparse, [sparse_cooling]), [TC, cooling]):
+        assert same(S, reference(V))
+
+
+def test_ss_update_matches_conversion_of_the_changed_circuit():
+    model = dm4bem.ss_model(circuit(1e3))
+
+    changed = circuit(1e3)
+    changed['G'][2, 2] += 10.
+    changed['G'][4, 4] -= 5.
+    changed['C'][1, 1] += 5e5
+    updated = dm4bem.ss_update(model, dG={2: 10., 4: -5.}, dC={1: 5e5})
+    assert same(updated['SS'], reference(changed))
+    assert same(model['SS'], reference(circuit(1e3)))  # the model given is not changed.
+
+    changed['G'][1, 1] *= 2
+    assert same(dm4bem.ss_update(updated, dG={1: 60.})['SS'], reference(changed))  # updates of updates.
+
+    changed['C'][2, 2] = 2e3
+    assert same(dm4bem.ss_update(updated, dG={1: 60.}, dC={2: 2e3})['SS'], reference(changed))  # new state.
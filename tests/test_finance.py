@@ -0,0 +1,37 @@
+import numpy as np
+import numpy_financial as npf
+
+import Finance
+
+
+def agree(rate, expected):
+    return np.isnan(rate) == np.isnan(expected) and (np.isnan(rate) or np.isclose(rate, expected, rtol=1e-9,
+                                                                                     atol=1e-9))
+
+
+def test_irr_matches_numpy_financial_for_one_sign_change():
+    # a capital cost followed by savings, with rates of return across the range of the grid.
+    rng = np.random.default_rng(0)
+    n_years = rng.integers(2, 30, 400)
+    values = [np.concatenate([[-rng.uniform(100, 1e5)], rng.uniform(0, 1, n - 1) * rng.uniform(1, 5e4)])
+              for n in n_years]
+    for v in values:
+        expected = npf.irr(v)
+        if np.isnan(expected) or -0.98 <= expected <= 50:
+            assert agree(Finance.IRR(v), expected), v
+
+
+def test_irr_matches_numpy_financial_for_several_sign_changes():
+    rng = np.random.default_rng(1)
+    values = rng.normal(0, 1000, (500, 12))
+    values[:, 0] = -np.abs(values[:, 0])
+    rates = Finance.IRR(values)
+    for v, rate in zip(values, rates):
+        assert agree(rate, npf.irr(v)), v
+
+
+def test_irr_finds_double_root():
+    # (1 - 1.1 x)^2, a double root at r = 10% with no sign change between grid points.
+    values = np.array([1., -2.2, 1.21])
+    assert abs(Finance.IRR(values) - 0.1) < 1e-6
+    assert abs(Finance.IRR(np.vstack([values, [-100., 110., 0.]]))[1] - 0.1) < 1e-9
@@ -0,0 +1,57 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import Analytics
+import Finance
+import Optimisation
+import Store
+
+
+def test_prune_ignores_npv_of_permutations_below_irr_constraint():
+    # annual imports of each permutation, exact so the bounds are tight. ARC with no renewables is £1000.
+    GIE = np.array([500., 4000., 4500., 3000.])[:, None] * np.ones(25)
+    CC = np.array([10000., 1000., 500., 2500.])
+    bounds = {'GIE min': GIE, 'GIE max': GIE, 'GEE min': np.zeros_like(GIE), 'GEE max': np.zeros_like(GIE)}
+    prices = (0.2, 0., 0.05, 0.2, 0.03)  # import price, ccl, export price, co2 and discount rate.
+
+    Fin = Finance.Evaluate({'GIE (kWh)': GIE, 'GEE (kWh)': np.zeros_like(GIE), 'Energy sum (kWh)': 5000.},
+                           CC, *prices)
+    NPV, IRR = Fin['NPV (£)'][0], Fin['IRR'][0]
+    assert NPV.argmax() == 0 and IRR[0] < 0.1  # the highest NPV fails the IRR constraint of PHPP.
+    assert NPV[IRR >= 0.1].max() == NPV[3]  # so permutation 3 is the NPV optimum.
+
+    pruned = Optimisation.Prune(bounds, 5000., CC, *prices)
+
+    assert not pruned[3]
+    assert pruned[2]
+    assert not pruned[0]  # lowest CO2e emissions.
+
+
+def test_optimiz_resumes_its_store_and_rejects_other_inputs(financials, profiles):
+    E, DHW, ST, PV, ST_A, PV_Cap = profiles
+    args = (E, DHW, ST, PV, 8, 3.3, 5.5, 300, 0.27, 10, 60, ST_A, PV_Cap)
+    Results = Optimisation.Optimiz(*args, batch=True)
+
+    store = str(financials / 'store')
+    first = Optimisation.Optimiz(*args, batch=True, store=store, chunk=2)
+    pd.testing.assert_frame_equal(first, Results, check_dtype=False)
+
+    S = Store.Columns(store, mode='r+')
+    S['done'][[0, 3, 4]] = False  # as a run stopped part way through.
+    S['NPV (£ 000s)'][[0, 3, 4]] = np.nan
+    S['done'].flush()
+    S['NPV (£ 000s)'].flush()
+    del S
+    resumed = Optimisation.Optimiz(*args, batch=True, store=store, chunk=2)
+    pd.testing.assert_frame_equal(resumed, Results, check_dtype=False)
+
+    Analytics.Index(store, 'NPV (£ 000s)')
+    again = Optimisation.Optimiz(*args, batch=True, store=store, chunk=2)  # a complete store isn't rewritten.
+    pd.testing.assert_frame_equal(again, Results, check_dtype=False)
+    assert any(f.startswith('order_') for f in os.listdir(store))
+
+    with pytest.raises(ValueError, match='different inputs'):
+        Optimisation.Optimiz(*args[:4], 10, *args[5:], batch=True, store=store)
@@ -0,0 +1,25 @@
+import numpy as np
+
+import Pareto
+
+
+def test_fronts_rank_non_dominated_sorting():
+    F = np.array([[1, 5], [2, 2], [5, 1], [2, 5], [3, 3], [6, 6], [1, 5]])
+    assert list(Pareto.Fronts(F)) == [0, 0, 0, 1, 1, 2, 0]
+    dist = Pareto.Crowding(F, Pareto.Fronts(F))
+    assert np.isinf(dist[[0, 2, 3, 4, 5]]).all() and np.isfinite(dist[1])
+
+
+def test_search_returns_non_dominated_designs(financials, profiles):
+    E, DHW, ST, PV, ST_A, PV_Cap = profiles
+    Bounds = {'B_cap': (0, 10), 'B_charge': (0.5, 5), 'B_discharge': (0.5, 5), 'TS_size': (50, 300)}
+
+    for P_cost in (None, 150):
+        Front, n = Pareto.Search(E, DHW, ST, PV, 0.27, 10, 60, ST_A, PV_Cap, Bounds, 300, 2, P_cost=P_cost, pop=12,
+                                 generations=4)
+        assert 0 < len(Front) <= n
+        F = np.column_stack([-Front['NPV (£ 000s)'], Front['CO2e Emissions (kg)'], Front['CC (£)']])
+        assert (Pareto.Fronts(F) == 0).all()
+        if P_cost is None:
+            assert (Front['B_charge (kW)'] == Front['B_cap (kWh)']).all()
+            assert (Front['B_discharge (kW)'] == Front['B_cap (kWh)']).all()
@@ -0,0 +1,32 @@
+import numpy as np
+import pandas as pd
+
+import Sizing
+
+
+def test_optimal_sizing_beats_the_greedy_dispatch_and_no_renewables(financials, profiles):
+    # a year of the four week profiles, so the annual savings can pay for the capital cost.
+    index = pd.date_range('2023-01-01 01:00', periods=13 * len(profiles[0]), freq='h')
+    E, DHW, ST, PV = [pd.DataFrame(pd.concat([X] * 13).to_numpy(), index=index, columns=X.columns)
+                      for X in profiles[:4]]
+    ST_A, PV_Cap = profiles[4:]
+    Fuel = pd.read_excel('Financials.xlsx', sheet_name='Fuel', usecols='A:E', index_col=0)
+    Gen = pd.read_excel('Financials.xlsx', sheet_name='General', usecols='A:B', index_col=0)
+    imp = Fuel['Import Price (£/kWh)']['Grid Electricity'] + Fuel['CCL (£/kWh)']['Grid Electricity']
+    exp = Fuel['Export Price (£/kWh)']['Grid Electricity']
+    d_rate = Gen['Input']['Discount Rate (%)'] / 100
+    crf = d_rate / (1 - (1 + d_rate) ** -Gen['Input']['Number of Years'])
+
+    S = Sizing.Optimal(E, DHW, ST, PV, 0.27, 10, 60, ST_A, PV_Cap, B_cost=300, TS_cost=2)
+    D = S['Dispatch']
+
+    assert np.isclose(S['Weights'].sum(), 1) and S['B_cap (kWh)'] > 0 and S['PV (kW)'] > 0
+    greedy = crf * S['CC (£)'] + imp * S['Greedy IE (kWh)'] - exp * S['Greedy GE (kWh)']
+    assert S['Annual cost (£)'] <= greedy
+    assert S['Annual cost (£)'] < imp * (E['0'].sum() + DHW['Total Usage (kWh)'].sum())  # permutation 0.
+
+    assert (D['B_SOC'] <= S['B_cap (kWh)'] + 1e-6).all()
+    assert (D['B_ch'] <= S['B_charge (kW)'] + 1e-6).all() and (D['B_dis'] <= S['B_discharge (kW)'] + 1e-6).all()
+    PV_gen = PV.iloc[:, 5:].to_numpy() @ S['Weights']
+    supply = PV_gen + D['GIE'] + D['B_dis'] - D['B_ch'] - D['Heat'] - D['GEE']
+    assert (supply >= E['0'] - 1e-6).all()  # electricity balance, with spare PV curtailed.
@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+import scipy.sparse as sp
+
+import Stability
+
+
+def chain(n, C=1e5, G=50.):
+    # state matrix of n capacities in a chain of conductances, each also connected to a fixed temperature.
+    K = np.diag(np.full(n, -3 * G)) + np.diag(np.full(n - 1, G), 1) + np.diag(np.full(n - 1, G), -1)
+    return K / C
+
+
+def test_time_step_divides_the_hour_and_is_stable():
+    A = chain(40)
+    rho = np.abs(np.linalg.eigvals(A)).max()
+
+    assert np.isclose(Stability.Radius(A, 'eigs'), rho)
+    assert np.isclose(Stability.Radius(sp.csr_matrix(A), 'auto'), rho)
+    assert Stability.Radius(A, 'gershgorin') >= rho
+    assert Stability.Radius(A, 'power', iters=500) <= rho * (1 + 1e-9)
+
+    dt = Stability.Time_step([A, 2 * A], step=3600)
+    assert 3600 % dt == 0 and dt < 2 / (2 * rho)
+    assert 3600 // dt == min(n for n in range(1, 3601) if 3600 % n == 0 and 3600 / n < 2 / (2 * rho))
+
+
+def test_unconditionally_stable_methods_and_power_estimate():
+    A = chain(5, C=10.)
+    for method in ('zoh', 'implicit', 'cn'):
+        assert Stability.Max_time_step(A, method) == np.inf
+        assert Stability.Time_step(A, method) == 3600
+    with pytest.raises(ValueError):
+        Stability.Max_time_step(A, estimate='power')
+    with pytest.raises(ValueError):
+        Stability.Time_step(A, 'rk4')
+    with pytest.raises(ValueError, match='No time step'):
+        Stability.Time_step(1e4 * A)
@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+
+import Optimisation
+import Stochastic
+
+
+@pytest.mark.filterwarnings('ignore:Mean of empty slice', 'ignore:All-NaN slice')  # no IRR without capital cost.
+def test_identical_realisations_have_the_results_of_optimiz(financials, profiles):
+    E, DHW, ST, PV, ST_A, PV_Cap = profiles
+    storage = (8, 3.3, 5.5, 300, 0.27, 10, 60)
+    E_K = np.repeat(E['0'].to_numpy()[None], 3, axis=0)
+    DHW_K = np.repeat(DHW['Total Usage (kWh)'].to_numpy()[None], 3, axis=0)
+
+    Robust = Stochastic.Robust(E_K, DHW_K, ST, PV, *storage, ST_A, PV_Cap, chunk=7)
+    Results = Optimisation.Optimiz(E, DHW, ST, PV, *storage, ST_A, PV_Cap).drop(index=0)
+
+    assert np.allclose(Robust['NPV mean (£ 000s)'], Results['NPV (£ 000s)'], atol=1e-3)
+    assert np.allclose(Robust['NPV P10 (£ 000s)'], Robust['NPV P90 (£ 000s)'])
+    assert np.allclose(Robust['CO2e mean (kg)'], Results['CO2e Emissions (kg)'])
+
+
+@pytest.mark.filterwarnings('ignore:Mean of empty slice', 'ignore:All-NaN slice')
+def test_spread_of_realisations_is_independent_of_the_chunks(financials, profiles):
+    E, DHW, ST, PV, ST_A, PV_Cap = profiles
+    storage = (8, 3.3, 5.5, 300, 0.27, 10, 60)
+    scale = np.random.default_rng(1).uniform(0.7, 1.3, (5, 1))
+    E_K = E['0'].to_numpy()[None] * scale
+    DHW_K = DHW['Total Usage (kWh)'].to_numpy()[None] * scale
+
+    Robust = Stochastic.Robust(E_K, DHW_K, ST, PV, *storage, ST_A, PV_Cap, n_anchor=3)
+    assert Robust.equals(Stochastic.Robust(E_K, DHW_K, ST, PV, *storage, ST_A, PV_Cap, n_anchor=3, chunk=4))
+    assert (Robust['CO2e P10 (kg)'] < Robust['CO2e mean (kg)']).all()
+    assert (Robust['CO2e mean (kg)'] < Robust['CO2e P90 (kg)']).all()
@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+
+import Store
+
+
+def test_store_resumes_from_the_rows_not_written(tmp_path):
+    path = str(tmp_path / 'results')
+    store = Store.Open(path, ['NPV (£)', 'IRR'], 6, inputs='abc')
+    Store.Write(store, [0, 2, 3], np.array([[1., 0.1], [3., 0.3], [4., 0.4]]))
+    del store
+
+    store = Store.Open(path, ['NPV (£)', 'IRR'], 6, inputs='abc')  # as a sweep restarted after it stopped.
+    assert list(Store.Pending(store)) == [1, 4, 5]
+    Store.Write(store, [], np.zeros((0, 2)))
+    Store.Write(store, Store.Pending(store), np.array([[2., 0.2], [5., 0.5], [6., 0.6]]))
+
+    Results = Store.Load(path)
+    assert len(Store.Pending(store)) == 0
+    assert list(Results['NPV (£)']) == [1., 2., 3., 4., 5., 6.]
+    assert np.allclose(Results['IRR'], np.arange(1, 7) / 10)
+
+
+def test_store_rejects_other_inputs_columns_and_rows(tmp_path):
+    path = str(tmp_path / 'results')
+    Store.Write(Store.Open(path, ['NPV (£)'], 4, inputs='abc'), [1], np.array([[1.]]))
+
+    with pytest.raises(ValueError, match='inputs'):
+        Store.Open(path, ['NPV (£)'], 4, inputs='abd')
+    with pytest.raises(ValueError, match='columns'):
+        Store.Open(path, ['IRR'], 4, inputs='abc')
+    with pytest.raises(ValueError, match='rows'):
+        Store.Open(path, ['NPV (£)'], 5, inputs='abc')
+    assert list(Store.Pending(Store.Open(path, ['NPV (£)'], 4))) == [0, 2, 3]  # inputs not checked.
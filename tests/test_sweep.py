@@ -0,0 +1,18 @@
+import numpy as np
+import pandas as pd
+
+import Optimisation
+import Sweep
+
+
+def test_sweep_matches_optimiz_for_each_storage_size(financials, profiles):
+    E, DHW, ST, PV, ST_A, PV_Cap = profiles
+    Storage = [(8, 3.3, 5.5, 300), (0, 0, 0, 100), (2, 1, 1, 0)]
+
+    serial = Sweep.Sweep(E, DHW, ST, PV, Storage, 0.27, 10, 60, ST_A, PV_Cap, workers=1)
+    parallel = Sweep.Sweep(E, DHW, ST, PV, Storage, 0.27, 10, 60, ST_A, PV_Cap, workers=2)
+    pd.testing.assert_frame_equal(serial, parallel)
+
+    for s, storage in enumerate(Storage):
+        Results = Optimisation.Optimiz(E, DHW, ST, PV, *storage, 0.27, 10, 60, ST_A, PV_Cap)
+        assert np.array_equal(serial.loc[s][Results.columns].to_numpy(), Results.to_numpy(), equal_nan=True)
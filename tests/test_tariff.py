@@ -0,0 +1,30 @@
+import numpy as np
+import pandas as pd
+
+import Tariff
+
+
+def test_align_wraps_a_tariff_over_two_calendar_years():
+    # April 2022 to March 2023 tariff, a day of the year as the price, on a 2020 simulation index.
+    times = pd.date_range('2022-04-01', '2023-03-31 23:00', freq='h')
+    tariff = pd.Series(times.dayofyear.to_numpy(dtype=float), index=times)
+    index = pd.date_range('2020-01-01', periods=8784, freq='h')
+
+    aligned = Tariff.Align(tariff, index)
+
+    assert aligned.shape == (1, len(index))
+    assert not aligned.flags.writeable
+    assert aligned[0, 0] == 1 and aligned[0, 24 * 100] == 100  # 1 January 2023 and 10 April 2022.
+    assert aligned[0, 24 * 59] == 59  # 29 February takes the last price of 28 February.
+
+
+def test_align_converts_a_tz_aware_tariff_to_local_time():
+    times = pd.date_range('2021-01-01', '2021-12-31 23:30', freq='30min', tz='UTC')
+    tariff = pd.Series(times.hour.to_numpy(dtype=float), index=times)  # the UTC hour as the price.
+    index = pd.date_range('2021-01-01', periods=8760, freq='h')
+
+    aligned = Tariff.Align(tariff, index)[0]
+
+    assert aligned[12] == 12  # GMT in January.
+    assert aligned[24 * 181 + 12] == 11  # BST in July, 12:00 local is 11:00 UTC.
+    assert not np.isnan(aligned).any()
@@ -0,0 +1,86 @@
+import numpy as np
+
+import Stability
+import TCM_funcs
+import Telemetry
+
+
+def circuit(G_controller, G_wall=60., C_air=8e5):
+    # a wall of two layers, one with capacity, and a window between the outdoor air and the indoor air, node 3.
+    # Branch 5 is the controller to the set point, open in the free floating model.
+    A = np.array([[1, 0, 0, 0],
+                  [-1, 1, 0, 0],
+                  [0, -1, 1, 0],
+                  [0, 0, -1, 1],
+                  [0, 0, 0, 1],
+                  [0, 0, 0, 1],
+                  [0, -1, 0, 1]], dtype=float)
+    G = np.diag([120., G_wall, 35., 80., 15., G_controller, 5.])
+    C = np.diag([0., 4e6, 0., C_air])
+    return {'A': A, 'G': G, 'b': np.array([1, 0, 0, 0, 1, 1, 0]), 'C': C, 'f': np.array([1, 0, 0, 1]),
+            'y': np.array([0, 0, 0, 1])}
+
+
+def building(G_wall=60., C_air=8e5):
+    return [circuit(0., G_wall, C_air), circuit(500., G_wall, C_air), circuit(2000., G_wall, C_air)]
+
+
+def inputs(n_steps, dt):
+    # outdoor temperature, set point and solar gains on the wall and the indoor air, with the blinds open (u)
+    # and closed (u_c).
+    t = np.arange(0, n_steps) * dt / 3600
+    T_out = 12 + 8 * np.sin(2 * np.pi * (t - 9) / 24)
+    solar = 600 * np.clip(np.sin(2 * np.pi * (t - 6) / 24), 0, None)
+    Tisp = np.full(n_steps, 20.)
+    u = np.column_stack([T_out, T_out, Tisp, solar, 0.8 * solar]).astype(np.float32)
+    u_c = u.copy()
+    u_c[:, 4] *= 0.2
+    return u, u_c
+
+
+def test_solver_batch_matches_each_variant_simulated_alone():
+    dt = 300
+    u, u_c = inputs(24 * 12 * 4, dt)
+    variants = [building(), building(G_wall=30.), building(C_air=4e5)]
+    SS = TCM_funcs.ss_stack(variants)
+
+    for method in ('euler', 'zoh', 'implicit', 'cn'):
+        qHVAC = TCM_funcs.solver_batch(SS, dt, u, u_c, 20, 4, 2, 500., 2000., method=method)
+        for j in range(0, len(variants)):
+            SSd = TCM_funcs.discretise({m: [X[j] for X in SS[m]] for m in SS}, dt, method)
+            y, q, temp_exp = TCM_funcs.simulate(SSd, u, u_c, 20 * np.ones(len(u)), 4, 2, 500., 2000.)
+            assert np.allclose(qHVAC[j], q, rtol=1e-3, atol=0.5), (method, j)
+        assert (qHVAC > 0).any() and (qHVAC < 0).any()  # both heating and cooling.
+
+
+def test_unstable_euler_time_step_is_sub_stepped():
+    dt = 3600
+    u, u_c = inputs(24 * 4, dt)
+    SS = TCM_funcs.ss_stack([building(C_air=2e5)])
+    As = [SS[m][0][0] for m in SS]
+    assert Stability.Max_time_step(As) < dt
+
+    euler = TCM_funcs.solver_batch(SS, dt, u, u_c, 20, 4, 2, 500., 2000.)
+    exact = TCM_funcs.solver_batch(SS, dt, u, u_c, 20, 4, 2, 500., 2000., method='zoh')
+    assert np.isfinite(euler).all()
+    assert np.abs(euler - exact).mean() < 0.1 * np.abs(exact).mean()  # they differ after the mode switches.
+
+    SSd = TCM_funcs.discretise({m: [X[0] for X in SS[m]] for m in SS}, dt, 'euler')
+    with np.errstate(over='ignore', invalid='ignore'):
+        y, q, temp_exp = TCM_funcs.simulate(SSd, u, u_c, 20 * np.ones(len(u)), 4, 2, 500., 2000.)
+    assert not np.abs(y).max() < 100  # a single step of dt diverges.
+
+
+def test_solver_parallel_matches_the_serial_run():
+    dt = 600
+    u, u_c = inputs(24 * 6 * 20, dt)
+    TCA = building()
+    SS = {m: [X[0] for X in M] for m, M in TCM_funcs.ss_stack([TCA]).items()}
+    SSd = TCM_funcs.discretise(SS, dt, 'zoh')
+    y, q, temp_exp = TCM_funcs.simulate(SSd, u, u_c, 20 * np.ones(len(u)), 4, 2, 500., 2000.)
+
+    Telemetry.violations.clear()
+    qHVAC = TCM_funcs.solver_parallel(*TCA, dt, u, u_c, 20, 4, 2, 500., 2000., method='zoh', chunks=3,
+                                      spinup=5 * 24 * 3600, check='serial', processes=2)
+    assert np.abs(qHVAC - q).max() < 0.01 * np.abs(q).max()
+    assert 'parallel chunks above the error tolerance' not in Telemetry.violations
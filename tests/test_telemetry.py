@@ -0,0 +1,26 @@
+import logging
+
+import Telemetry
+
+
+def test_violations_are_counted_until_summary(caplog):
+    Telemetry.violations.clear()
+    Telemetry.Violation('negative imports', 3)
+    Telemetry.Violation('negative imports', 0)
+    Telemetry.Violation('negative imports')
+    Telemetry.Violation('steps below the set point', 2)
+
+    with caplog.at_level(logging.WARNING, logger='PHPP'):
+        assert Telemetry.Summary() == {'negative imports': 4, 'steps below the set point': 2}
+    assert 'negative imports: 4' in caplog.text
+    assert Telemetry.Summary() == {}
+
+
+def test_progress_is_logged_when_done(caplog):
+    progress = Telemetry.Progress(10, 'test', unit='items', every=3600)
+    with caplog.at_level(logging.INFO, logger='PHPP'):
+        for i in range(0, 9):
+            progress.update()
+        assert caplog.text == ''  # throttled.
+        progress.update()
+    assert '10/10 items (100%)' in caplog.text
@@ -0,0 +1,25 @@
+import numpy as np
+
+import Optimisation
+import TypicalDays
+
+
+def test_typical_days_weight_up_to_the_year(profiles):
+    E, DHW, ST, PV, ST_A, PV_Cap = profiles
+    hours, weights, labels = TypicalDays.Cluster(E, DHW, ST, PV, k=5)
+
+    assert len(hours) == 5 * 24 and (np.diff(hours) > 0).all()  # real days of the year, in date order.
+    assert np.isclose(weights.sum(), len(E))
+    assert np.array_equal(np.bincount(labels, minlength=5), weights[::24])
+    assert np.array_equal(labels[hours[::24] // 24], np.arange(5))  # each typical day is in its own cluster.
+
+
+def test_a_typical_day_for_every_day_is_the_full_year(profiles):
+    E, DHW, ST, PV, ST_A, PV_Cap = profiles
+    hours, weights, labels = TypicalDays.Cluster(E, DHW, ST, PV, k=len(E) // 24)
+    assert np.array_equal(hours, np.arange(len(E))) and (weights == 1).all()
+
+    args = (E, DHW, ST, PV, 8, 3.3, 5.5, 300, 0.27, 10, 60, 20, 2)
+    full = Optimisation.Flows(*args, batch=True)
+    reduced = Optimisation.Flows(*args, batch=True, days=(hours, weights))
+    assert (TypicalDays.Error(reduced, full).abs().to_numpy() < 1e-12).all()